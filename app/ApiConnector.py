@@ -1,50 +1,237 @@
+import collections
+import contextlib
+import copy
 import json
+import socket
+import urllib.parse
 import requests
-import base64
+import requests.adapters
 import urllib3
+import threading
 import time
+import weakref
+import Manifests
+import RequestGovernor
+import RequestStats
+import TokenCache
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# Compact description of a pod as returned by get_pods() and wait_for_pods().
+# status is the pod phase, ip the pod IP (None until it has one).
+PodInfo = collections.namedtuple('PodInfo', ['name', 'status', 'node', 'ip'])
+
+# Accept headers for server side projections of lists.
+PROJECTIONS = {
+    'full': "application/json",
+    'table': "application/json;as=Table;v=v1;g=meta.k8s.io, application/json",
+    'metadata': "application/json;as=PartialObjectMetadataList;v=v1;g=meta.k8s.io, application/json"}
+
+# Collection of the objects of a kind in a namespace, for the generic
+# get_object(), create_object(), patch_object() and delete_object().
+COLLECTIONS = {
+    'Secret': '/api/v1/namespaces/{}/secrets',
+    'Service': '/api/v1/namespaces/{}/services',
+    'ImageStream': '/apis/image.openshift.io/v1/namespaces/{}/imagestreams',
+    'BuildConfig': '/apis/build.openshift.io/v1/namespaces/{}/buildconfigs',
+    'DeploymentConfig': '/apis/apps.openshift.io/v1/namespaces/{}/deploymentconfigs',
+    'Route': '/apis/route.openshift.io/v1/namespaces/{}/routes',
+    'Job': '/apis/batch/v1/namespaces/{}/jobs'}
+
+class Interrupted(requests.exceptions.RequestException):
+    """Raised by the requests of a connector after interrupt()."""
+
 class ApiConnector:
     headers = {
                "Accept": "application/json, */*",
                "User-Agent": "health-check-script/v0.1"}
 
     def __init__(self, host, namespace, token=None,
-            username=None, password=None):
+            username=None, password=None, pool_size=10, keepalive=True,
+            connect_timeout=5, read_timeout=30, token_cache=None,
+            qps=0, burst=10, cache_ttl=0, coalesce=False):
         self.host = host
         self.namespace = namespace
+        self.timeout = (connect_timeout, read_timeout)
+        # One session for all calls, so connections to the API server
+        # are reused instead of doing a new TCP and TLS handshake per call.
+        self.session = requests.Session()
+        self.session.verify = False
+        self.session.headers.update(self.headers)
+        if not keepalive:
+            self.session.headers['Connection'] = 'close'
+        self.adapter = requests.adapters.HTTPAdapter(pool_connections=1,
+                                                     pool_maxsize=pool_size)
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+        # Shared with the connectors returned by for_namespace().
+        self.stats = {'requests': 0, 'time': 0.0}
+        self.stats_lock = threading.Lock()
+        # Latency histograms per verb, kind and status, also shared.
+        self.request_stats = RequestStats.RequestStats()
+        # Also shared, so all connectors together stay within qps and
+        # share what they read.
+        self.rate_limit = RequestGovernor.TokenBucket(qps, burst)
+        self.read_cache = RequestGovernor.ReadCache(cache_ttl, coalesce)
+        # Also shared, a new token is used by all connectors at once.
+        self.auth = {'expires_at': None}
+        self.auth_lock = threading.Lock()
+        # Also shared, interrupt() stops the connectors of a round together.
+        self.interrupted = threading.Event()
+        self.streams = weakref.WeakSet()
+        self.credentials = None
+        self.token_cache = token_cache
         if (token is not None):
-            self.token = token
+            self.__set_token(token)
         elif (username is not None and password is not None):
-            self.token = self.__login(username, password)
+            self.credentials = (username, password)
+            cached = token_cache.get(host, username) if token_cache is not None else None
+            if cached is not None:
+                self.__set_token(*cached)
+            else:
+                self.__login()
         else:
-            ValueError("No credentials provided!")
-        self.headers['Authorization'] = "Bearer " + self.token
-        
-    def __login(self, username, password):
-        """Login to OpenShift with username and password.
-        Returns access token."""
-        r = requests.get(self.host + '/oauth/authorize?client_id=openshift-challenging-client&response_type=token',
-                         auth=(username, password), verify=False, allow_redirects=False)
-        # In de location header wordt de URL genoemd. Nu moeten we deze URL parsen zodat
-        # we het token kunnen vinden. Sorry voor degene die dit ooit moet reverse engineren.
-        urlItems = [ x.split('=') for x in r.headers['Location'].split('#')[1].split('&')]
-        urlItemsDict = {}
-        for urlItem in urlItems:
-            urlItemsDict[urlItem[0]] = urlItem[1]
-        return urlItemsDict['access_token']
+            raise ValueError("No credentials provided!")
+
+    @property
+    def token(self):
+        return self.auth['token']
+
+    def __set_token(self, token, expires_at=None):
+        self.auth['token'] = token
+        self.auth['expires_at'] = expires_at
+        self.session.headers['Authorization'] = "Bearer " + token
+
+    def __request(self, method, url, **kwargs):
+        """Execute a request on the shared session. When logged in with
+        username and password, the token is renewed shortly before it
+        expires and once when the API answers 401. A write drops what was
+        read about the objects it changes from the read cache."""
+        if method != 'GET':
+            try:
+                return self.__authenticated(method, url, **kwargs)
+            finally:
+                self.read_cache.invalidate(url)
+        return self.__authenticated(method, url, **kwargs)
+
+    def __authenticated(self, method, url, **kwargs):
+        if self.credentials is None:
+            return self.__send(method, url, **kwargs)
+        token = self.token
+        if self.token_cache is not None and self.token_cache.expiring(self.auth['expires_at']):
+            self.__relogin(token)
+        r = self.__send(method, url, **kwargs)
+        if r.status_code == 401:
+            r.close()
+            self.__relogin(token)
+            r = self.__send(method, url, **kwargs)
+        return r
+
+    def __send(self, method, url, **kwargs):
+        """Keeps track of the number of requests and the time spent on them,
+        and records every request in request_stats. The CPU time of the
+        thread during the request is recorded too, the rest of the time is
+        waiting for the network and the API server. Waits for the rate
+        limit first, that time doesn't count as latency of the request."""
+        self.rate_limit.acquire(write=method not in ('GET', 'HEAD'))
+        if self.interrupted.is_set():
+            raise Interrupted("Connector was interrupted.")
+        kwargs.setdefault('timeout', self.timeout)
+        stream = kwargs.get('stream', False)
+        verb = 'WATCH' if (kwargs.get('params') or {}).get('watch') else method
+        start, cpu_start = time.monotonic(), time.thread_time()
+        try:
+            r = self.session.request(method, self.host + url, **kwargs)
+        except requests.exceptions.RequestException:
+            self.request_stats.record(verb, url, 'error', 0, time.monotonic() - start,
+                                      time.thread_time() - cpu_start)
+            raise
+        elapsed = time.monotonic() - start
+        with self.stats_lock:
+            self.stats['time'] += elapsed
+            self.stats['requests'] += 1
+            if stream:
+                self.streams.add(r)
+        if stream and self.interrupted.is_set():
+            # interrupt() was called while this request was sent.
+            interrupt(r)
+        # Streamed bodies aren't read yet, only their announced size is known.
+        size = int(r.headers.get('Content-Length') or 0) if stream else len(r.content)
+        self.request_stats.record(verb, url, r.status_code, size, elapsed, time.thread_time() - cpu_start)
+        return r
+
+    def get_connection_stats(self):
+        """Returns a dict with the number of requests done, the number
+        of connections (TCP/TLS handshakes) needed for them and the average
+        latency per request in seconds."""
+        connections = 0
+        pools = self.adapter.poolmanager.pools
+        for key in pools.keys():
+            connections += pools[key].num_connections
+        count = self.stats['requests']
+        return {
+            'requests': count,
+            'connections': connections,
+            'handshakes_saved': max(count - connections, 0),
+            'avg_latency': self.stats['time'] / count if count else 0.0}
+
+    def for_namespace(self, namespace):
+        """Returns a connector for another namespace that shares the
+        session, connection pool and statistics of this one."""
+        connector = copy.copy(self)
+        connector.namespace = namespace
+        return connector
+
+    def interruptible(self):
+        """Returns a connector that shares the session, connection pool and
+        statistics of this one, but that can be interrupted on its own. The
+        connectors it returns with for_namespace() are interrupted with it."""
+        connector = copy.copy(self)
+        connector.interrupted = threading.Event()
+        connector.streams = weakref.WeakSet()
+        return connector
+
+    def interrupt(self):
+        """Make every request from now on raise Interrupted and end the
+        streamed responses (watches, build logs) that are being read. Other
+        threads that use the connector fail at their next request."""
+        self.interrupted.set()
+        with self.stats_lock:
+            streams = list(self.streams)
+        for response in streams:
+            interrupt(response)
+
+    def close(self):
+        """Close all pooled connections."""
+        self.session.close()
+
+    def __login(self):
+        """Login to OpenShift with username and password and use the new
+        access token. Stores it in the token cache."""
+        username, password = self.credentials
+        r = self.__send('GET', '/oauth/authorize?client_id=openshift-challenging-client&response_type=token',
+                        auth=(username, password), allow_redirects=False)
+        if 'Location' not in r.headers:
+            r.raise_for_status()
+            raise RuntimeError("Login failed, no token received.")
+        token, expires_in = TokenCache.parse_token_location(r.headers['Location'])
+        expires_at = None
+        if self.token_cache is not None:
+            expires_at = self.token_cache.store(self.host, username, token, expires_in)
+        self.__set_token(token, expires_at)
+
+    def __relogin(self, old_token):
+        """Login again, unless another thread already replaced old_token."""
+        with self.auth_lock:
+            if self.token == old_token:
+                self.__login()
 
     def __do_post(self, url, data):
         """Execute a POST action. Raises exception when 
         status code is not successful."""
-        headers = self.headers
-        headers["Content-Type"] = "application/json"
-        r = requests.post(self.host + url,
-                          verify=False,
-                          json=data,
-                          headers=self.headers)
+        r = self.__request('POST', url,
+                           json=data,
+                           headers={"Content-Type": "application/json"})
         # Generate exception when this failed.
         r.raise_for_status()
         return r
@@ -52,48 +239,198 @@ class ApiConnector:
     def __do_put(self, url, data):
         """Execute a PUT action. Raises exception when 
         status code is not successful."""
-        r = requests.put(self.host + url,
-                          verify=False,
-                          json=data,
-                          headers=self.headers)
+        r = self.__request('PUT', url,
+                           json=data)
         # Generate exception when this failed.
         r.raise_for_status()
         return r
 
-    def __do_patch(self, url, data):
+    def __do_patch(self, url, data, content_type="application/strategic-merge-patch+json"):
         """Execute a PATCH action. Raises exception when 
         status code is not successful."""
-        headers = self.headers
-        headers["Content-Type"] = "application/strategic-merge-patch+json"
-        r = requests.patch(self.host + url,
-                           verify=False,
+        r = self.__request('PATCH', url,
                            json=data,
-                           headers=headers)
+                           headers={"Content-Type": content_type})
         # Generate exception when this failed.
         r.raise_for_status()
         return r
 
-    def __do_get(self, url):
-        """Execute a GET action. Returns requests object."""
-        r = requests.get(self.host + url,
-                         verify=False,
-                         headers=self.headers)
+    def __do_get(self, url, headers=None, cache=True):
+        """Execute a GET action. Returns requests object, which may be a
+        copy of the answer to another caller of the same GET: with
+        coalesce the same GET in flight is done once and a successful
+        answer is kept for cache_ttl seconds. With cache False a kept
+        answer isn't used."""
+        key = (url, (headers or {}).get('Accept'))
+        return self.read_cache.get(key, url, lambda: self.__request('GET', url, headers=headers), cache)
+
+    def __do_delete(self, url, propagation='Background'):
+        """Execute a DELETE action. Returns requests object. With
+        propagation Foreground the object stays until the objects it owns,
+        like the pods of a DeploymentConfig, are deleted."""
+        body = {"propagationPolicy": propagation}
+        r = self.__request('DELETE', url,
+                           json=body)
         return r
 
-    def __do_delete(self, url):
-        """Execute a DELETE action. Returns requests object."""
-        body = {"propagationPolicy": "Background"}
-        r = requests.delete(self.host + url,
-                         verify=False,
-                         json=body,
-                         headers=self.headers)
-        return r
+    def __watch(self, url, resource_version=None, timeout=60, opened=None):
+        """Stream watch events of url, starting at resource_version.
+        Yields (type, object) tuples until the server ends the watch
+        after timeout seconds. opened(response) is called with the
+        streamed response, interrupt() on it ends the watch."""
+        params = {'watch': '1', 'timeoutSeconds': max(int(timeout), 1)}
+        if resource_version is not None:
+            params['resourceVersion'] = resource_version
+        r = self.__request('GET', url, params=params, stream=True,
+                           timeout=(self.timeout[0], timeout + self.timeout[1]))
+        if opened is not None:
+            opened(r)
+        with r:
+            r.raise_for_status()
+            for line in r.iter_lines():
+                if not line:
+                    continue
+                event = json.loads(line)
+                yield event['type'], event['object']
+
+    def __wait_for(self, url, summary, condition, timeout):
+        """Wait until condition(items) returns a true value and return it.
+        items is a dict of name: summary(object) for all objects in url,
+        objects for which summary returns None are left out. Lists the
+        objects once and then follows watch events, so a change is seen
+        the moment it happens. Returns None after timeout seconds."""
+        deadline = time.monotonic() + timeout
+        while True:
+            # A kept list would have a resourceVersion that is already too old.
+            data = self.__do_get(url, cache=False)
+            data.raise_for_status()
+            data = data.json()
+            items = {}
+            for item in data['items']:
+                if summary(item) is not None:
+                    items[item['metadata']['name']] = summary(item)
+            result = condition(items)
+            if result:
+                return result
+            resource_version = data['metadata']['resourceVersion']
+            expired = False
+            while not expired:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                with contextlib.closing(self.__watch(url, resource_version, remaining)) as events:
+                    for event_type, obj in events:
+                        if event_type == 'ERROR':
+                            # Mostly 410 Gone: our resourceVersion is too old. List again.
+                            expired = True
+                            break
+                        if event_type == 'BOOKMARK':
+                            resource_version = obj['metadata']['resourceVersion']
+                            continue
+                        resource_version = obj['metadata']['resourceVersion']
+                        name = obj['metadata']['name']
+                        if event_type == 'DELETED' or summary(obj) is None:
+                            items.pop(name, None)
+                        else:
+                            items[name] = summary(obj)
+                        result = condition(items)
+                        if result:
+                            return result
+
+    def __pods_url(self, label_selector=None, field_selector=None):
+        """URL of the pods in the namespace, limited by the selectors."""
+        params = {}
+        if label_selector is not None:
+            params['labelSelector'] = label_selector
+        if field_selector is not None:
+            params['fieldSelector'] = field_selector
+        url = '/api/v1/namespaces/{}/pods'.format(self.namespace)
+        if params:
+            url += '?' + urllib.parse.urlencode(params)
+        return url
+
+    def watch_pods(self, resource_version=None, timeout=60,
+                   label_selector=None, field_selector=None):
+        """Stream watch events of pods in the namespace, optionally only of
+        the pods matching label_selector and field_selector."""
+        return self.__watch(self.__pods_url(label_selector, field_selector),
+                            resource_version, timeout)
+
+    def watch_builds(self, resource_version=None, timeout=60):
+        """Stream watch events of builds in the namespace."""
+        return self.__watch('/apis/build.openshift.io/v1/namespaces/{}/builds'.format(self.namespace),
+                            resource_version, timeout)
+
+    def watch_namespace(self, resource_version=None, timeout=60):
+        """Stream watch events of the namespace itself."""
+        return self.__watch('/api/v1/namespaces?fieldSelector=metadata.name%3D{}'.format(self.namespace),
+                            resource_version, timeout)
+
+    def watch_events(self, resource_version=None, timeout=60, opened=None):
+        """Stream watch events of the events in the namespace. See
+        __watch() for opened."""
+        return self.__watch('/api/v1/namespaces/{}/events'.format(self.namespace),
+                            resource_version, timeout, opened)
+
+    def get_events_resource_version(self):
+        """Current resourceVersion of the events in the namespace, to
+        watch only events that happen from now on. Never from the read
+        cache, an older version would replay events."""
+        r = self.__do_get('/api/v1/namespaces/{}/events?limit=1'.format(self.namespace), cache=False)
+        r.raise_for_status()
+        return r.json()['metadata']['resourceVersion']
+
+    def wait_for_pods(self, condition, timeout=60, label_selector=None, field_selector=None):
+        """Wait until condition returns a true value. condition gets the
+        same dict as get_pods() returns. Returns the value of condition,
+        or None on timeout. Use the selectors to only receive the pods
+        you're interested in."""
+        return self.__wait_for(self.__pods_url(label_selector, field_selector),
+                               _pod_summary, condition, timeout)
+
+    def wait_for_builds(self, condition, timeout=60):
+        """Wait until condition returns a true value. condition gets a dict
+        with build name as key and a dict with 'status' as value. Returns the
+        value of condition, or None on timeout."""
+        return self.__wait_for('/apis/build.openshift.io/v1/namespaces/{}/builds'.format(self.namespace),
+                               _build_summary, condition, timeout)
+
+    def wait_for_endpoints(self, name, condition, timeout=60):
+        """Wait until condition returns a true value. condition gets a dict
+        with the name of the Endpoints object (the service name) as key and
+        a dict of pod name: node of the ready addresses as value. Returns
+        the value of condition, or None on timeout."""
+        return self.__wait_for('/api/v1/namespaces/{}/endpoints?fieldSelector=metadata.name%3D{}'.format(
+                                   self.namespace, name),
+                               _endpoints_summary, condition, timeout)
+
+    def wait_for_namespace_deleted(self, timeout=300):
+        """Wait until the namespace is gone. Returns True when it is deleted,
+        False on timeout. Falls back to polling when we are not allowed to
+        watch namespaces."""
+        try:
+            return bool(self.__wait_for(
+                '/api/v1/namespaces?fieldSelector=metadata.name%3D{}'.format(self.namespace),
+                lambda item: {}, lambda items: self.namespace not in items, timeout))
+        except requests.exceptions.HTTPError as ex:
+            if ex.response.status_code != 403:
+                raise
+        deadline = time.monotonic() + timeout
+        while self.check_if_namespace_exists():
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(1)
+        return True
+
+    def wait_for_serviceaccount(self, name, timeout=30):
+        """Wait until service account name exists. Returns True when it
+        exists, False on timeout."""
+        return bool(self.__wait_for('/api/v1/namespaces/{}/serviceaccounts'.format(self.namespace),
+                                    lambda item: {}, lambda items: name in items, timeout))
 
     def check_if_namespace_exists(self):
         """Check if namespace exists. Returns True or False."""
-        r = requests.get(self.host + '/api/v1/namespaces/{}'.format(self.namespace),
-                         headers=self.headers,
-                         verify=False)
+        r = self.__do_get('/api/v1/namespaces/{}'.format(self.namespace))
         if r.status_code == 404:
             return False
         elif r.status_code == 403:
@@ -119,14 +456,11 @@ class ApiConnector:
     def create_status_cm(self):
         """Create a configmap with status."""
         self.__do_post('/api/v1/namespaces/{}/configmaps'.format(self.namespace),
-            {'kind': 'ConfigMap',
-             'apiVersion': 'v1',
-             'metadata': {'name': 'health-check-status'},
-             'data': {'attempts': "1"}})
+            Manifests.status_configmap())
 
     def delete_status_cm(self):
         """Delete configmap with status."""
-        self.__do_delete('/api/v1/namespaces{}/configmaps/health-check-status')
+        self.__do_delete('/api/v1/namespaces/{}/configmaps/health-check-status'.format(self.namespace))
 
     def get_status_attempts(self):
         """Get attempts from configmap."""
@@ -147,60 +481,52 @@ class ApiConnector:
     def create_namespace(self):
         """Create a new project based on namespace defined in object.
         Only creates namespace if it doesn't exist yet."""
-        body = {
-                "kind": "ProjectRequest",
-                "apiVersion": "project.openshift.io/v1",
-                "metadata": {
-                    "name": self.namespace,
-                    "creationTimestamp": None }}
+        body = Manifests.project_request(self.namespace)
 
         # Multiple attempts for creating a namespace
         for attempt in range(0, 5):
             try:
-                r = self.__do_post('/apis/project.openshift.io/v1/projectrequests', body)
-                break
+                return self.__do_post('/apis/project.openshift.io/v1/projectrequests', body)
             except requests.exceptions.HTTPError as ex:
-                if "409 Client Error: Conflict for url" in str(ex):
+                if ex.response is not None and ex.response.status_code == 409:
                     # This happens when we're too quick with creating a new namespace.
                     time.sleep(5)
                 else:
-                    # Something else went wrong. Raise exception anyway.
-                    r.raise_for_status()
-                    break
-        try:
-            return r
-        except UnboundLocalError:
-            raise RuntimeError("Failed to create project. Check if previous NS has been removed and permissions of serviceaccount.")
+                    # Something else went wrong.
+                    raise
+        raise RuntimeError("Failed to create project. Check if previous NS has been removed and permissions of serviceaccount.")
         
     def create_secret(self, ssh_key, secret_name):
         """Create secret from given SSH key (as string)."""
-        bytes_ssh_key = ssh_key.encode()
-        body = {
-                "apiVersion": "v1",
-                "kind": "Secret",
-                "metadata": {
-                    "creationTimestamp": None,
-                    "name": secret_name },
-                "data": {
-                    "ssh-privatekey": base64.b64encode(bytes_ssh_key).decode()}}
+        body = Manifests.secret(ssh_key, secret_name)
         self.__do_post('/api/v1/namespaces/{}/secrets'.format(self.namespace), body)
 
     def link_secret(self, service_account, secret_name):
         """Link a secret to a service account."""
-        source = self.__do_get(
-            '/api/v1/namespaces/{}/serviceaccounts/{}'.format(
-                self.namespace, service_account))
-        # This should be succesful.
-        source.raise_for_status()
-        data = source.json()
-        # Returned data is a dict. We have to add our new secret to the 
-        # secrets list.
-        data['secrets'].append({"name": secret_name})
-        # ...and send data back.
-        self.__do_put(
-            '/api/v1/namespaces/{}/serviceaccounts/builder'.format(
-                self.namespace),
-            data)
+        for attempt in range(0, 3):
+            source = self.__do_get(
+                '/api/v1/namespaces/{}/serviceaccounts/{}'.format(
+                    self.namespace, service_account))
+            # This should be succesful.
+            source.raise_for_status()
+            data = source.json()
+            # Returned data is a dict. We have to add our new secret to the 
+            # secrets list, unless it is linked already.
+            if any(secret['name'] == secret_name for secret in data.get('secrets', [])):
+                return
+            data['secrets'] = data.get('secrets', []) + [{"name": secret_name}]
+            # ...and send data back.
+            try:
+                self.__do_put(
+                    '/api/v1/namespaces/{}/serviceaccounts/builder'.format(
+                        self.namespace),
+                    data)
+                return
+            except requests.exceptions.HTTPError as ex:
+                # 409 happens when the service account controller just
+                # added its own secrets. Try again with the new version.
+                if ex.response.status_code != 409 or attempt == 2:
+                    raise
 
     def unlink_secret(self, service_account, secret_name):
         """Unlink a secret from a service account."""
@@ -211,7 +537,10 @@ class ApiConnector:
         source.raise_for_status()
         data = source.json()
         # Returned data is a dict. We have to remove all secrets from the
-        # secrets list. First build a new dict without the secret
+        # secrets list, unless it isn't linked. First build a new dict
+        # without the secret
+        if not any(secret['name'] == secret_name for secret in data.get('secrets', [])):
+            return
         new_secrets = []
         for secret in data['secrets']:
             if secret['name'] != secret_name:
@@ -227,25 +556,59 @@ class ApiConnector:
 
     def create_imagestream(self, name, app_name):
         """Create an ImageStream with a name and app_name as label."""
-        body = {
-                "apiVersion": "image.openshift.io/v1",
-                "kind": "ImageStream",
-                "metadata": {
-                    "annotations": {
-                        "openshift.io/generated-by": "health-check-script"},
-                    "creationTimestamp": None,
-                    "labels": {
-                        "app": app_name },
-                    "name": name},
-                "spec": {
-                    "lookupPolicy": {
-                        "local": False}},
-                "status": {
-                    "dockerImageRepository": ""}}
+        body = Manifests.imagestream(name, app_name)
         self.__do_post('/apis/image.openshift.io/v1/namespaces/{}/imagestreams'.format(
                 self.namespace),
             body)
 
+    def get_imagestream(self, name):
+        """Returns the ImageStream, or None when it doesn't exist."""
+        r = self.__do_get('/apis/image.openshift.io/v1/namespaces/{}/imagestreams/{}'.format(self.namespace, name))
+        if r.status_code == 404:
+            return None
+        r.raise_for_status()
+        return r.json()
+
+    def get_imagestreamtag(self, name, namespace=None):
+        """Returns the ImageStreamTag name (stream:tag) in namespace, by
+        default the namespace of this connector, or None when it doesn't
+        exist."""
+        r = self.__do_get('/apis/image.openshift.io/v1/namespaces/{}/imagestreamtags/{}'.format(
+            namespace or self.namespace, name))
+        if r.status_code == 404:
+            return None
+        r.raise_for_status()
+        return r.json()
+
+    def tag_image(self, name, tag, source_namespace, source_image, annotations):
+        """Point tag of ImageStream name at image source_image
+        (stream@digest) in source_namespace and set annotations on the
+        ImageStream."""
+        self.__do_patch('/apis/image.openshift.io/v1/namespaces/{}/imagestreams/{}'.format(self.namespace, name),
+            {"metadata": {"annotations": annotations},
+             "spec": {"tags": [{
+                 "name": tag,
+                 "from": {
+                     "kind": "ImageStreamImage",
+                     "namespace": source_namespace,
+                     "name": source_image},
+                 "referencePolicy": {"type": "Source"}}]}})
+
+    def grant_image_pull(self, namespace):
+        """Let the service accounts of namespace pull the images of this
+        namespace. Does nothing when they already may."""
+        binding = Manifests.image_puller_rolebinding(namespace)
+        r = self.__do_get('/apis/rbac.authorization.k8s.io/v1/namespaces/{}/rolebindings/{}'.format(
+            self.namespace, binding['metadata']['name']))
+        if r.status_code == 200:
+            return
+        try:
+            self.__do_post('/apis/rbac.authorization.k8s.io/v1/namespaces/{}/rolebindings'.format(self.namespace),
+                           binding)
+        except requests.exceptions.HTTPError as ex:
+            if ex.response.status_code != 409:
+                raise
+
     def create_buildconfig(self, name, app_name, imagestreamtag, source_git,
         source_context_dir, source_secret, source_image):
         """Create a buildconfig. Takes the following arguments:
@@ -257,169 +620,99 @@ class ApiConnector:
         - source_secret: Secret to use when pulling source.
         - source_image: Image to use as base.
         """
-        body = {
-                "apiVersion": "build.openshift.io/v1",
-                "kind": "BuildConfig",
-                "metadata": {
-                    "annotations": {
-                        "openshift.io/generated-by": "health-check-script"},
-                    "creationTimestamp": None,
-                    "labels": {
-                        "app": app_name},
-                    "name": name},
-                "spec": {
-                    "nodeSelector": None,
-                    "output": {
-                        "to": {
-                            "kind": "ImageStreamTag",
-                            "name": imagestreamtag}},
-                    "postCommit": {},
-                    "resources": {},
-                    "source": {
-                        "sourceSecret": {
-                            "name": source_secret},
-                        "type": "git",
-                        "contextDir": source_context_dir,
-                        "git": {
-                            "uri": source_git}},
-                    "strategy": {
-                        "sourceStrategy": {
-                            "from": {
-                                "kind": "ImageStreamTag",
-                                "name": source_image,
-                                "namespace": "openshift"}},
-                        "type": "Source"},
-                    "Triggers": []},
-                "status": {
-                    "lastVersion": 0}}
+        body = Manifests.buildconfig(name, app_name, imagestreamtag, source_git,
+            source_context_dir, source_secret, source_image)
         self.__do_post('/apis/build.openshift.io/v1/namespaces/{}/buildconfigs'.format(
             self.namespace),
             body)
 
-    def create_deploymentconfig(self, app_name, name, image, tcp_port, replicas=1):
-        body = {
-                "apiVersion": "apps.openshift.io/v1",
-                "kind": "DeploymentConfig",
-                "metadata": {
-                    "annotations": {
-                        "openshift.io/generated-by": "health-check-script"},
-                    "creationTimestamp": None,
-                    "labels": {
-                        "app": app_name},
-                    "name": name},
-                "spec": {
-                    "replicas": replicas,
-                    "selector": {
-                        "app": app_name,
-                        "deploymentconfig": name},
-                    "strategy": {
-                        "resources": {}},
-                    "template": { 
-                        "metadata": {
-                            "annotations": {
-                                "openshift.io/generated-by": "health-check-script"},
-                            "creationTimestamp": None,
-                            "labels": {
-                                "app": app_name,
-                                "deploymentconfig": name}},
-                        "spec": {
-                            "containers": [{
-                                "image": 'image-registry.openshift-image-registry.svc:5000/' + self.namespace + '/' + image,
-                                "name": name + "-pod",
-                                "ports": [{
-                                    "containerPort": tcp_port,
-                                    "protocol": "TCP"}],
-                                "resources": {}}]}},
-                        "test": False,
-                        "triggers": []},
-                "status": {
-                    "availableReplicas": 0,
-                    "latestVersion": 0,
-                    "observedGeneration": 0,
-                    "replicas": 0,
-                    "unavailableReplicas": 0,
-                    "updatedReplicas": 0}}
+    def create_deploymentconfig(self, app_name, name, image, tcp_port, replicas=1, node=None, image_namespace=None):
+        body = Manifests.deploymentconfig(self.namespace, app_name, name, image, tcp_port, replicas, node,
+                                          image_namespace)
         self.__do_post('/apis/apps.openshift.io/v1/namespaces/{}/deploymentconfigs'.format(
             self.namespace),
             body)
 
-    def create_service(self, app_name, name, tcp_port, selector_dc):
-        body = {
-                "apiVersion": "v1",
-                "kind": "Service",
-                "metadata": {
-                    "annotations": {
-                        "openshift.io/generated-by": "health-check-script"},
-                    "creationTimestamp": None,
-                    "labels": {
-                        "app": app_name},
-                    "name": name},
-                "spec": {
-                    "ports": [{
-                        "name": str(tcp_port) + '-tcp',
-                        "port": tcp_port,
-                        "protocol": "TCP",
-                        "targetPort": tcp_port}],
-                    "selector": {
-                        "app": app_name,
-                        "deploymentconfig": selector_dc}},
-                    "status": {
-                        "loadBalancer": {}}}
+    def create_service(self, app_name, name, tcp_port, selector_dc, selector_app=None):
+        body = Manifests.service(app_name, name, tcp_port, selector_dc, selector_app)
         self.__do_post('/api/v1/namespaces/{}/services'.format(
             self.namespace),
             body)
 
     def start_build(self, name):
-        body = {
-                "kind": "BuildRequest",
-                "apiVersion": "build.openshift.io/v1",
-                "metadata": {
-                    "name": name,
-                    "creationTimestamp": None},
-                "triggeredBy": [{
-                    "message": "Triggered by health-check-script."}],
-                "dockerStrategyOptions": {},
-                "sourceStrategyOptions": {}}
-        self.__do_post('/apis/build.openshift.io/v1/namespaces/{}/buildconfigs/{}/instantiate'.format(
+        """Start a build of BuildConfig name. Returns the name of the build."""
+        body = Manifests.build_request(name)
+        r = self.__do_post('/apis/build.openshift.io/v1/namespaces/{}/buildconfigs/{}/instantiate'.format(
             self.namespace,
             name),
             body)
+        return r.json()['metadata']['name']
+
+    def get_build(self, name):
+        """Returns the build object."""
+        r = self.__do_get('/apis/build.openshift.io/v1/namespaces/{}/builds/{}'.format(self.namespace, name))
+        r.raise_for_status()
+        return r.json()
+
+    def follow_build_log(self, name, timeout=600):
+        """Yields the lines of the log of build name as they are written,
+        until the build is done or timeout seconds passed. Waits until the
+        build pod has started, before that the API answers 400."""
+        deadline = time.monotonic() + timeout
+        url = '/apis/build.openshift.io/v1/namespaces/{}/builds/{}/log?follow=true'.format(self.namespace, name)
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            r = self.__request('GET', url, stream=True, headers={'Accept': '*/*'},
+                               timeout=(self.timeout[0], remaining))
+            with r:
+                if r.status_code == 400:
+                    # Build pod isn't running yet.
+                    time.sleep(min(0.2, max(remaining, 0)))
+                    continue
+                r.raise_for_status()
+                for line in r.iter_lines(chunk_size=1024):
+                    yield line.decode('utf-8', errors='replace')
+                return
 
     def start_deployment(self, deploymentconfig):
-        body = {
-                "kind": "DeploymentRequest",
-                "apiVersion": "apps.openshift.io/v1",
-                "name": deploymentconfig,
-                "latest": True,
-                "force": True}
+        body = Manifests.deployment_request(deploymentconfig)
         self.__do_post('/apis/apps.openshift.io/v1/namespaces/{}/deploymentconfigs/{}/instantiate'.format(
             self.namespace,
             deploymentconfig),
             body)
 
+    def scale_deploymentconfig(self, name, replicas):
+        """Set the number of replicas of a DeploymentConfig."""
+        self.__do_patch('/apis/apps.openshift.io/v1/namespaces/{}/deploymentconfigs/{}'.format(
+            self.namespace, name),
+            {"spec": {"replicas": replicas}})
+
     def create_route(self, app_name, name, svc_name, target_port, host):
-        body = {
-                "apiVersion": "route.openshift.io/v1",
-                "kind": "Route",
-                "metadata": {
-                    "creationTimestamp": None,
-                    "labels": {
-                        "app": app_name},
-                    "name": name},
-                "spec": {
-                    "host": host,
-                    "port": {
-                        "targetPort": target_port},
-                    "to": {
-                        "kind": "",
-                        "name": svc_name,
-                        "weight": None}},
-                "status": {
-                    "ingress": None}}
+        body = Manifests.route(app_name, name, svc_name, target_port, host)
         self.__do_post('/apis/route.openshift.io/v1/namespaces/{}/routes'.format(
             self.namespace),
             body)
 
+    def create_job(self, app_name, name, image, script, env, deadline, image_namespace=None):
+        """Create a Job running shell script in image, see Manifests.probe_job()."""
+        body = Manifests.probe_job(self.namespace, app_name, name, image, script, env, deadline, image_namespace)
+        self.__do_post('/apis/batch/v1/namespaces/{}/jobs'.format(self.namespace), body)
+
+    def get_service(self, name):
+        """Returns the Service object."""
+        r = self.__do_get('/api/v1/namespaces/{}/services/{}'.format(self.namespace, name))
+        r.raise_for_status()
+        return r.json()
+
+    def get_pod_log(self, name):
+        """Returns the log of pod name as a list of lines."""
+        r = self.__do_get('/api/v1/namespaces/{}/pods/{}/log'.format(self.namespace, name),
+                          headers={'Accept': '*/*'})
+        r.raise_for_status()
+        return r.text.splitlines()
+
     def delete_deploymentconfig(self, name):
         return self.__do_delete('/apis/apps.openshift.io/v1/namespaces/{}/deploymentconfigs/{}'.format(
             self.namespace,
@@ -435,6 +728,11 @@ class ApiConnector:
             self.namespace,
             name))
 
+    def delete_job(self, name):
+        return self.__do_delete('/apis/batch/v1/namespaces/{}/jobs/{}'.format(
+            self.namespace,
+            name))
+
     def delete_secret(self, name):
         return self.__do_delete('/api/v1/namespaces/{}/secrets/{}'.format(
             self.namespace,
@@ -454,12 +752,134 @@ class ApiConnector:
         return self.__do_delete('/apis/project.openshift.io/v1/projects/{}'.format(
             self.namespace))
 
-    def get_pods(self):
-        data = self.__do_get('/api/v1/namespaces/{}/pods'.format(self.namespace)).json()
+    def __object_url(self, kind, name=None):
+        url = COLLECTIONS[kind].format(self.namespace)
+        return url + '/' + name if name is not None else url
+
+    def get_object(self, kind, name):
+        """Returns the current object name of kind (see COLLECTIONS), never
+        from the read cache, or None when it doesn't exist."""
+        r = self.__do_get(self.__object_url(kind, name), cache=False)
+        if r.status_code == 404:
+            return None
+        r.raise_for_status()
+        return r.json()
+
+    def create_object(self, body):
+        """Create the object body, of one of the kinds in COLLECTIONS."""
+        return self.__do_post(self.__object_url(body['kind']), body).json()
+
+    def patch_object(self, kind, name, patch):
+        """JSON merge patch of object name of kind: a None removes a field,
+        lists are replaced. With metadata.resourceVersion in patch the API
+        answers 409 when the object changed since that version."""
+        return self.__do_patch(self.__object_url(kind, name), patch, "application/merge-patch+json").json()
+
+    def delete_object(self, kind, name, propagation='Background'):
+        """Delete object name of kind. Returns requests object."""
+        return self.__do_delete(self.__object_url(kind, name), propagation)
+
+    def wait_for_deleted(self, kind, name, timeout=120):
+        """Wait until object name of kind is gone. Returns True when it
+        is, False on timeout."""
+        return bool(self.__wait_for(self.__object_url(kind) + '?fieldSelector=metadata.name%3D' + name,
+                                    lambda item: {}, lambda items: name not in items, timeout))
+
+    def get_pods(self, label_selector=None, field_selector=None, projection='full'):
+        """Returns a dict with pod name as key and PodInfo as value of the
+        scheduled pods matching label_selector and field_selector.
+        projection selects what the API server sends:
+        - full: complete pod objects.
+        - table: only the columns of 'oc get pods -o wide'. Much smaller,
+          but status is derived from the displayed status (e.g. Completed
+          becomes Succeeded).
+        - metadata: only names and labels. Pods are returned whether they
+          are scheduled or not, with status, node and ip set to None.
+        """
+        r = self.__do_get(self.__pods_url(label_selector, field_selector),
+                          headers={'Accept': PROJECTIONS[projection]})
+        r.raise_for_status()
+        data = r.json()
         pods = {}
-        for item in data['items']:
-            if 'nodeName' in item['spec']:
-                pods[item['metadata']['name']] = {
-                   'status': item['status']['phase'],
-                   'node': item['spec']['nodeName']}
+        if data.get('kind') == 'Table':
+            columns = [column['name'] for column in data['columnDefinitions']]
+            for row in data['rows']:
+                pod = _table_pod_summary(dict(zip(columns, row['cells'])))
+                if pod is not None:
+                    pods[pod.name] = pod
+        elif data.get('kind') == 'PartialObjectMetadataList':
+            for item in data['items']:
+                name = item['metadata']['name']
+                pods[name] = PodInfo(name, None, None, None)
+        else:
+            for item in data['items']:
+                pod = _pod_summary(item)
+                if pod is not None:
+                    pods[pod.name] = pod
         return pods
+
+    def get_nodes(self, label_selector='node-role.kubernetes.io/worker'):
+        """Returns the names of the Ready and schedulable nodes matching
+        label_selector. Needs permission to list nodes."""
+        r = self.__do_get('/api/v1/nodes?' + urllib.parse.urlencode({'labelSelector': label_selector}),
+                          headers={'Accept': PROJECTIONS['full']})
+        r.raise_for_status()
+        nodes = []
+        for item in r.json()['items']:
+            ready = any(condition['type'] == 'Ready' and condition['status'] == 'True'
+                        for condition in item['status'].get('conditions', []))
+            if ready and not item['spec'].get('unschedulable', False):
+                nodes.append(item['metadata']['name'])
+        return sorted(nodes)
+
+def interrupt(response):
+    """End a streamed response that another thread is reading. Closing it
+    doesn't wake a thread that waits for data, shutting down its socket does."""
+    sock = getattr(getattr(response.raw, '_connection', None), 'sock', None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    response.close()
+
+def _pod_summary(item):
+    """Returns PodInfo of a pod object, or None if it isn't scheduled yet."""
+    if 'nodeName' not in item['spec']:
+        return None
+    return PodInfo(
+        item['metadata']['name'],
+        item['status']['phase'],
+        item['spec']['nodeName'],
+        item['status'].get('podIP'))
+
+# Displayed pod status in tables that don't match the phase.
+TABLE_PHASES = {
+    'Completed': 'Succeeded',
+    'Error': 'Failed',
+    'OOMKilled': 'Failed',
+    'Evicted': 'Failed'}
+
+def _table_pod_summary(cells):
+    """Returns PodInfo of a table row, or None if it isn't scheduled yet."""
+    if cells.get('Node') in [None, '<none>']:
+        return None
+    status = cells['Status']
+    if status not in ['Pending', 'Running', 'Succeeded', 'Failed', 'Unknown']:
+        status = TABLE_PHASES.get(status, 'Pending')
+    ip = cells.get('IP')
+    return PodInfo(cells['Name'], status, cells['Node'], None if ip in [None, '<none>'] else ip)
+
+def _build_summary(item):
+    """Returns status of a build."""
+    return {'status': item['status']['phase']}
+
+def _endpoints_summary(item):
+    """Returns a dict of pod name: node of the ready addresses of an
+    Endpoints object."""
+    pods = {}
+    for subset in item.get('subsets') or []:
+        for address in subset.get('addresses', []):
+            if address.get('targetRef', {}).get('kind') == 'Pod':
+                pods[address['targetRef']['name']] = address.get('nodeName')
+    return pods
@@ -0,0 +1,406 @@
+import asyncio
+import json
+import time
+import urllib.parse
+import aiohttp
+import Manifests
+import TokenCache
+from ApiConnector import _pod_summary
+
+# asyncio counterpart of ApiConnector. One aiohttp session (and so one
+# connection pool) can be shared by many connectors, each working in its
+# own namespace.
+
+headers = {
+           "Accept": "application/json, */*",
+           "User-Agent": "health-check-script/v0.1"}
+
+def create_session(pool_size=10, keepalive=True, connect_timeout=5, read_timeout=30):
+    """Create an aiohttp session with a pool of pool_size connections."""
+    connector = aiohttp.TCPConnector(limit=pool_size, ssl=False,
+                                     force_close=not keepalive)
+    timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+    return aiohttp.ClientSession(connector=connector, timeout=timeout, headers=headers)
+
+async def _authorize(session, host, username, password):
+    """Login to OpenShift with username and password. Returns the access
+    token and the seconds until it expires (None when unknown)."""
+    async with session.get(host + '/oauth/authorize?client_id=openshift-challenging-client&response_type=token',
+                           auth=aiohttp.BasicAuth(username, password), allow_redirects=False) as r:
+        if 'Location' not in r.headers:
+            _raise_for_status('GET', '/oauth/authorize', r.status)
+            raise RuntimeError("Login failed, no token received.")
+        location = r.headers['Location']
+    return TokenCache.parse_token_location(location)
+
+async def login(session, host, username, password, token_cache=None):
+    """Login to OpenShift with username and password.
+    Returns access token. A valid token from token_cache is used
+    instead of logging in."""
+    if token_cache is not None:
+        cached = token_cache.get(host, username)
+        if cached is not None:
+            return cached[0]
+    token, expires_in = await _authorize(session, host, username, password)
+    if token_cache is not None:
+        token_cache.store(host, username, token, expires_in)
+    return token
+
+class Authentication:
+    """Access token shared by all connectors of a session, the asyncio
+    counterpart of the authentication of ApiConnector. When logged in with
+    username and password, the token is renewed shortly before it expires
+    and once when the API answers 401."""
+
+    def __init__(self, session, host, token=None, username=None, password=None, token_cache=None):
+        self.session = session
+        self.host = host
+        self.token = token
+        self.expires_at = None
+        self.credentials = (username, password) if username is not None and password is not None else None
+        self.token_cache = token_cache
+        self.lock = asyncio.Lock()
+        if token is None and self.credentials is None:
+            raise ValueError("No credentials provided!")
+
+    @property
+    def renewable(self):
+        return self.credentials is not None
+
+    async def __login(self):
+        username, password = self.credentials
+        if self.token is None and self.token_cache is not None:
+            cached = self.token_cache.get(self.host, username)
+            if cached is not None:
+                self.token, self.expires_at = cached
+                return
+        token, expires_in = await _authorize(self.session, self.host, username, password)
+        expires_at = None
+        if self.token_cache is not None:
+            expires_at = self.token_cache.store(self.host, username, token, expires_in)
+        self.token, self.expires_at = token, expires_at
+
+    async def get_token(self):
+        """The token to use, after logging in when there is none yet or
+        it is about to expire."""
+        if self.renewable and (self.token is None or (
+                self.token_cache is not None and self.token_cache.expiring(self.expires_at))):
+            await self.renew(self.token)
+        return self.token
+
+    async def renew(self, old_token):
+        """Login again, unless another task already replaced old_token."""
+        async with self.lock:
+            if self.token == old_token:
+                await self.__login()
+
+class AsyncApiConnector:
+    def __init__(self, host, namespace, auth, session):
+        """auth is an Authentication shared by the connectors of session,
+        or a token."""
+        self.host = host
+        self.namespace = namespace
+        self.session = session
+        if isinstance(auth, str):
+            auth = Authentication(session, host, token=auth)
+        self.auth = auth
+
+    async def __open(self, open_request):
+        """Open a response with open_request(headers), renewing the token
+        and trying again once when the API answers 401."""
+        token = await self.auth.get_token()
+        r = await open_request({'Authorization': "Bearer " + token})
+        if r.status == 401 and self.auth.renewable:
+            r.release()
+            await self.auth.renew(token)
+            r = await open_request({'Authorization': "Bearer " + await self.auth.get_token()})
+        return r
+
+    async def __request(self, method, url, data=None, content_type=None):
+        """Execute a request. Returns (status, body) where body is the
+        decoded JSON, or None if the response has no JSON."""
+        body = json.dumps(data) if data is not None else None
+        def open_request(auth_headers):
+            request_headers = dict(auth_headers)
+            if content_type is not None:
+                request_headers['Content-Type'] = content_type
+            return self.session.request(method, self.host + url, data=body, headers=request_headers)
+        async with await self.__open(open_request) as r:
+            try:
+                result = await r.json(content_type=None)
+            except ValueError:
+                result = None
+            return r.status, result
+
+    async def __do_post(self, url, data):
+        """Execute a POST action. Raises exception when
+        status code is not successful."""
+        status, result = await self.__request('POST', url, data, "application/json")
+        _raise_for_status('POST', url, status)
+        return result
+
+    async def __do_put(self, url, data):
+        """Execute a PUT action. Raises exception when
+        status code is not successful."""
+        status, result = await self.__request('PUT', url, data, "application/json")
+        _raise_for_status('PUT', url, status)
+        return result
+
+    async def __do_patch(self, url, data):
+        """Execute a PATCH action. Raises exception when
+        status code is not successful."""
+        status, result = await self.__request('PATCH', url, data, "application/strategic-merge-patch+json")
+        _raise_for_status('PATCH', url, status)
+        return result
+
+    async def __do_get(self, url):
+        """Execute a GET action. Returns (status, body)."""
+        return await self.__request('GET', url)
+
+    async def __do_delete(self, url):
+        """Execute a DELETE action. Returns (status, body)."""
+        return await self.__request('DELETE', url, {"propagationPolicy": "Background"}, "application/json")
+
+    async def __watch(self, url, resource_version=None, timeout=60):
+        """Stream watch events of url. Yields (type, object) tuples until
+        the server ends the watch after timeout seconds."""
+        params = {'watch': '1', 'timeoutSeconds': str(max(int(timeout), 1))}
+        if resource_version is not None:
+            params['resourceVersion'] = resource_version
+        def open_request(auth_headers):
+            return self.session.get(self.host + url, params=params, headers=auth_headers,
+                                    timeout=aiohttp.ClientTimeout(sock_read=timeout + 30))
+        async with await self.__open(open_request) as r:
+            _raise_for_status('GET', url, r.status)
+            async for line in r.content:
+                if not line.strip():
+                    continue
+                event = json.loads(line)
+                yield event['type'], event['object']
+
+    async def __wait_for(self, url, summary, condition, timeout):
+        """Wait until condition(items) returns a true value and return it.
+        Same semantics as ApiConnector.__wait_for. Returns None after
+        timeout seconds."""
+        deadline = time.monotonic() + timeout
+        while True:
+            status, data = await self.__do_get(url)
+            _raise_for_status('GET', url, status)
+            items = {}
+            for item in data['items']:
+                if summary(item) is not None:
+                    items[item['metadata']['name']] = summary(item)
+            result = condition(items)
+            if result:
+                return result
+            resource_version = data['metadata']['resourceVersion']
+            expired = False
+            while not expired:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                events = self.__watch(url, resource_version, remaining)
+                try:
+                    async for event_type, obj in events:
+                        if event_type == 'ERROR':
+                            expired = True
+                            break
+                        resource_version = obj['metadata']['resourceVersion']
+                        if event_type == 'BOOKMARK':
+                            continue
+                        name = obj['metadata']['name']
+                        if event_type == 'DELETED' or summary(obj) is None:
+                            items.pop(name, None)
+                        else:
+                            items[name] = summary(obj)
+                        result = condition(items)
+                        if result:
+                            return result
+                finally:
+                    await events.aclose()
+
+    async def wait_for_serviceaccount(self, name, timeout=30):
+        """Wait until service account name exists. Returns True when it
+        exists, False on timeout."""
+        return bool(await self.__wait_for('/api/v1/namespaces/{}/serviceaccounts'.format(self.namespace),
+                                          lambda item: {}, lambda items: name in items, timeout))
+
+    async def check_if_namespace_exists(self):
+        """Check if namespace exists. Returns True or False."""
+        status, _ = await self.__do_get('/api/v1/namespaces/{}'.format(self.namespace))
+        if status in [404, 403]:
+            return False
+        elif status == 200:
+            return True
+        else:
+            raise RuntimeError("Unexpected status code: {}".format(status))
+
+    async def wait_for_namespace_deleted(self, timeout=300):
+        """Wait until the namespace is gone. Returns True when it is deleted,
+        False on timeout."""
+        try:
+            return bool(await self.__wait_for(
+                '/api/v1/namespaces?fieldSelector=metadata.name%3D{}'.format(self.namespace),
+                lambda item: {}, lambda items: self.namespace not in items, timeout))
+        except HTTPError as ex:
+            if ex.status != 403:
+                raise
+        deadline = time.monotonic() + timeout
+        while await self.check_if_namespace_exists():
+            if time.monotonic() > deadline:
+                return False
+            await asyncio.sleep(1)
+        return True
+
+    async def create_namespace(self):
+        """Create a new project based on namespace defined in object."""
+        for attempt in range(0, 5):
+            try:
+                return await self.__do_post('/apis/project.openshift.io/v1/projectrequests',
+                                            Manifests.project_request(self.namespace))
+            except HTTPError as ex:
+                if ex.status != 409:
+                    raise
+                # This happens when we're too quick with creating a new namespace.
+                await asyncio.sleep(5)
+        raise RuntimeError("Failed to create project. Check if previous NS has been removed and permissions of serviceaccount.")
+
+    async def create_status_cm(self):
+        """Create a configmap with status."""
+        await self.__do_post('/api/v1/namespaces/{}/configmaps'.format(self.namespace),
+            Manifests.status_configmap())
+
+    async def get_status_attempts(self):
+        """Get attempts from configmap."""
+        status, configmap = await self.__do_get('/api/v1/namespaces/{}/configmaps/health-check-status'.format(self.namespace))
+        _raise_for_status('GET', 'configmaps/health-check-status', status)
+        return int(configmap['data']['attempts'])
+
+    async def set_status_attempts(self, number):
+        """Set attempts in configmap to number."""
+        await self.__do_patch('/api/v1/namespaces/{}/configmaps/health-check-status'.format(self.namespace),
+                              {"data": {"attempts": str(number)}})
+
+    async def create_secret(self, ssh_key, secret_name):
+        """Create secret from given SSH key (as string)."""
+        await self.__do_post('/api/v1/namespaces/{}/secrets'.format(self.namespace),
+                             Manifests.secret(ssh_key, secret_name))
+
+    async def link_secret(self, service_account, secret_name):
+        """Link a secret to a service account."""
+        url = '/api/v1/namespaces/{}/serviceaccounts/{}'.format(self.namespace, service_account)
+        status, data = await self.__do_get(url)
+        _raise_for_status('GET', url, status)
+        data['secrets'].append({"name": secret_name})
+        await self.__do_put(url, data)
+
+    async def unlink_secret(self, service_account, secret_name):
+        """Unlink a secret from a service account."""
+        url = '/api/v1/namespaces/{}/serviceaccounts/{}'.format(self.namespace, service_account)
+        status, data = await self.__do_get(url)
+        _raise_for_status('GET', url, status)
+        data['secrets'] = [{"name": secret['name']} for secret in data['secrets']
+                           if secret['name'] != secret_name]
+        await self.__do_put(url, data)
+
+    async def create_imagestream(self, name, app_name):
+        """Create an ImageStream with a name and app_name as label."""
+        await self.__do_post('/apis/image.openshift.io/v1/namespaces/{}/imagestreams'.format(self.namespace),
+                             Manifests.imagestream(name, app_name))
+
+    async def create_buildconfig(self, name, app_name, imagestreamtag, source_git,
+        source_context_dir, source_secret, source_image):
+        """Create a buildconfig. See ApiConnector.create_buildconfig."""
+        await self.__do_post('/apis/build.openshift.io/v1/namespaces/{}/buildconfigs'.format(self.namespace),
+                             Manifests.buildconfig(name, app_name, imagestreamtag, source_git,
+                                                   source_context_dir, source_secret, source_image))
+
+    async def create_deploymentconfig(self, app_name, name, image, tcp_port, replicas=1, node=None):
+        await self.__do_post('/apis/apps.openshift.io/v1/namespaces/{}/deploymentconfigs'.format(self.namespace),
+                             Manifests.deploymentconfig(self.namespace, app_name, name, image, tcp_port, replicas, node))
+
+    async def create_service(self, app_name, name, tcp_port, selector_dc):
+        await self.__do_post('/api/v1/namespaces/{}/services'.format(self.namespace),
+                             Manifests.service(app_name, name, tcp_port, selector_dc))
+
+    async def start_build(self, name):
+        await self.__do_post('/apis/build.openshift.io/v1/namespaces/{}/buildconfigs/{}/instantiate'.format(
+                                 self.namespace, name),
+                             Manifests.build_request(name))
+
+    async def start_deployment(self, deploymentconfig):
+        await self.__do_post('/apis/apps.openshift.io/v1/namespaces/{}/deploymentconfigs/{}/instantiate'.format(
+                                 self.namespace, deploymentconfig),
+                             Manifests.deployment_request(deploymentconfig))
+
+    async def create_route(self, app_name, name, svc_name, target_port, host):
+        await self.__do_post('/apis/route.openshift.io/v1/namespaces/{}/routes'.format(self.namespace),
+                             Manifests.route(app_name, name, svc_name, target_port, host))
+
+    async def delete_deploymentconfig(self, name):
+        return await self.__do_delete('/apis/apps.openshift.io/v1/namespaces/{}/deploymentconfigs/{}'.format(
+            self.namespace, name))
+
+    async def delete_imagestream(self, name):
+        return await self.__do_delete('/apis/image.openshift.io/v1/namespaces/{}/imagestreams/{}'.format(
+            self.namespace, name))
+
+    async def delete_buildconfig(self, name):
+        return await self.__do_delete('/apis/build.openshift.io/v1/namespaces/{}/buildconfigs/{}'.format(
+            self.namespace, name))
+
+    async def delete_secret(self, name):
+        return await self.__do_delete('/api/v1/namespaces/{}/secrets/{}'.format(
+            self.namespace, name))
+
+    async def delete_service(self, name):
+        return await self.__do_delete('/api/v1/namespaces/{}/services/{}'.format(
+            self.namespace, name))
+
+    async def delete_route(self, name):
+        return await self.__do_delete('/apis/route.openshift.io/v1/namespaces/{}/routes/{}'.format(
+            self.namespace, name))
+
+    async def delete_self_project(self):
+        return await self.__do_delete('/apis/project.openshift.io/v1/projects/{}'.format(
+            self.namespace))
+
+    def __pods_url(self, label_selector=None, field_selector=None):
+        """URL of the pods in the namespace, limited by the selectors."""
+        params = {}
+        if label_selector is not None:
+            params['labelSelector'] = label_selector
+        if field_selector is not None:
+            params['fieldSelector'] = field_selector
+        url = '/api/v1/namespaces/{}/pods'.format(self.namespace)
+        if params:
+            url += '?' + urllib.parse.urlencode(params)
+        return url
+
+    async def get_pods(self, label_selector=None, field_selector=None):
+        status, data = await self.__do_get(self.__pods_url(label_selector, field_selector))
+        _raise_for_status('GET', 'pods', status)
+        pods = {}
+        for item in data['items']:
+            pod = _pod_summary(item)
+            if pod is not None:
+                pods[pod.name] = pod
+        return pods
+
+    async def wait_for_pods(self, condition, timeout=60, label_selector=None, field_selector=None):
+        """Wait until condition returns a true value. condition gets the
+        same dict as get_pods() returns. Returns the value of condition,
+        or None on timeout."""
+        return await self.__wait_for(self.__pods_url(label_selector, field_selector),
+                                     _pod_summary, condition, timeout)
+
+class HTTPError(RuntimeError):
+    """Raised when the API returns an unsuccessful status code."""
+    def __init__(self, method, url, status):
+        super().__init__("{} {} failed with status {}".format(method, url, status))
+        self.status = status
+
+def _raise_for_status(method, url, status):
+    """Raise HTTPError when status is not successful."""
+    if status >= 400:
+        raise HTTPError(method, url, status)
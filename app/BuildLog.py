@@ -0,0 +1,85 @@
+import collections
+import re
+import threading
+import time
+import requests
+
+# Lines of an S2I build log that mark the start of a step. The first match
+# of every marker is timed.
+MARKERS = [
+    ('clone', re.compile(r'^Cloning "')),
+    ('cloned', re.compile(r'^\s*Commit:')),
+    ('pull', re.compile(r'^(Pulling image|Trying to pull|Getting image source signatures)')),
+    ('build', re.compile(r'^STEP 1(/\d+)?: FROM')),
+    ('assemble', re.compile(r'(/usr/libexec/s2i/assemble|---> Installing application source)')),
+    ('commit', re.compile(r'^(COMMIT|STEP \d+(/\d+)?: COMMIT)')),
+    ('push', re.compile(r'^Pushing image')),
+    ('pushed', re.compile(r'^(Successfully pushed|Push successful)'))]
+
+# Durations computed from the markers: name, start marker, end marker.
+PARTS = [
+    ('clone', 'clone', 'cloned'),
+    ('pull', 'pull', 'build'),
+    ('assemble', 'assemble', 'commit'),
+    ('commit', 'commit', 'push'),
+    ('push', 'push', 'pushed')]
+
+class BuildLogReader:
+    """Follows the log of a build in a thread, line by line, and remembers
+    when the lines in MARKERS arrived and the last lines for error
+    messages. The log itself isn't kept."""
+
+    def __init__(self, connector, build, timeout=600, keep_lines=20):
+        self.c = connector
+        self.build = build
+        self.timeout = timeout
+        self.marks = {}
+        self.last_lines = collections.deque(maxlen=keep_lines)
+        self.lines = 0
+        self.bytes = 0
+        self.error = None
+        self.start = None
+        self.thread = None
+
+    def feed(self, line):
+        """Process one line of the log."""
+        self.lines += 1
+        self.bytes += len(line) + 1
+        self.last_lines.append(line)
+        now = time.monotonic() - self.start
+        for name, pattern in MARKERS:
+            if name not in self.marks and pattern.search(line):
+                self.marks[name] = now
+
+    def __follow(self):
+        try:
+            for line in self.c.follow_build_log(self.build, self.timeout):
+                self.feed(line)
+        except (requests.exceptions.RequestException, RuntimeError) as ex:
+            # Timings from the log are extra information, they must not fail the round.
+            self.error = str(ex)
+
+    def begin(self):
+        self.start = time.monotonic()
+        self.thread = threading.Thread(target=self.__follow, daemon=True)
+        self.thread.start()
+
+    def join(self, timeout=10):
+        """Wait until the log ended. Returns False when it didn't within timeout seconds."""
+        self.thread.join(timeout)
+        return not self.thread.is_alive()
+
+    def parts(self):
+        """Durations of the parts in PARTS of which both markers were seen."""
+        return {name: self.marks[end] - self.marks[begin] for name, begin, end in PARTS
+                if begin in self.marks and end in self.marks}
+
+def stage_durations(build):
+    """Durations in seconds of the stages and steps in status.stages of a
+    build object, as a dict of 'Stage' and 'Stage.Step' to seconds."""
+    result = {}
+    for stage in build.get('status', {}).get('stages') or []:
+        result[stage['name']] = stage.get('durationMilliseconds', 0) / 1000
+        for step in stage.get('steps') or []:
+            result['{}.{}'.format(stage['name'], step['name'])] = step.get('durationMilliseconds', 0) / 1000
+    return result
@@ -0,0 +1,210 @@
+import collections
+import concurrent.futures
+import queue
+import threading
+import time
+import requests
+import RouteProber
+
+class ChurnEngine:
+    """Creates and deletes Services, Routes and DeploymentConfigs over and
+    over, spread over names names, to stress the load balancer and ACL
+    programming of the SDN. Every name goes through a cycle: create the
+    objects, wait until the new Service answers through its Route, delete
+    the objects. concurrency cycles run at the same time and API calls are
+    paced to rate per second. A run takes its duration: waits for a route
+    are cut off at the end, the cycles only delete their objects then.
+
+    Only the Service and Route path is churned: the Services select the
+    pods of selector_dc, which have app label selector_app, so they are
+    reachable as soon as the SDN and router are programmed. The pods of the
+    churned DeploymentConfigs aren't behind the churned Routes, creating
+    and deleting them only churns scheduling and pod networking. host(name)
+    returns the route host of a name."""
+
+    def __init__(self, connector, host, selector_dc, selector_app, rate=10, concurrency=5, names=20,
+                 kinds=('service', 'route'), image=None, image_namespace=None, reach_timeout=30,
+                 probe_interval=0.1):
+        self.c = connector
+        self.host = host
+        self.selector_dc = selector_dc
+        self.selector_app = selector_app
+        self.interval = 1.0 / rate if rate > 0 else 0
+        self.concurrency = concurrency
+        self.names = ['churn-{}'.format(i) for i in range(1, names + 1)]
+        self.kinds = kinds
+        self.image = image
+        self.image_namespace = image_namespace
+        self.reach_timeout = reach_timeout
+        self.probe_interval = probe_interval
+        self.lock = threading.Lock()
+        self.next_call = time.monotonic()
+        self.latencies = collections.defaultdict(list)
+        self.errors = collections.Counter()
+        self.reachable = []
+        self.unreachable = 0
+        # Waits for a route cut off by the end of the run, and the seconds
+        # cycles spent waiting for routes.
+        self.cut = 0
+        self.reach_wait = 0.0
+        self.cycles = 0
+        # Calls sent before the end of the run, the rate is counted over those.
+        self.window_calls = 0
+        self.deadline = None
+        # Runs the probes of the routes during run(). The DNS lookup of a
+        # probe can't be timed out, waiting for it can.
+        self.probes = None
+
+    def __ended(self):
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def __pace(self):
+        """Wait for the next free slot, so calls are spread evenly. After
+        the end of the run the deletes of the cycles aren't paced."""
+        with self.lock:
+            now = time.monotonic()
+            if self.__ended():
+                return
+            slot = max(self.next_call, now)
+            self.next_call = slot + self.interval
+        time.sleep(max(slot - now, 0))
+
+    def __call(self, verb, function, *args, **kwargs):
+        """Do one paced API call and record its latency. Returns the time
+        it was sent, or None when it failed."""
+        self.__pace()
+        start = time.monotonic()
+        try:
+            r = function(*args, **kwargs)
+            ok = r is None or r.status_code < 400 or r.status_code == 404
+        except (requests.exceptions.RequestException, RuntimeError):
+            ok = False
+        with self.lock:
+            self.latencies[verb].append(time.monotonic() - start)
+            if self.deadline is None or start < self.deadline:
+                self.window_calls += 1
+            if not ok:
+                self.errors[verb] += 1
+        return start if ok else None
+
+    def __wait_reachable(self, name, start):
+        """Time from start (when the Service was created) until the route
+        of name returns status 200, None after reach_timeout seconds or
+        False when the run ended first."""
+        host = self.host(name)
+        host, _, port = host.partition(':')
+        limit = start + self.reach_timeout
+        if self.deadline is not None:
+            limit = min(limit, self.deadline)
+        while time.monotonic() < limit:
+            probe = self.probes.submit(RouteProber.probe_once, host, int(port) if port else 80,
+                                       timeout=min(2, max(limit - time.monotonic(), 0.1)))
+            try:
+                if probe.result(timeout=max(limit - time.monotonic(), 0))['status'] == 200:
+                    return time.monotonic() - start
+            except concurrent.futures.TimeoutError:
+                break
+            time.sleep(min(self.probe_interval, max(limit - time.monotonic(), 0)))
+        return None if time.monotonic() - start >= self.reach_timeout else False
+
+    def __cycle(self, name):
+        if 'deploymentconfig' in self.kinds:
+            if self.__call('create_deploymentconfig', self.c.create_deploymentconfig,
+                           app_name=name, name=name + '-dc', image=self.image, tcp_port=8080,
+                           image_namespace=self.image_namespace) is not None:
+                self.__call('start_deployment', self.c.start_deployment, name + '-dc')
+        if 'service' in self.kinds and 'route' in self.kinds:
+            created = self.__call('create_service', self.c.create_service,
+                                  app_name=name, name=name, tcp_port=8080, selector_dc=self.selector_dc,
+                                  selector_app=self.selector_app)
+            routed = self.__call('create_route', self.c.create_route,
+                                 app_name=name, name=name, svc_name=name, target_port='8080-tcp',
+                                 host=self.host(name))
+            if created is not None and routed is not None:
+                waiting = time.monotonic()
+                reach = self.__wait_reachable(name, created)
+                with self.lock:
+                    self.reach_wait += time.monotonic() - waiting
+                    if reach is None:
+                        self.unreachable += 1
+                    elif reach is False:
+                        self.cut += 1
+                    else:
+                        self.reachable.append(reach)
+        elif 'service' in self.kinds:
+            self.__call('create_service', self.c.create_service,
+                        app_name=name, name=name, tcp_port=8080, selector_dc=self.selector_dc,
+                        selector_app=self.selector_app)
+        if 'route' in self.kinds and 'service' in self.kinds:
+            self.__call('delete_route', self.c.delete_route, name)
+        if 'service' in self.kinds:
+            self.__call('delete_service', self.c.delete_service, name)
+        if 'deploymentconfig' in self.kinds:
+            self.__call('delete_deploymentconfig', self.c.delete_deploymentconfig, name + '-dc')
+        with self.lock:
+            self.cycles += 1
+
+    def run(self, duration):
+        """Churn for duration seconds. Cycles that are running at the end
+        only delete their objects. Returns the result, see result()."""
+        free = queue.Queue()
+        for name in self.names:
+            free.put(name)
+        start = time.monotonic()
+        self.deadline = deadline = start + duration
+
+        def worker():
+            while time.monotonic() < deadline:
+                try:
+                    name = free.get(timeout=min(0.5, max(deadline - time.monotonic(), 0.01)))
+                except queue.Empty:
+                    continue
+                try:
+                    self.__cycle(name)
+                finally:
+                    free.put(name)
+
+        # Probes that were given up on may still be running, so twice as many.
+        self.probes = concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency * 2,
+                                                            thread_name_prefix='churn-probe')
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                for future in [executor.submit(worker) for _ in range(self.concurrency)]:
+                    future.result()
+        finally:
+            self.probes.shutdown(wait=False)
+        return self.result(min(time.monotonic(), deadline) - start)
+
+    def clean(self):
+        """Delete the objects of all names, for when a cycle failed halfway."""
+        for name in self.names:
+            if 'route' in self.kinds:
+                self.c.delete_route(name)
+            if 'service' in self.kinds:
+                self.c.delete_service(name)
+            if 'deploymentconfig' in self.kinds:
+                self.c.delete_deploymentconfig(name + '-dc')
+
+    def result(self, elapsed):
+        """Dict with the number of cycles and API calls, calls per second
+        sent during elapsed seconds, errors, per verb the p50/p95/p99
+        latency and the time until new services were reachable. The share
+        of the time the cycles spent waiting for routes
+        (reach_wait_share) tells when that, not rate, limited the calls
+        per second."""
+        def percentiles(samples):
+            samples = sorted(samples)
+            return {'p{}'.format(p): samples[min(int(len(samples) * p / 100), len(samples) - 1)]
+                    for p in [50, 95, 99]} if samples else {}
+        calls = sum(len(samples) for samples in self.latencies.values())
+        return {
+            'cycles': self.cycles,
+            'calls': calls,
+            'calls_per_second': self.window_calls / elapsed if elapsed > 0 else 0.0,
+            'reach_wait_share': min(self.reach_wait / (elapsed * self.concurrency), 1.0) if elapsed > 0 else 0.0,
+            'errors': sum(self.errors.values()),
+            'verbs': {verb: dict(percentiles(samples), n=len(samples), errors=self.errors.get(verb, 0))
+                      for verb, samples in sorted(self.latencies.items())},
+            'reachable': dict(percentiles(self.reachable), n=len(self.reachable)),
+            'unreachable': self.unreachable,
+            'reach_cut': self.cut}
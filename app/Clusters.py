@@ -0,0 +1,86 @@
+import concurrent.futures
+import configparser
+import threading
+import time
+
+# Sections [cluster:<name>] configure one cluster each.
+PREFIX = 'cluster:'
+
+# Options of a cluster section that belong to the authentication section,
+# all other options without a section belong to the connection section.
+AUTHENTICATION_OPTIONS = ['token', 'username', 'password', 'token_cache', 'token_refresh_margin']
+CREDENTIALS = ['token', 'username', 'password']
+
+def cluster_names(config):
+    """Names of the clusters in config, in the order of their sections."""
+    return [section[len(PREFIX):] for section in config.sections() if section.startswith(PREFIX)]
+
+def cluster_config(config, name):
+    """Configuration of cluster name: config with the options of section
+    [cluster:<name>] put in place. Options of the connection and
+    authentication sections (api_url, token, ...) are given as is, options
+    of other sections as <section>.<option>. When the cluster section has
+    credentials, the credentials of the authentication section aren't used."""
+    result = configparser.ConfigParser()
+    result.read_dict({section: dict(config.items(section, raw=True)) for section in config.sections()
+                      if not section.startswith(PREFIX)})
+    options = {key: value for key, value in config.items(PREFIX + name, raw=True)
+               if key != 'concurrency' and not config.has_option(configparser.DEFAULTSECT, key)}
+    if any(key in CREDENTIALS for key in options):
+        for key in CREDENTIALS:
+            result.remove_option('authentication', key)
+    for key, value in options.items():
+        if '.' in key:
+            section, key = key.split('.', 1)
+        elif key in AUTHENTICATION_OPTIONS:
+            section = 'authentication'
+        else:
+            section = 'connection'
+        if not result.has_section(section):
+            result.add_section(section)
+        result.set(section, key, value)
+    return result
+
+class ClusterRunner:
+    """Runs the rounds of several clusters at the same time on one pool of
+    worker threads. A cluster runs at most limit rounds at once. A round
+    that is due while its cluster is at that limit is skipped, so a cluster
+    that hangs doesn't hold up the others."""
+
+    def __init__(self, workers):
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers,
+                                                              thread_name_prefix='cluster')
+        self.lock = threading.Lock()
+        self.limits = {}
+        # Cluster name -> round number -> time.monotonic() it started.
+        self.running = {}
+
+    def add(self, name, limit=1):
+        self.limits[name] = limit
+        self.running[name] = {}
+
+    def submit(self, name, function, number):
+        """Run function(number) for cluster name on the pool. Returns a
+        Future, or None when the cluster already runs limit rounds."""
+        with self.lock:
+            if len(self.running[name]) >= self.limits[name]:
+                return None
+            self.running[name][number] = time.monotonic()
+
+        def task():
+            try:
+                return function(number)
+            finally:
+                with self.lock:
+                    del self.running[name][number]
+        return self.executor.submit(task)
+
+    def running_for(self, name):
+        """Seconds the oldest running round of cluster name runs, or None."""
+        with self.lock:
+            started = self.running[name].values()
+            return time.monotonic() - min(started) if started else None
+
+    def close(self):
+        """Stop accepting rounds. Rounds that still run aren't waited for."""
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,144 @@
+import contextlib
+import threading
+import time
+import requests
+import ApiConnector
+
+# Steps of a pod start, in the order they normally happen, with the event
+# reasons that mark them. AddedInterface is sent by Multus when the SDN
+# (OVN-Kubernetes) has set up the network of the pod sandbox.
+STEPS = [
+    ('scheduled', ['Scheduled']),
+    ('network', ['AddedInterface']),
+    ('pulling', ['Pulling']),
+    ('pulled', ['Pulled']),
+    ('created', ['Created']),
+    ('started', ['Started'])]
+
+# Reasons of events that explain why a pod doesn't start.
+PROBLEMS = ['FailedCreatePodSandBox', 'FailedScheduling', 'FailedMount', 'FailedAttachVolume',
+            'ErrImagePull', 'Failed', 'BackOff', 'Unhealthy', 'NetworkNotReady', 'FailedKillPod',
+            'ErrorAddingLogicalPort', 'ErrorUpdatingResource']
+
+class EventCollector:
+    """Follows the events of a namespace in a thread while the round runs
+    and builds a startup timeline per pod. Times are seconds since the
+    collector started, taken when the event arrived, so they have a
+    better resolution than the timestamps in the events."""
+
+    def __init__(self, connector, poll=2):
+        self.c = connector
+        # Seconds of one watch request. stop() closes the watch, it only
+        # waits this long when closing didn't end it.
+        self.poll = poll
+        # Response of the running watch.
+        self.response = None
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.start = None
+        self.thread = None
+        self.error = None
+        # Pod name -> reason -> seconds of the first event with that reason.
+        self.pods = {}
+        # Pod name -> reason -> message of that event.
+        self.messages = {}
+        # (seconds, pod, reason, message) of the events in PROBLEMS.
+        self.problems = []
+
+    def __add(self, event):
+        received = time.monotonic() - self.start
+        involved = event.get('involvedObject', {})
+        if involved.get('kind') != 'Pod':
+            return
+        name = involved.get('name')
+        reason = event.get('reason', '')
+        with self.lock:
+            self.pods.setdefault(name, {}).setdefault(reason, received)
+            self.messages.setdefault(name, {}).setdefault(reason, event.get('message', ''))
+            if reason in PROBLEMS or event.get('type') == 'Warning':
+                self.problems.append((received, name, reason, event.get('message', '')))
+
+    def __opened(self, response):
+        with self.lock:
+            self.response = response
+            stopped = self.stopped.is_set()
+        if stopped:
+            ApiConnector.interrupt(response)
+
+    def __follow(self):
+        try:
+            resource_version = self.c.get_events_resource_version()
+            while not self.stopped.is_set():
+                expired = False
+                with contextlib.closing(self.c.watch_events(resource_version, self.poll, self.__opened)) as events:
+                    for event_type, obj in events:
+                        if event_type == 'ERROR':
+                            expired = True
+                            break
+                        resource_version = obj['metadata']['resourceVersion']
+                        if event_type == 'ADDED':
+                            self.__add(obj)
+                if expired:
+                    resource_version = self.c.get_events_resource_version()
+        except (requests.exceptions.RequestException, ValueError, KeyError) as ex:
+            # The timeline is extra information, a failing watch must not
+            # fail the round. Closing the watch in stop() ends up here too.
+            if not self.stopped.is_set():
+                self.error = str(ex)
+
+    def begin(self):
+        """Start following events in a thread."""
+        self.start = time.monotonic()
+        self.thread = threading.Thread(target=self.__follow, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop following events. Closes the running watch, so this
+        doesn't wait for it to end."""
+        with self.lock:
+            self.stopped.set()
+            response = self.response
+        if response is not None:
+            ApiConnector.interrupt(response)
+        if self.thread is not None:
+            self.thread.join(self.poll + 5)
+
+    def timeline(self, pod):
+        """Dict of step (see STEPS) to the seconds it happened, of the
+        steps seen for pod."""
+        with self.lock:
+            reasons = dict(self.pods.get(pod, {}))
+        result = {}
+        for step, step_reasons in STEPS:
+            times = [reasons[reason] for reason in step_reasons if reason in reasons]
+            if times:
+                result[step] = min(times)
+        return result
+
+    def breakdown(self, pod):
+        """Durations of the parts of the start of pod: sandbox and network
+        setup (scheduled until the interface was added), image pull,
+        creating and starting the container and the total from scheduled
+        until started. Parts that can't be computed are left out."""
+        t = self.timeline(pod)
+        parts = {
+            'network': ('scheduled', 'network'),
+            'pull': ('pulling', 'pulled'),
+            'create': ('pulled', 'created'),
+            'start': ('created', 'started'),
+            'total': ('scheduled', 'started')}
+        return {name: t[end] - t[begin] for name, (begin, end) in parts.items()
+                if begin in t and end in t}
+
+    def message(self, pod, reason):
+        """Message of the first event of pod with reason, or None."""
+        with self.lock:
+            return self.messages.get(pod, {}).get(reason)
+
+    def pod_names(self):
+        with self.lock:
+            return list(self.pods)
+
+    def problems_of(self, pod):
+        with self.lock:
+            return [p for p in self.problems if p[1] == pod]
@@ -0,0 +1,791 @@
+import collections
+import copy
+import itertools
+import json
+import random
+import re
+import string
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# In-process stand-in for the parts of the OpenShift API the health check
+# uses. Pods of builds and deployments go through their phases on timers,
+# and latency and faults can be injected. Requests that aren't for the API
+# are answered as if they went through a route to the application.
+#
+#   server = FakeApiServer(build_time=0.5)
+#   c = ApiConnector.ApiConnector(server.url, 'health-check', token='fake')
+#   ...
+#   server.close()
+
+API_PATH = re.compile(r'^/(?:api/v1|apis/[^/]+/v1)/namespaces/([^/]+)/([^/]+)(?:/([^/]+))?(?:/([^/]+))?$')
+
+class FakeApiServer:
+    def __init__(self, port=0, nodes=('worker-0', 'worker-1', 'worker-2'),
+                 latency=0.0, sa_delay=0.05, build_schedule=0.05, build_time=0.3,
+                 deploy_delay=0.05, pod_start=0.1, route_delay=0.05, delete_delay=0.1,
+                 endpoints_delay=0.02, sandbox_delay=0.02, pull_time=0.05, image_size=120000000,
+                 project_conflicts=0, forbidden=(), token_lifetime=86400):
+        """Timings are in seconds:
+        - latency: added to every API request.
+        - sa_delay: until the service accounts of a new project exist.
+        - build_schedule, build_time: until the build pod is scheduled
+          and until it succeeded.
+        - deploy_delay, pod_start: until application pods are scheduled
+          and until they are running.
+        - route_delay: until a running pod is reachable through its route.
+        - endpoints_delay: until a change of a pod shows in the endpoints.
+        - sandbox_delay: from scheduling a pod until its network is added.
+        - pull_time: pulling an image of image_size bytes on a node that
+          doesn't have it yet.
+        - delete_delay: how long a deleted project stays Terminating.
+        - token_lifetime: expires_in of tokens issued by /oauth/authorize.
+        Faults:
+        - project_conflicts: number of project requests answered with 409.
+        - forbidden: regular expressions of paths answered with 403.
+        """
+        self.nodes = list(nodes)
+        self.latency = latency
+        self.sa_delay = sa_delay
+        self.build_schedule = build_schedule
+        self.build_time = build_time
+        self.deploy_delay = deploy_delay
+        self.pod_start = pod_start
+        self.route_delay = route_delay
+        self.endpoints_delay = endpoints_delay
+        self.sandbox_delay = sandbox_delay
+        self.pull_time = pull_time
+        self.image_size = image_size
+        # (node, image) of the images the nodes pulled.
+        self.pulled = set()
+        self.delete_delay = delete_delay
+        self.project_conflicts = project_conflicts
+        self.forbidden = [re.compile(pattern) for pattern in forbidden]
+        self.token_lifetime = token_lifetime
+        self.logins = 0
+        self.revoked = set()
+        self.lock = threading.Condition()
+        self.namespaces = {}
+        self.events = []
+        self.resource_version = 0
+        self.request_counts = collections.Counter()
+        self.node_cycle = itertools.cycle(self.nodes)
+        self.timers = []
+        self.running_since = {}
+        # (namespace, build) -> log lines written so far.
+        self.build_logs = {}
+        # (namespace, pod) -> log of pods of jobs.
+        self.pod_logs = {}
+        self.closed = False
+
+        server = self
+        class Handler(_Handler):
+            fake = server
+        with self.lock:
+            # Namespace with the base images, like on a real cluster.
+            self.create_project('openshift')
+            self.set_base_image('php:7.4-ubi8', 'sha256:' + _random_suffix(12))
+        self.httpd = _Server(('127.0.0.1', port), Handler)
+        self.port = self.httpd.server_address[1]
+        self.url = 'http://127.0.0.1:{}'.format(self.port)
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def login(self):
+        """Issue a new access token."""
+        with self.lock:
+            self.logins += 1
+            return 'sha256~fake-{}'.format(self.logins)
+
+    def revoke_tokens(self):
+        """Answer 401 to every token issued so far."""
+        with self.lock:
+            self.revoked.update('sha256~fake-{}'.format(i) for i in range(1, self.logins + 1))
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            for timer in self.timers:
+                timer.cancel()
+            self.lock.notify_all()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    # Helpers for the simulation. All of them expect self.lock to be held.
+
+    def later(self, delay, function, *args):
+        """Call function(*args) with the lock held after delay seconds."""
+        def run():
+            with self.lock:
+                if not self.closed:
+                    function(*args)
+        timer = threading.Timer(delay, run)
+        timer.daemon = True
+        self.timers = [t for t in self.timers if t.is_alive()] + [timer]
+        timer.start()
+
+    def next_version(self):
+        self.resource_version += 1
+        return str(self.resource_version)
+
+    def emit(self, namespace, kind, event_type, obj):
+        obj['metadata']['resourceVersion'] = self.next_version()
+        self.events.append((int(obj['metadata']['resourceVersion']), namespace, kind,
+                            event_type, copy.deepcopy(obj)))
+        self.lock.notify_all()
+
+    def store(self, namespace, kind, obj, event_type='ADDED'):
+        """Add or replace obj in namespace."""
+        metadata = obj.setdefault('metadata', {})
+        metadata['namespace'] = namespace
+        metadata.setdefault('uid', _random_suffix(12))
+        metadata.setdefault('creationTimestamp', time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()))
+        metadata.setdefault('labels', {})
+        self.namespaces[namespace]['resources'][kind][metadata['name']] = obj
+        self.emit(namespace, kind, event_type, obj)
+        if kind in ['pods', 'services']:
+            self.later(self.endpoints_delay, self.update_endpoints, namespace)
+        return obj
+
+    def remove(self, namespace, kind, name):
+        obj = self.namespaces[namespace]['resources'][kind].pop(name, None)
+        if obj is not None:
+            self.emit(namespace, kind, 'DELETED', obj)
+            if kind in ['pods', 'services']:
+                self.later(self.endpoints_delay, self.update_endpoints, namespace)
+        return obj
+
+    def get(self, namespace, kind, name):
+        if namespace not in self.namespaces:
+            return None
+        return self.namespaces[namespace]['resources'][kind].get(name)
+
+    # Simulated controllers.
+
+    def create_project(self, name):
+        namespace = {'kind': 'Namespace', 'apiVersion': 'v1',
+                     'metadata': {'name': name, 'labels': {}},
+                     'status': {'phase': 'Active'}}
+        self.namespaces[name] = {'object': namespace, 'terminating': False,
+                                 'resources': collections.defaultdict(dict)}
+        self.emit(None, 'namespaces', 'ADDED', namespace)
+        self.later(self.sa_delay, self.create_serviceaccounts, name)
+
+    def create_serviceaccounts(self, name):
+        if name not in self.namespaces or self.namespaces[name]['terminating']:
+            return
+        for account in ['builder', 'default', 'deployer']:
+            self.store(name, 'serviceaccounts', {
+                'kind': 'ServiceAccount', 'apiVersion': 'v1',
+                'metadata': {'name': account},
+                'secrets': [{'name': '{}-dockercfg-{}'.format(account, _random_suffix(5))}]})
+
+    def delete_project(self, name):
+        self.namespaces[name]['terminating'] = True
+        namespace = self.namespaces[name]['object']
+        namespace['status']['phase'] = 'Terminating'
+        self.emit(None, 'namespaces', 'MODIFIED', namespace)
+        self.later(self.delete_delay, self.finish_delete_project, name)
+
+    def finish_delete_project(self, name):
+        namespace = self.namespaces.pop(name)
+        self.emit(None, 'namespaces', 'DELETED', namespace['object'])
+
+    def cascade_delete(self, namespace, kind, name):
+        """Remove what the garbage collector removes with kind/name."""
+        resources = self.namespaces[namespace]['resources']
+        if kind == 'buildconfigs':
+            for build in list(resources['builds'].values()):
+                if build['metadata']['labels'].get('buildconfig') == name:
+                    self.remove(namespace, 'builds', build['metadata']['name'])
+                    self.remove(namespace, 'pods', build['metadata']['annotations']['openshift.io/build.pod-name'])
+        if kind == 'jobs':
+            for pod in list(resources['pods'].values()):
+                if pod['metadata']['labels'].get('job-name') == name:
+                    self.remove(namespace, 'pods', pod['metadata']['name'])
+        if kind == 'deploymentconfigs':
+            for pod in list(resources['pods'].values()):
+                labels = pod['metadata']['labels']
+                if labels.get('deploymentconfig') == name or \
+                        labels.get('openshift.io/deployer-pod-for.name', '').rsplit('-', 1)[0] == name:
+                    self.remove(namespace, 'pods', pod['metadata']['name'])
+
+    def set_pod(self, namespace, name, phase, node=None):
+        pod = self.get(namespace, 'pods', name)
+        if pod is None:
+            return
+        pod['status']['phase'] = phase
+        if node is not None:
+            pod['spec']['nodeName'] = node
+            pod['status']['podIP'] = '10.128.{}.{}'.format(random.randint(0, 255), random.randint(2, 254))
+            self.pod_event(namespace, name, 'Scheduled', 'Successfully assigned {}/{} to {}'.format(namespace, name, node))
+            self.later(self.sandbox_delay, self.pod_event, namespace, name, 'AddedInterface',
+                       'Add eth0 [{}/23] from ovn-kubernetes'.format(pod['status']['podIP']))
+            image = pod['spec']['containers'][0].get('image')
+            if image is not None and (node, image) not in self.pulled:
+                self.pulled.add((node, image))
+                self.later(self.sandbox_delay, self.pod_event, namespace, name, 'Pulling',
+                           'Pulling image "{}"'.format(image))
+                self.later(self.sandbox_delay + self.pull_time, self.pod_event, namespace, name, 'Pulled',
+                           'Successfully pulled image "{}" in {:.3f}s ({:.3f}s including waiting). '
+                           'Image size: {} bytes.'.format(image, self.pull_time, self.pull_time, self.image_size))
+            else:
+                self.later(self.sandbox_delay, self.pod_event, namespace, name, 'Pulled',
+                           'Container image already present on machine')
+        if phase == 'Running':
+            pod['status']['startTime'] = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+            self.running_since[(namespace, name)] = time.time()
+            self.pod_event(namespace, name, 'Created', 'Created container')
+            self.pod_event(namespace, name, 'Started', 'Started container')
+        self.store(namespace, 'pods', pod, 'MODIFIED')
+
+    def pod_event(self, namespace, pod, reason, message, event_type='Normal'):
+        if namespace not in self.namespaces:
+            return
+        now = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        self.store(namespace, 'events', {
+            'kind': 'Event', 'apiVersion': 'v1',
+            'metadata': {'name': '{}.{}'.format(pod, _random_suffix(16))},
+            'involvedObject': {'kind': 'Pod', 'name': pod, 'namespace': namespace},
+            'reason': reason, 'message': message, 'type': event_type,
+            'firstTimestamp': now, 'lastTimestamp': now, 'count': 1})
+
+    def set_build(self, namespace, name, phase):
+        build = self.get(namespace, 'builds', name)
+        if build is not None:
+            build['status']['phase'] = phase
+            if phase == 'Complete':
+                build['status']['stages'] = _build_stages(self.build_time - self.build_schedule * 2)
+            self.store(namespace, 'builds', build, 'MODIFIED')
+            self.lock.notify_all()
+
+    def build_log(self, namespace, name, line):
+        self.build_logs.setdefault((namespace, name), []).append(line)
+        self.lock.notify_all()
+
+    def set_base_image(self, imagestreamtag, digest):
+        """Point imagestreamtag in namespace openshift at image digest."""
+        self.tag_image('openshift', imagestreamtag, digest)
+
+    def tag_image(self, namespace, imagestreamtag, digest):
+        if namespace not in self.namespaces:
+            return
+        exists = self.get(namespace, 'imagestreamtags', imagestreamtag) is not None
+        self.store(namespace, 'imagestreamtags', {
+            'kind': 'ImageStreamTag', 'apiVersion': 'image.openshift.io/v1',
+            'metadata': {'name': imagestreamtag},
+            'image': {'metadata': {'name': digest}}}, 'MODIFIED' if exists else 'ADDED')
+
+    def import_tags(self, namespace, imagestream):
+        """Resolve the spec.tags of imagestream that point at an image."""
+        for tag in imagestream.get('spec', {}).get('tags', []):
+            source = tag.get('from', {})
+            if source.get('kind') == 'ImageStreamImage':
+                self.tag_image(namespace, '{}:{}'.format(imagestream['metadata']['name'], tag['name']),
+                               source['name'].split('@', 1)[1])
+
+    def start_build(self, namespace, buildconfig):
+        version = buildconfig['status']['lastVersion'] = buildconfig['status'].get('lastVersion', 0) + 1
+        build_name = '{}-{}'.format(buildconfig['metadata']['name'], version)
+        pod_name = build_name + '-build'
+        self.store(namespace, 'builds', {
+            'kind': 'Build', 'apiVersion': 'build.openshift.io/v1',
+            'metadata': {'name': build_name, 'labels': {'buildconfig': buildconfig['metadata']['name']},
+                         'annotations': {'openshift.io/build.pod-name': pod_name}},
+            'status': {'phase': 'New'}})
+        self.store(namespace, 'pods', _pod(pod_name, {'openshift.io/build.name': build_name}))
+        node = next(self.node_cycle)
+        self.later(self.build_schedule, self.set_pod, namespace, pod_name, 'Pending', node)
+        self.later(self.build_schedule, self.set_build, namespace, build_name, 'Running')
+        self.later(self.build_schedule * 2, self.set_pod, namespace, pod_name, 'Running')
+        self.build_logs[(namespace, build_name)] = []
+        for i, line in enumerate(BUILD_LOG):
+            at = self.build_schedule * 2 + (self.build_time - self.build_schedule * 2) * i / len(BUILD_LOG)
+            self.later(at, self.build_log, namespace, build_name, line.format(namespace=namespace))
+        self.later(self.build_time, self.set_pod, namespace, pod_name, 'Succeeded')
+        self.later(self.build_time, self.tag_image, namespace, buildconfig['spec']['output']['to']['name'],
+                   'sha256:' + _random_suffix(12))
+        self.later(self.build_time, self.set_build, namespace, build_name, 'Complete')
+        return build_name
+
+    def start_deployment(self, namespace, dc):
+        version = dc['status']['latestVersion'] = dc['status'].get('latestVersion', 0) + 1
+        name = dc['metadata']['name']
+        deployer = '{}-{}-deploy'.format(name, version)
+        self.store(namespace, 'pods', _pod(deployer, {'openshift.io/deployer-pod-for.name': '{}-{}'.format(name, version)}))
+        self.set_pod(namespace, deployer, 'Running', next(self.node_cycle))
+        self.scale_deployment(namespace, dc)
+        self.later(self.deploy_delay + self.pod_start, self.set_pod, namespace, deployer, 'Succeeded')
+
+    def start_job(self, namespace, job):
+        """Run the pod of an in-cluster probe job: it answers every sample
+        of the targets in its environment and succeeds."""
+        template = job['spec']['template']
+        name = '{}-{}'.format(job['metadata']['name'], _random_suffix(5))
+        pod = _pod(name, template['metadata']['labels'])
+        pod['spec']['containers'] = [dict(container) for container in template['spec']['containers']]
+        self.store(namespace, 'pods', pod)
+        env = {item['name']: item['value'] for item in template['spec']['containers'][0].get('env', [])}
+        samples, interval = int(env.get('SAMPLES', 1)), float(env.get('INTERVAL', 1))
+        self.later(self.deploy_delay, self.set_pod, namespace, name, 'Pending', next(self.node_cycle))
+        self.later(self.deploy_delay + self.pod_start, self.set_pod, namespace, name, 'Running')
+        self.later(self.deploy_delay + self.pod_start + samples * interval, self.finish_job,
+                   namespace, name, env, samples, interval)
+
+    def finish_job(self, namespace, pod, env, samples, interval):
+        start = time.time() - samples * interval
+        lines = []
+        for sample in range(samples):
+            for target in env.get('TARGETS', '').split():
+                target, _, url = target.partition('=')
+                host = urllib.parse.urlsplit(url).hostname
+                code = 200 if target != 'route' or self.route_backends(host) else 503
+                seconds = {'pod': 0.001, 'service': 0.0015}.get(target, 0.003) + random.random() * 0.001
+                lines.append('{} {} {:.6f} {} {:.6f} {:.6f} {:.6f}'.format(
+                    sample, target, start + sample * interval, code, seconds / 3, seconds * 0.9, seconds))
+        self.pod_logs[(namespace, pod)] = lines
+        self.set_pod(namespace, pod, 'Succeeded')
+
+    def scale_deployment(self, namespace, dc):
+        """Start or remove pods of the latest deployment of dc until it
+        has spec.replicas pods."""
+        version = dc['status'].get('latestVersion', 0)
+        if version == 0:
+            return
+        name = dc['metadata']['name']
+        template = dc['spec']['template']
+        labels = dict(template['metadata']['labels'])
+        labels['deployment'] = '{}-{}'.format(name, version)
+        pods = sorted(pod['metadata']['name'] for pod in self.namespaces[namespace]['resources']['pods'].values()
+                      if pod['metadata']['labels'].get('deployment') == labels['deployment'])
+        for pod_name in pods[dc['spec'].get('replicas', 1):]:
+            self.remove(namespace, 'pods', pod_name)
+        for replica in range(dc['spec'].get('replicas', 1) - len(pods)):
+            pod_name = '{}-{}-{}'.format(name, version, _random_suffix(5))
+            pod = _pod(pod_name, labels)
+            pod['spec']['containers'] = [dict(container) for container in template['spec']['containers']]
+            self.store(namespace, 'pods', pod)
+            node = template['spec'].get('nodeName') or \
+                template['spec'].get('nodeSelector', {}).get('kubernetes.io/hostname') or \
+                next(self.node_cycle)
+            self.later(self.deploy_delay, self.set_pod, namespace, pod_name, 'Pending', node)
+            self.later(self.deploy_delay + self.pod_start, self.set_pod, namespace, pod_name, 'Running')
+
+    def update_endpoints(self, namespace):
+        """Make the endpoints of every service list its running pods."""
+        if namespace not in self.namespaces:
+            return
+        resources = self.namespaces[namespace]['resources']
+        for service in list(resources['services'].values()):
+            addresses = [{'ip': pod['status']['podIP'], 'nodeName': pod['spec']['nodeName'],
+                          'targetRef': {'kind': 'Pod', 'name': pod['metadata']['name'], 'namespace': namespace}}
+                         for pod in sorted(resources['pods'].values(), key=lambda pod: pod['metadata']['name'])
+                         if _labels_match(pod['metadata']['labels'], service['spec']['selector']) and
+                         pod['status']['phase'] == 'Running']
+            name = service['metadata']['name']
+            subsets = [{'addresses': addresses, 'ports': [{'port': port['targetPort'], 'protocol': 'TCP'}
+                                                          for port in service['spec']['ports']]}] if addresses else []
+            current = resources['endpoints'].get(name)
+            if current is None:
+                self.store(namespace, 'endpoints', {'kind': 'Endpoints', 'apiVersion': 'v1',
+                                                    'metadata': {'name': name}, 'subsets': subsets})
+            elif current['subsets'] != subsets:
+                current['subsets'] = subsets
+                self.store(namespace, 'endpoints', current, 'MODIFIED')
+        for name in list(resources['endpoints']):
+            if name not in resources['services']:
+                self.remove(namespace, 'endpoints', name)
+
+    def route_backends(self, host):
+        """Names of the pods a route for host sends traffic to: the pods
+        behind its service that are running for at least route_delay seconds."""
+        backends = []
+        for ns_name, namespace in self.namespaces.items():
+            for route in namespace['resources']['routes'].values():
+                if route['spec']['host'].split(':')[0] != host:
+                    continue
+                service = namespace['resources']['services'].get(route['spec']['to']['name'])
+                if service is None:
+                    continue
+                for pod in namespace['resources']['pods'].values():
+                    if _labels_match(pod['metadata']['labels'], service['spec']['selector']) and \
+                            pod['status']['phase'] == 'Running' and \
+                            time.time() - self.running_since[(ns_name, pod['metadata']['name'])] >= self.route_delay:
+                        backends.append(pod['metadata']['name'])
+        return backends
+
+# Log of an S2I build, spread over the build time.
+BUILD_LOG = [
+    'Cloning "https://github.com/tomwis97/phpinfo-test" ...',
+    '\tCommit:\tabc1234 (Initial commit)',
+    'Caching blobs under "/var/cache/blobs".',
+    'Trying to pull image-registry.openshift-image-registry.svc:5000/openshift/php:7.4-ubi8...',
+    'Getting image source signatures',
+    'STEP 1/9: FROM image-registry.openshift-image-registry.svc:5000/openshift/php:7.4-ubi8',
+    'STEP 8/9: RUN /usr/libexec/s2i/assemble',
+    '---> Installing application source...',
+    'STEP 9/9: CMD /usr/libexec/s2i/run',
+    'COMMIT temp.builder.openshift.io/{namespace}/check-website-bc-1:abcdef',
+    'Pushing image image-registry.openshift-image-registry.svc:5000/{namespace}/check-website-is:latest ...',
+    'Successfully pushed image-registry.openshift-image-registry.svc:5000/{namespace}/check-website-is@sha256:0123',
+    'Push successful']
+
+def _build_stages(seconds):
+    """status.stages of a build that ran for seconds."""
+    start = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+    parts = [('FetchInputs', 'FetchGitSource', 0.15), ('PullImages', 'PullBaseImage', 0.2),
+             ('Build', 'DockerBuild', 0.45), ('PushImage', 'PushImage', 0.2)]
+    return [{'name': stage, 'startTime': start, 'durationMilliseconds': int(seconds * share * 1000),
+             'steps': [{'name': step, 'startTime': start, 'durationMilliseconds': int(seconds * share * 1000)}]}
+            for stage, step, share in parts]
+
+def _pod(name, labels):
+    return {'kind': 'Pod', 'apiVersion': 'v1',
+            'metadata': {'name': name, 'labels': dict(labels)},
+            'spec': {'containers': [{'name': name}]},
+            'status': {'phase': 'Pending'}}
+
+def _random_suffix(length):
+    return ''.join(random.choice(string.ascii_lowercase + string.digits) for _ in range(length))
+
+def _labels_match(labels, selector):
+    return all(labels.get(key) == value for key, value in selector.items())
+
+def _parse_selector(selector):
+    """Parse 'a=b,c==d' into a dict."""
+    result = {}
+    for part in filter(None, (selector or '').split(',')):
+        key, _, value = part.partition('=')
+        result[key] = value.lstrip('=')
+    return result
+
+def _field(obj, path):
+    for key in path.split('.'):
+        if not isinstance(obj, dict):
+            return None
+        obj = obj.get(key)
+    return obj
+
+def _matches(obj, query):
+    labels = _parse_selector(query.get('labelSelector'))
+    fields = _parse_selector(query.get('fieldSelector'))
+    return _labels_match(obj['metadata'].get('labels') or {}, labels) and \
+        all(str(_field(obj, key)) == value for key, value in fields.items())
+
+def _status(code, reason, message):
+    return code, {'kind': 'Status', 'apiVersion': 'v1', 'status': 'Failure',
+                  'reason': reason, 'message': message, 'code': code}
+
+def _pod_table(pods):
+    columns = ['Name', 'Ready', 'Status', 'Restarts', 'Age', 'IP', 'Node']
+    rows = []
+    for pod in pods:
+        status = pod['status']['phase']
+        if status == 'Succeeded':
+            status = 'Completed'
+        rows.append({'cells': [pod['metadata']['name'],
+                               '1/1' if status == 'Running' else '0/1', status, 0, '1s',
+                               pod['status'].get('podIP', '<none>'),
+                               pod['spec'].get('nodeName', '<none>')]})
+    return {'kind': 'Table', 'apiVersion': 'meta.k8s.io/v1',
+            'columnDefinitions': [{'name': column} for column in columns],
+            'rows': rows}
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Room for load tests that open many connections at once.
+    request_queue_size = 128
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, without this every
+    # keep-alive response waits for a delayed ACK.
+    disable_nagle_algorithm = True
+    fake = None
+
+    def log_message(self, *args):
+        pass
+
+    def __send(self, code, body, headers=None):
+        data = json.dumps(body).encode() if body is not None else b''
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def __body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length)) if length else None
+
+    def __handle(self, method):
+        url = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        body = self.__body()
+        if not url.path.startswith(('/api', '/oauth')):
+            return self.__app()
+        fake = self.fake
+        if fake.latency:
+            time.sleep(fake.latency)
+        with fake.lock:
+            fake.request_counts[(method, _kind_of(url.path))] += 1
+        for pattern in fake.forbidden:
+            if pattern.search(url.path):
+                return self.__send(*_status(403, 'Forbidden', 'forbidden by fault injection'))
+        if url.path == '/oauth/authorize':
+            return self.__send(302, None, {'Location': '{}/oauth/token/implicit#access_token={}&expires_in={}&token_type=Bearer'.format(
+                fake.url, fake.login(), fake.token_lifetime)})
+        authorization = self.headers.get('Authorization', '')
+        if not authorization.startswith('Bearer ') or authorization[7:] in fake.revoked:
+            return self.__send(*_status(401, 'Unauthorized', 'no valid token'))
+        if query.get('watch') in ['1', 'true']:
+            return self.__watch(url.path, query)
+        match = API_PATH.match(url.path)
+        if match and match.group(2) == 'builds' and match.group(4) == 'log':
+            return self.__build_log(match.group(1), match.group(3), query.get('follow') in ['1', 'true'])
+        if match and match.group(2) == 'pods' and match.group(4) == 'log':
+            with fake.lock:
+                lines = fake.pod_logs.get((match.group(1), match.group(3)))
+            if lines is None:
+                return self.__send(*_status(404, 'NotFound', 'no log of pod {}'.format(match.group(3))))
+            text = ''.join(line + '\n' for line in lines).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain')
+            self.send_header('Content-Length', str(len(text)))
+            self.end_headers()
+            self.wfile.write(text)
+            return
+        with fake.lock:
+            code, result = self.__api(method, url.path, query, body)
+        if isinstance(result, dict) and result.get('kind', '').endswith('List') and \
+                'as=Table' in self.headers.get('Accept', '') and url.path.endswith('/pods'):
+            result = _pod_table(result['items'])
+        elif isinstance(result, dict) and result.get('kind', '').endswith('List') and \
+                'as=PartialObjectMetadataList' in self.headers.get('Accept', ''):
+            result = {'kind': 'PartialObjectMetadataList', 'apiVersion': 'meta.k8s.io/v1',
+                      'metadata': result['metadata'],
+                      'items': [{'metadata': item['metadata']} for item in result['items']]}
+        self.__send(code, result)
+
+    def __api(self, method, path, query, body):
+        fake = self.fake
+        if path == '/apis/project.openshift.io/v1/projectrequests' and method == 'POST':
+            name = body['metadata']['name']
+            if fake.project_conflicts > 0:
+                fake.project_conflicts -= 1
+                return _status(409, 'AlreadyExists', 'project {} is being created'.format(name))
+            if name in fake.namespaces:
+                return _status(409, 'AlreadyExists', 'project {} already exists'.format(name))
+            fake.create_project(name)
+            return 201, body
+        match = re.match(r'^/apis/project.openshift.io/v1/projects/([^/]+)$', path)
+        if match and method == 'DELETE':
+            if match.group(1) not in fake.namespaces or fake.namespaces[match.group(1)]['terminating']:
+                return _status(404, 'NotFound', 'project not found')
+            fake.delete_project(match.group(1))
+            return 200, {'kind': 'Status', 'status': 'Success'}
+        if path == '/api/v1/nodes' and method == 'GET':
+            items = [{'metadata': {'name': node, 'labels': {'node-role.kubernetes.io/worker': ''}},
+                      'spec': {}, 'status': {'conditions': [{'type': 'Ready', 'status': 'True'}]}}
+                     for node in fake.nodes]
+            return 200, _list('NodeList', [item for item in items if _matches(item, query)],
+                              fake.resource_version)
+        if path == '/api/v1/namespaces' and method == 'GET':
+            items = [ns['object'] for ns in fake.namespaces.values() if _matches(ns['object'], query)]
+            return 200, _list('NamespaceList', items, fake.resource_version)
+        match = re.match(r'^/api/v1/namespaces/([^/]+)$', path)
+        if match:
+            namespace = fake.namespaces.get(match.group(1))
+            if namespace is None:
+                return _status(404, 'NotFound', 'namespace not found')
+            if method == 'PATCH':
+                namespace['object']['metadata']['labels'].update(body['metadata'].get('labels', {}))
+                fake.emit(None, 'namespaces', 'MODIFIED', namespace['object'])
+            return 200, namespace['object']
+        match = API_PATH.match(path)
+        if not match:
+            return _status(404, 'NotFound', 'unknown path {}'.format(path))
+        ns_name, kind, name, subresource = match.groups()
+        if ns_name not in fake.namespaces:
+            return _status(404, 'NotFound', 'namespace not found')
+        resources = fake.namespaces[ns_name]['resources'][kind]
+        if name is None:
+            if method == 'GET':
+                items = [obj for obj in resources.values() if _matches(obj, query)]
+                return 200, _list(kind.capitalize() + 'List', items, fake.resource_version)
+            if method == 'POST':
+                if fake.namespaces[ns_name]['terminating']:
+                    return _status(403, 'Forbidden', 'namespace is being terminated')
+                if body['metadata']['name'] in resources:
+                    return _status(409, 'AlreadyExists', '{} already exists'.format(body['metadata']['name']))
+                obj = copy.deepcopy(body)
+                obj.setdefault('status', {})
+                if kind == 'services':
+                    obj['spec']['clusterIP'] = '172.30.{}.{}'.format(random.randint(0, 255), random.randint(1, 254))
+                stored = fake.store(ns_name, kind, obj)
+                if kind == 'jobs':
+                    fake.start_job(ns_name, stored)
+                return 201, stored
+        obj = resources.get(name)
+        if obj is None:
+            return _status(404, 'NotFound', '{} {} not found'.format(kind, name))
+        if subresource == 'instantiate' and method == 'POST':
+            if kind == 'buildconfigs':
+                return 201, fake.get(ns_name, 'builds', fake.start_build(ns_name, obj))
+            fake.start_deployment(ns_name, obj)
+            return 201, obj
+        if method == 'GET':
+            return 200, obj
+        if method == 'DELETE':
+            fake.remove(ns_name, kind, name)
+            fake.cascade_delete(ns_name, kind, name)
+            return 200, {'kind': 'Status', 'status': 'Success'}
+        if method == 'PUT':
+            version = body.get('metadata', {}).get('resourceVersion')
+            if version is not None and version != obj['metadata']['resourceVersion']:
+                return _status(409, 'Conflict', 'the object has been modified')
+            return 200, fake.store(ns_name, kind, copy.deepcopy(body), 'MODIFIED')
+        if method == 'PATCH':
+            version = body.get('metadata', {}).get('resourceVersion')
+            if version is not None and version != obj['metadata']['resourceVersion']:
+                return _status(409, 'Conflict', 'the object has been modified')
+            _merge(obj, body)
+            fake.store(ns_name, kind, obj, 'MODIFIED')
+            if kind == 'deploymentconfigs':
+                fake.scale_deployment(ns_name, obj)
+            if kind == 'imagestreams':
+                fake.import_tags(ns_name, obj)
+            return 200, obj
+        return _status(405, 'MethodNotAllowed', method)
+
+    def __watch(self, path, query):
+        fake = self.fake
+        if path == '/api/v1/namespaces':
+            namespace, kind = None, 'namespaces'
+        else:
+            match = API_PATH.match(path)
+            if not match:
+                return self.__send(*_status(404, 'NotFound', 'unknown path {}'.format(path)))
+            namespace, kind = match.group(1), match.group(2)
+        since = int(query.get('resourceVersion') or 0)
+        deadline = time.monotonic() + float(query.get('timeoutSeconds', 60))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        position = 0
+        try:
+            while True:
+                with fake.lock:
+                    while position == len(fake.events) and not fake.closed and \
+                            time.monotonic() < deadline:
+                        fake.lock.wait(min(deadline - time.monotonic(), 1))
+                    if fake.closed:
+                        break
+                    new_events = fake.events[position:]
+                    position = len(fake.events)
+                for version, ns, event_kind, event_type, obj in new_events:
+                    if version > since and ns == namespace and event_kind == kind and _matches(obj, query):
+                        line = json.dumps({'type': event_type, 'object': obj}).encode() + b'\n'
+                        self.wfile.write(b'%x\r\n%s\r\n' % (len(line), line))
+                self.wfile.flush()
+                if time.monotonic() >= deadline:
+                    break
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def __build_log(self, namespace, name, follow):
+        """Stream the log of a build like the API does: 400 until the build
+        pod runs, then the lines, following new ones until the build ends."""
+        fake = self.fake
+        with fake.lock:
+            build = fake.get(namespace, 'builds', name)
+            if build is None:
+                return self.__send(*_status(404, 'NotFound', 'build {} not found'.format(name)))
+            if build['status']['phase'] in ['New', 'Pending'] or not fake.build_logs.get((namespace, name)):
+                return self.__send(*_status(400, 'BadRequest', 'container "sti-build" is waiting to start'))
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        position = 0
+        try:
+            while True:
+                with fake.lock:
+                    lines = fake.build_logs.get((namespace, name), [])
+                    running = lambda: build['status']['phase'] == 'Running' and \
+                        fake.get(namespace, 'builds', name) is build
+                    while follow and position == len(lines) and not fake.closed and running():
+                        fake.lock.wait(1)
+                    new_lines = lines[position:]
+                    position = len(lines)
+                    done = not follow or fake.closed or not running()
+                for line in new_lines:
+                    data = line.encode() + b'\n'
+                    self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+                self.wfile.flush()
+                if done:
+                    break
+            self.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def __app(self):
+        """Answer like the router does for the application."""
+        host = (self.headers.get('Host') or '').split(':')[0]
+        with self.fake.lock:
+            backends = self.fake.route_backends(host)
+        if backends:
+            # Like phpinfo(), which shows the pod name as HOSTNAME.
+            code, text = 200, '<html>phpinfo HOSTNAME {}</html>'.format(random.choice(backends)).encode()
+        else:
+            code, text = 503, b'Application is not available'
+        self.send_response(code)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(text)))
+        self.end_headers()
+        self.wfile.write(text)
+
+    def do_GET(self):
+        self.__handle('GET')
+
+    def do_POST(self):
+        self.__handle('POST')
+
+    def do_PUT(self):
+        self.__handle('PUT')
+
+    def do_PATCH(self):
+        self.__handle('PATCH')
+
+    def do_DELETE(self):
+        self.__handle('DELETE')
+
+def _list(kind, items, resource_version):
+    return {'kind': kind, 'apiVersion': 'v1',
+            'metadata': {'resourceVersion': str(resource_version)},
+            'items': copy.deepcopy(items)}
+
+def _merge(target, patch):
+    """Apply a merge patch: None removes a field, lists are replaced."""
+    for key, value in patch.items():
+        if value is None:
+            target.pop(key, None)
+        elif isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        else:
+            target[key] = value
+
+def _kind_of(path):
+    """Resource kind of an API path, for counting requests."""
+    match = API_PATH.match(path)
+    if match:
+        return match.group(2) + ('/' + match.group(4) if match.group(4) else '')
+    segments = path.strip('/').split('/')
+    if len(segments) >= 2 and segments[-2] in ['namespaces', 'projects']:
+        return segments[-2]
+    return segments[-1]
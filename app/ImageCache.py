@@ -0,0 +1,113 @@
+import subprocess
+import time
+import requests
+
+# Annotations on the cached ImageStream that describe what it was built from.
+GIT_COMMIT = 'health-check-script/git-commit'
+BASE_IMAGE = 'health-check-script/base-image'
+BUILT_AT = 'health-check-script/built-at'
+
+def git_head(url, timeout=30):
+    """Commit of HEAD of the git repository at url, or None when it can't
+    be determined."""
+    try:
+        result = subprocess.run(['git', 'ls-remote', url, 'HEAD'], capture_output=True,
+                                text=True, timeout=timeout)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    if result.returncode != 0 or not result.stdout.strip():
+        return None
+    return result.stdout.split()[0]
+
+class ImageCache:
+    """Keeps the application image in ImageStream name in a namespace that
+    isn't deleted between rounds. A round can deploy that image instead of
+    building it again, as long as the git commit and the base image it was
+    built from didn't change and it isn't older than rebuild_every seconds.
+    A source that can't be checked counts as changed, unless
+    reuse_when_unknown is set. connector is a connector for the cache
+    namespace."""
+
+    def __init__(self, connector, source_git, base_image, name='check-website',
+                 base_namespace='openshift', rebuild_every=86400, reuse_when_unknown=False):
+        self.c = connector
+        self.source_git = source_git
+        self.base_image = base_image
+        self.name = name
+        self.base_namespace = base_namespace
+        self.rebuild_every = rebuild_every
+        self.reuse_when_unknown = reuse_when_unknown
+
+    def ensure(self):
+        """Create the cache namespace and ImageStream when they don't exist."""
+        if not self.c.check_if_namespace_exists():
+            self.c.create_namespace()
+        if self.c.get_imagestream(self.name) is None:
+            try:
+                self.c.create_imagestream(self.name, self.name)
+            except requests.exceptions.HTTPError as ex:
+                if ex.response.status_code != 409:
+                    raise
+
+    def sources(self):
+        """Dict with the current git commit and digest of the base image.
+        Values that can't be determined are None."""
+        tag = self.c.get_imagestreamtag(self.base_image, self.base_namespace)
+        return {
+            GIT_COMMIT: git_head(self.source_git),
+            BASE_IMAGE: tag['image']['metadata']['name'] if tag is not None else None}
+
+    def cached(self):
+        """Returns (image, annotations) of the cached image, image as
+        stream@digest, or None when nothing is cached yet."""
+        stream = self.c.get_imagestream(self.name)
+        tag = self.c.get_imagestreamtag(self.name + ':latest')
+        if stream is None or tag is None:
+            return None
+        annotations = stream['metadata'].get('annotations') or {}
+        if BUILT_AT not in annotations:
+            return None
+        return '{}@{}'.format(self.name, tag['image']['metadata']['name']), annotations
+
+    def check(self, sources):
+        """Decide whether the cached image can be used for sources (see
+        sources()). Returns (image, reason): image is None when the image
+        has to be built, reason explains the decision. Sources that are
+        unknown count as changed, unless reuse_when_unknown is set."""
+        cached = self.cached()
+        if cached is None:
+            return None, "no image cached yet"
+        image, annotations = cached
+        sources_checked = [(GIT_COMMIT, "git commit"), (BASE_IMAGE, "base image")]
+        for key, description in sources_checked:
+            if sources[key] is not None and sources[key] != annotations.get(key):
+                return None, "{} changed from {} to {}".format(description, annotations.get(key), sources[key])
+        age = time.time() - float(annotations[BUILT_AT])
+        if self.rebuild_every > 0 and age >= self.rebuild_every:
+            return None, "cached image is {:.0f}s old, forcing a rebuild".format(age)
+        unknown = [description for key, description in sources_checked if sources[key] is None]
+        if unknown and not self.reuse_when_unknown:
+            return None, "couldn't check {}, building to be sure".format(', '.join(unknown))
+        reason = "nothing changed"
+        if unknown:
+            reason += " (couldn't check {})".format(', '.join(unknown))
+        return image, reason
+
+    def publish(self, namespace, imagestreamtag, sources):
+        """Tag the image of imagestreamtag (stream:tag) in namespace, the
+        image that was just built from sources, as the cached image.
+        Returns the cached image as stream@digest."""
+        tag = self.c.get_imagestreamtag(imagestreamtag, namespace)
+        if tag is None:
+            raise RuntimeError("Built image {} not found in namespace {}.".format(imagestreamtag, namespace))
+        digest = tag['image']['metadata']['name']
+        # Unknown sources are cleared, so the next round compares them again.
+        annotations = {key: value or '' for key, value in sources.items()}
+        annotations[BUILT_AT] = str(time.time())
+        self.c.tag_image(self.name, 'latest', namespace,
+                         '{}@{}'.format(imagestreamtag.split(':')[0], digest), annotations)
+        return '{}@{}'.format(self.name, digest)
+
+    def allow(self, namespace):
+        """Let the pods in namespace pull the cached image."""
+        self.c.grant_image_pull(namespace)
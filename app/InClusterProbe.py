@@ -0,0 +1,138 @@
+import statistics
+import time
+import requests
+
+# Shell script of the probe pod. Every sample requests all TARGETS (a space
+# separated list of name=url) at the same moment and prints per target:
+#   <sample> <name> <epoch start> <status code> <connect> <first byte> <total>
+# Times are seconds as curl reports them, status 000 means no response.
+SCRIPT = r'''
+i=0
+while [ "$i" -lt "$SAMPLES" ]; do
+  for target in $TARGETS; do
+    (
+      start=$(date +%s.%N)
+      result=$(curl -s -o /dev/null -m "$TIMEOUT" -w '%{http_code} %{time_connect} %{time_starttransfer} %{time_total}' "${target#*=}")
+      echo "$i ${target%%=*} $start $result"
+    ) &
+  done
+  wait
+  i=$((i + 1))
+  sleep "$INTERVAL"
+done
+'''
+
+# Hops from the pod to the route, in the order traffic passes them. The
+# Service adds the OVN load balancer, the route adds the router.
+TARGETS = ['pod', 'service', 'route']
+
+def parse_log(lines):
+    """Samples in the log of the probe pod as dicts with sample, target,
+    at (epoch), code, connect, ttfb and total. Other lines are skipped."""
+    samples = []
+    for line in lines:
+        fields = line.split()
+        if len(fields) != 7:
+            continue
+        try:
+            samples.append({'sample': int(fields[0]), 'target': fields[1], 'at': float(fields[2]),
+                            'code': int(fields[3]), 'connect': float(fields[4]),
+                            'ttfb': float(fields[5]), 'total': float(fields[6])})
+        except ValueError:
+            continue
+    return samples
+
+def curves(samples):
+    """The samples next to each other: a list with per sample the seconds
+    since the first sample and the total time of every target, None when
+    it didn't answer with status 200."""
+    if not samples:
+        return []
+    first = min(s['at'] for s in samples)
+    rows = {}
+    for s in samples:
+        row = rows.setdefault(s['sample'], dict({target: None for target in TARGETS}, at=s['at'] - first))
+        row['at'] = min(row['at'], s['at'] - first)
+        row[s['target']] = s['total'] if s['code'] == 200 else None
+    return [rows[number] for number in sorted(rows)]
+
+def summarize(samples):
+    """Per target: the number of samples, how many answered with status
+    200, p50, p95 and max of their total time and the seconds since the
+    first sample until the first status 200 (None when there wasn't one)."""
+    first = min((s['at'] for s in samples), default=0)
+    result = {}
+    for target in TARGETS:
+        own = [s for s in samples if s['target'] == target]
+        ok = sorted(s['total'] for s in own if s['code'] == 200)
+        result[target] = {
+            'n': len(own),
+            'ok': len(ok),
+            'p50': statistics.median(ok) if ok else None,
+            'p95': ok[min(int(len(ok) * 0.95), len(ok) - 1)] if ok else None,
+            'max': ok[-1] if ok else None,
+            'first_ok': min((s['at'] - first for s in own if s['code'] == 200), default=None)}
+    return result
+
+def blame(summary):
+    """The first hop that didn't answer every sample while the hops before
+    it did, or None when every hop answered."""
+    for target in TARGETS:
+        if summary[target]['ok'] < summary[target]['n'] or summary[target]['n'] == 0:
+            return target
+    return None
+
+class InClusterProbe:
+    """Runs a Job in the namespace that requests the URLs in targets (a
+    dict of target in TARGETS to URL) at the same moment, samples times
+    every interval seconds. It runs the application image, which has curl.
+    The samples are read from the log of the Job pod. The pod may take
+    start_timeout seconds to start."""
+
+    def __init__(self, connector, image, targets, image_namespace=None, samples=30, interval=1,
+                 timeout=2, start_timeout=120, name='check-probe'):
+        self.c = connector
+        self.image = image
+        self.targets = targets
+        self.image_namespace = image_namespace
+        self.samples = samples
+        self.interval = interval
+        self.timeout = timeout
+        self.start_timeout = start_timeout
+        self.name = name
+        self.started = None
+
+    def begin(self):
+        """Create the Job."""
+        env = {'SAMPLES': self.samples, 'INTERVAL': self.interval, 'TIMEOUT': self.timeout,
+               'TARGETS': ' '.join('{}={}'.format(target, url) for target, url in self.targets.items())}
+        self.started = time.monotonic()
+        self.c.create_job('check-website', self.name, self.image, SCRIPT, env,
+                          self.duration(), self.image_namespace)
+
+    def duration(self):
+        """Seconds the probe may take, including the start of its pod."""
+        return self.start_timeout + self.samples * (self.interval + self.timeout)
+
+    def wait(self):
+        """Wait until the probe pod finished and return its samples, see
+        parse_log(). Raises RuntimeError when it didn't finish in time."""
+        def finished(pods):
+            for pod in pods.values():
+                if pod.status in ['Succeeded', 'Failed']:
+                    return pod
+            return None
+        remaining = self.duration() - (time.monotonic() - self.started)
+        pod = self.c.wait_for_pods(finished, max(remaining, 1), label_selector='job-name=' + self.name)
+        if pod is None:
+            raise RuntimeError("Probe pod didn't finish within {:.0f}s.".format(self.duration()))
+        samples = parse_log(self.c.get_pod_log(pod.name))
+        if pod.status == 'Failed' and not samples:
+            raise RuntimeError("Probe pod {} failed without samples.".format(pod.name))
+        return samples
+
+    def delete(self):
+        try:
+            self.c.delete_job(self.name)
+        except requests.exceptions.RequestException:
+            pass
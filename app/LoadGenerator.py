@@ -0,0 +1,132 @@
+import collections
+import http.client
+import socket
+import threading
+import time
+
+class LoadGenerator:
+    """Sends GET requests to a route from concurrency threads for duration
+    seconds. With keepalive every thread reuses its connection, without it
+    every request opens a new connection, which creates the connection
+    churn the SDN has to keep up with. url is host[:port][/path] without
+    protocol, like app_url.
+
+    A kept alive connection that the server closed because it was idle
+    fails before the server got the request. That request is sent once
+    more on a new connection and counted as stale, not as a reset; only a
+    new connection that fails is a reset."""
+
+    def __init__(self, url, concurrency=10, duration=30, keepalive=True, timeout=5.0):
+        host, _, path = url.partition('/')
+        self.host, _, port = host.partition(':')
+        self.port = int(port) if port else 80
+        self.path = '/' + path
+        self.concurrency = concurrency
+        self.duration = duration
+        self.keepalive = keepalive
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.statuses = collections.Counter()
+        self.errors = collections.Counter()
+        self.connections = 0
+        self.stale = 0
+
+    def __connect(self):
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def __get(self, connection, headers):
+        """Send one GET on connection and read the response. Returns its status."""
+        connection.request('GET', self.path, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        return response.status
+
+    def __worker(self, deadline):
+        connection = None
+        latencies = []
+        statuses = collections.Counter()
+        errors = collections.Counter()
+        connections = 0
+        stale = 0
+        headers = {'User-Agent': 'health-check-script/v0.1'}
+        if not self.keepalive:
+            headers['Connection'] = 'close'
+        while time.monotonic() < deadline:
+            # The socket is opened by the first request of a connection.
+            reused = connection is not None and connection.sock is not None
+            if not reused:
+                connection = self.__connect()
+                connections += 1
+            start = time.monotonic()
+            try:
+                try:
+                    status = self.__get(connection, headers)
+                except (ConnectionResetError, http.client.RemoteDisconnected, BrokenPipeError):
+                    if not reused:
+                        raise
+                    # Closed by the server while it was idle.
+                    stale += 1
+                    connection.close()
+                    connection = self.__connect()
+                    connections += 1
+                    start = time.monotonic()
+                    status = self.__get(connection, headers)
+                latencies.append(time.monotonic() - start)
+                statuses[status] += 1
+                if not self.keepalive:
+                    connection.close()
+            except (ConnectionResetError, http.client.RemoteDisconnected, BrokenPipeError):
+                errors['reset'] += 1
+                connection.close()
+            except ConnectionRefusedError:
+                errors['refused'] += 1
+                connection.close()
+            except socket.timeout:
+                errors['timeout'] += 1
+                connection.close()
+            except (OSError, http.client.HTTPException) as ex:
+                errors[type(ex).__name__] += 1
+                connection.close()
+        if connection is not None:
+            connection.close()
+        with self.lock:
+            self.latencies += latencies
+            self.statuses.update(statuses)
+            self.errors.update(errors)
+            self.connections += connections
+            self.stale += stale
+
+    def run(self):
+        """Generate the load. Returns the result, see result()."""
+        deadline = time.monotonic() + self.duration
+        start = time.monotonic()
+        threads = [threading.Thread(target=self.__worker, args=(deadline,), daemon=True)
+                   for _ in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.result(time.monotonic() - start)
+
+    def result(self, elapsed):
+        """Dict with the number of requests, connections, errors and stale
+        kept alive connections that were replaced, throughput of successful requests per second and latency
+        percentiles in seconds of the requests that got a response."""
+        latencies = sorted(self.latencies)
+        ok = self.statuses.get(200, 0)
+        result = {
+            'requests': len(latencies) + sum(self.errors.values()),
+            'ok': ok,
+            'non_200': len(latencies) - ok,
+            'errors': sum(self.errors.values()),
+            'resets': self.errors.get('reset', 0),
+            'timeouts': self.errors.get('timeout', 0),
+            'connections': self.connections,
+            'stale': self.stale,
+            'throughput': ok / elapsed if elapsed > 0 else 0.0}
+        for p in [50, 95, 99]:
+            result['p{}'.format(p)] = latencies[min(int(len(latencies) * p / 100), len(latencies) - 1)] \
+                if latencies else None
+        result['max'] = latencies[-1] if latencies else None
+        return result
@@ -0,0 +1,259 @@
+import base64
+
+# Bodies of the objects the health check creates. Shared by ApiConnector
+# and AsyncApiConnector, so both create exactly the same objects.
+
+def project_request(namespace):
+    """ProjectRequest for a new project."""
+    return {
+            "kind": "ProjectRequest",
+            "apiVersion": "project.openshift.io/v1",
+            "metadata": {
+                "name": namespace,
+                "creationTimestamp": None }}
+
+def status_configmap():
+    """ConfigMap that keeps track of the attempts."""
+    return {'kind': 'ConfigMap',
+            'apiVersion': 'v1',
+            'metadata': {'name': 'health-check-status'},
+            'data': {'attempts': "1"}}
+
+def secret(ssh_key, secret_name):
+    """Secret from given SSH key (as string)."""
+    bytes_ssh_key = ssh_key.encode()
+    return {
+            "apiVersion": "v1",
+            "kind": "Secret",
+            "metadata": {
+                "creationTimestamp": None,
+                "name": secret_name },
+            "data": {
+                "ssh-privatekey": base64.b64encode(bytes_ssh_key).decode()}}
+
+def imagestream(name, app_name):
+    """ImageStream with a name and app_name as label."""
+    return {
+            "apiVersion": "image.openshift.io/v1",
+            "kind": "ImageStream",
+            "metadata": {
+                "annotations": {
+                    "openshift.io/generated-by": "health-check-script"},
+                "creationTimestamp": None,
+                "labels": {
+                    "app": app_name },
+                "name": name},
+            "spec": {
+                "lookupPolicy": {
+                    "local": False}},
+            "status": {
+                "dockerImageRepository": ""}}
+
+def buildconfig(name, app_name, imagestreamtag, source_git,
+    source_context_dir, source_secret, source_image):
+    """BuildConfig. See ApiConnector.create_buildconfig for the arguments."""
+    return {
+            "apiVersion": "build.openshift.io/v1",
+            "kind": "BuildConfig",
+            "metadata": {
+                "annotations": {
+                    "openshift.io/generated-by": "health-check-script"},
+                "creationTimestamp": None,
+                "labels": {
+                    "app": app_name},
+                "name": name},
+            "spec": {
+                "nodeSelector": None,
+                "output": {
+                    "to": {
+                        "kind": "ImageStreamTag",
+                        "name": imagestreamtag}},
+                "postCommit": {},
+                "resources": {},
+                "source": {
+                    "sourceSecret": {
+                        "name": source_secret},
+                    "type": "git",
+                    "contextDir": source_context_dir,
+                    "git": {
+                        "uri": source_git}},
+                "strategy": {
+                    "sourceStrategy": {
+                        "from": {
+                            "kind": "ImageStreamTag",
+                            "name": source_image,
+                            "namespace": "openshift"}},
+                    "type": "Source"},
+                "Triggers": []},
+            "status": {
+                "lastVersion": 0}}
+
+def deploymentconfig(namespace, app_name, name, image, tcp_port, replicas=1, node=None, image_namespace=None):
+    """DeploymentConfig running image from the internal registry, from
+    image_namespace when given and else from namespace. The pods only run
+    on node when it is given."""
+    dc = {
+            "apiVersion": "apps.openshift.io/v1",
+            "kind": "DeploymentConfig",
+            "metadata": {
+                "annotations": {
+                    "openshift.io/generated-by": "health-check-script"},
+                "creationTimestamp": None,
+                "labels": {
+                    "app": app_name},
+                "name": name},
+            "spec": {
+                "replicas": replicas,
+                "selector": {
+                    "app": app_name,
+                    "deploymentconfig": name},
+                "strategy": {
+                    "resources": {}},
+                "template": {
+                    "metadata": {
+                        "annotations": {
+                            "openshift.io/generated-by": "health-check-script"},
+                        "creationTimestamp": None,
+                        "labels": {
+                            "app": app_name,
+                            "deploymentconfig": name}},
+                    "spec": {
+                        "containers": [{
+                            "image": registry_image(image_namespace or namespace, image),
+                            "name": name + "-pod",
+                            "ports": [{
+                                "containerPort": tcp_port,
+                                "protocol": "TCP"}],
+                            "resources": {}}]}},
+                    "test": False,
+                    "triggers": []},
+            "status": {
+                "availableReplicas": 0,
+                "latestVersion": 0,
+                "observedGeneration": 0,
+                "replicas": 0,
+                "unavailableReplicas": 0,
+                "updatedReplicas": 0}}
+    if node is not None:
+        dc['spec']['template']['spec']['nodeSelector'] = {"kubernetes.io/hostname": node}
+    return dc
+
+def registry_image(namespace, image):
+    """Pull spec of image (stream:tag or stream@digest) of namespace in
+    the internal registry."""
+    return 'image-registry.openshift-image-registry.svc:5000/' + namespace + '/' + image
+
+def probe_job(namespace, app_name, name, image, script, env, deadline, image_namespace=None):
+    """Job that runs shell script once in a container of image, with env
+    (a dict) as environment. It is stopped after deadline seconds."""
+    return {
+            "apiVersion": "batch/v1",
+            "kind": "Job",
+            "metadata": {
+                "annotations": {
+                    "openshift.io/generated-by": "health-check-script"},
+                "labels": {
+                    "app": app_name},
+                "name": name},
+            "spec": {
+                "backoffLimit": 0,
+                "activeDeadlineSeconds": int(deadline),
+                "template": {
+                    "metadata": {
+                        "labels": {
+                            "app": app_name,
+                            "job-name": name}},
+                    "spec": {
+                        "restartPolicy": "Never",
+                        "containers": [{
+                            "name": name,
+                            "image": registry_image(image_namespace or namespace, image),
+                            "command": ["/bin/sh", "-c", script],
+                            "env": [{"name": key, "value": str(value)} for key, value in env.items()],
+                            "resources": {}}]}}}}
+
+def image_puller_rolebinding(namespace):
+    """RoleBinding that lets the service accounts of namespace pull images."""
+    return {
+            "apiVersion": "rbac.authorization.k8s.io/v1",
+            "kind": "RoleBinding",
+            "metadata": {
+                "annotations": {
+                    "openshift.io/generated-by": "health-check-script"},
+                "name": "image-puller-" + namespace},
+            "roleRef": {
+                "apiGroup": "rbac.authorization.k8s.io",
+                "kind": "ClusterRole",
+                "name": "system:image-puller"},
+            "subjects": [{
+                "apiGroup": "rbac.authorization.k8s.io",
+                "kind": "Group",
+                "name": "system:serviceaccounts:" + namespace}]}
+
+def service(app_name, name, tcp_port, selector_dc, selector_app=None):
+    """Service in front of the pods of DeploymentConfig selector_dc, which
+    have app label selector_app (app_name when not given)."""
+    return {
+            "apiVersion": "v1",
+            "kind": "Service",
+            "metadata": {
+                "annotations": {
+                    "openshift.io/generated-by": "health-check-script"},
+                "creationTimestamp": None,
+                "labels": {
+                    "app": app_name},
+                "name": name},
+            "spec": {
+                "ports": [{
+                    "name": str(tcp_port) + '-tcp',
+                    "port": tcp_port,
+                    "protocol": "TCP",
+                    "targetPort": tcp_port}],
+                "selector": {
+                    "app": selector_app or app_name,
+                    "deploymentconfig": selector_dc}},
+                "status": {
+                    "loadBalancer": {}}}
+
+def build_request(name):
+    """BuildRequest for buildconfigs/{name}/instantiate."""
+    return {
+            "kind": "BuildRequest",
+            "apiVersion": "build.openshift.io/v1",
+            "metadata": {
+                "name": name,
+                "creationTimestamp": None},
+            "triggeredBy": [{
+                "message": "Triggered by health-check-script."}],
+            "dockerStrategyOptions": {},
+            "sourceStrategyOptions": {}}
+
+def deployment_request(deploymentconfig):
+    """DeploymentRequest for deploymentconfigs/{name}/instantiate."""
+    return {
+            "kind": "DeploymentRequest",
+            "apiVersion": "apps.openshift.io/v1",
+            "name": deploymentconfig,
+            "latest": True,
+            "force": True}
+
+def route(app_name, name, svc_name, target_port, host):
+    """Route with host to Service svc_name."""
+    return {
+            "apiVersion": "route.openshift.io/v1",
+            "kind": "Route",
+            "metadata": {
+                "creationTimestamp": None,
+                "labels": {
+                    "app": app_name},
+                "name": name},
+            "spec": {
+                "host": host,
+                "port": {
+                    "targetPort": target_port},
+                "to": {
+                    "kind": "",
+                    "name": svc_name,
+                    "weight": None}},
+            "status": {
+                "ingress": None}}
@@ -0,0 +1,110 @@
+import concurrent.futures
+import threading
+import time
+
+class NamespacePool:
+    """Keeps a number of namespaces ready for rounds. A round leases a
+    clean namespace and releases it when done. Cleaning up, or deleting and
+    recreating a namespace after max_attempts rounds, happens in the
+    background, so a round never waits for namespace finalizers.
+
+    The attempts counter in the health-check-status ConfigMap of every
+    namespace counts the rounds it served since it was created."""
+
+    def __init__(self, connector, namespaces, max_attempts, clean, workers=2, retry_delay=30):
+        """connector is used as template for the connectors of the pool
+        namespaces. clean(connector) removes the objects of a previous round."""
+        self.connector = connector
+        self.namespaces = list(namespaces)
+        self.max_attempts = max_attempts
+        self.clean = clean
+        self.retry_delay = retry_delay
+        self.ready = []
+        self.errors = {}
+        self.condition = threading.Condition()
+        self.closed = False
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='namespace-pool')
+        # We don't know in what state existing namespaces are, so clean
+        # them all before they are leased.
+        for namespace in self.namespaces:
+            self.__submit(namespace)
+
+    def __submit(self, namespace, recycle=False):
+        if not self.closed:
+            self.executor.submit(self.__prepare, namespace, recycle)
+
+    def __prepare(self, namespace, recycle=False):
+        """Make namespace ready for a new round."""
+        c = self.connector.for_namespace(namespace)
+        try:
+            if c.check_if_namespace_exists():
+                try:
+                    attempts = c.get_status_attempts()
+                except Exception:
+                    # No (valid) status ConfigMap. Start over.
+                    recycle = True
+                    attempts = None
+                if recycle or (self.max_attempts != 0 and attempts >= self.max_attempts):
+                    c.delete_self_project()
+                    if not c.wait_for_namespace_deleted(timeout=600):
+                        raise RuntimeError("Deleting namespace {} failed.".format(namespace))
+                else:
+                    self.clean(c)
+            if not c.check_if_namespace_exists():
+                c.create_namespace()
+                c.create_status_cm()
+        except Exception as ex:
+            # Try again later, the API server may just be having a bad moment.
+            with self.condition:
+                self.errors[namespace] = str(ex) or type(ex).__name__
+            if not self.closed:
+                timer = threading.Timer(self.retry_delay, self.__submit, args=(namespace,))
+                timer.daemon = True
+                timer.start()
+            return
+        with self.condition:
+            self.errors.pop(namespace, None)
+            self.ready.append(namespace)
+            self.condition.notify()
+
+    def __return(self, namespace):
+        c = self.connector.for_namespace(namespace)
+        recycle = False
+        try:
+            c.add_status_attempts()
+        except Exception:
+            # The status ConfigMap is gone or broken: recreate the namespace.
+            recycle = True
+        self.__prepare(namespace, recycle)
+
+    def lease(self, timeout=600):
+        """Wait for a ready namespace and return a connector for it, or
+        None when no namespace became ready within timeout seconds."""
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while not self.ready:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self.closed:
+                    return None
+                self.condition.wait(remaining)
+            return self.connector.for_namespace(self.ready.pop(0))
+
+    def release(self, connector):
+        """Return a leased namespace. It is cleaned up, or recreated when it
+        served max_attempts rounds, in the background."""
+        if not self.closed:
+            self.executor.submit(self.__return, connector.namespace)
+
+    def status(self):
+        """Returns the number of ready namespaces and the errors of the
+        namespaces that failed to become ready."""
+        with self.condition:
+            return len(self.ready), dict(self.errors)
+
+    def close(self):
+        """Stop all background work that hasn't started yet."""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,86 @@
+import collections
+import statistics
+
+# Which phase of a round is attributed to which node: the build to the node
+# of the build pod, starting the pod and the route to the node of the app pod.
+ATTRIBUTION = {
+    'build': 'build_node',
+    'deploy': 'app_node',
+    'route': 'app_node'}
+
+class NodeStats:
+    """Rolling statistics of the phases per node, over the last window
+    rounds that ran on that node."""
+
+    def __init__(self, window=50):
+        self.window = window
+        # (phase, node) -> durations, newest last.
+        self.samples = collections.defaultdict(lambda: collections.deque(maxlen=self.window))
+
+    def add(self, labels, spans):
+        """Attribute the spans of a round to the nodes in its labels."""
+        for phase, label in ATTRIBUTION.items():
+            node = labels.get(label)
+            if node and phase in spans:
+                self.samples[(phase, node)].append(spans[phase])
+
+    def add_timer(self, timer):
+        """Add a finished round. Failed rounds are skipped, their spans
+        stop at the failure."""
+        if timer.success:
+            self.add(timer.labels, timer.spans)
+
+    def load(self, store, count=1000, cluster=None):
+        """Add the last count successful rounds of a RunStore, only those
+        of cluster when given."""
+        for r in store.last_rounds(count, cluster):
+            if r['success']:
+                self.add(r, r['spans'])
+
+    def nodes(self, phase):
+        return sorted(node for p, node in self.samples if p == phase)
+
+    def count(self, phase, node):
+        return len(self.samples.get((phase, node), ()))
+
+    def summary(self):
+        """Dict of phase to a dict of node to the number of samples, the
+        median and the slowest duration."""
+        result = {}
+        for (phase, node), samples in sorted(self.samples.items()):
+            result.setdefault(phase, {})[node] = {
+                'n': len(samples),
+                'median': statistics.median(samples),
+                'max': max(samples)}
+        return result
+
+    def outliers(self, threshold=3.5, min_samples=5, min_change=0.2):
+        """Nodes that are slow compared to the other nodes. A node is slow
+        in a phase when the modified z-score of its median, compared with
+        the medians of all nodes, is above threshold and its median is
+        more than min_change (0.2 is 20%) above the median of all nodes.
+        Returns a list of (phase, node, median, median of all nodes)."""
+        result = []
+        for phase, nodes in self.summary().items():
+            medians = {node: s['median'] for node, s in nodes.items() if s['n'] >= min_samples}
+            if len(medians) < 3:
+                continue
+            center = statistics.median(medians.values())
+            deviations = [abs(m - center) for m in medians.values()]
+            # Median absolute deviation, or the mean absolute deviation when
+            # more than half of the nodes have the same median.
+            spread = statistics.median(deviations) / 0.6745
+            if spread == 0:
+                spread = statistics.mean(deviations) * 1.2533
+            if spread == 0:
+                continue
+            for node, median in medians.items():
+                if (median - center) / spread > threshold and median > center * (1 + min_change):
+                    result.append((phase, node, median, center))
+        return result
+
+def choose_node(nodes, stats):
+    """Node the next app pod should be pinned to when cycling through
+    nodes: the one with the fewest samples, so every node is measured
+    within len(nodes) rounds."""
+    return min(nodes, key=lambda node: (stats.count('route', node), nodes.index(node)))
@@ -0,0 +1,42 @@
+import importlib
+import subprocess
+
+# Notifiers are called by the daemon when a round fails. Pick one with
+# [daemon] notifier in config.ini: a name from NOTIFIERS or the dotted path
+# of your own class (module.Class). A notifier class is created with the
+# config and needs a notify(subject, text) method.
+
+class PrintNotifier:
+    """Only print the failure. The round output is already printed."""
+
+    def __init__(self, config):
+        pass
+
+    def notify(self, subject, text):
+        print("{}\n{}".format(subject, text))
+
+class MailNotifier:
+    """Mail the failure with the mail command, like cron.sh does."""
+
+    def __init__(self, config):
+        if not config.get('daemon', 'mail_to', fallback=''):
+            raise ValueError("Option mail_to missing for mail notifier.")
+        self.receiver = config.get('daemon', 'mail_to')
+
+    def notify(self, subject, text):
+        subprocess.run(['mail', '-s', subject, self.receiver],
+                       input=text.encode(), check=True)
+
+NOTIFIERS = {
+    'print': PrintNotifier,
+    'mail': MailNotifier}
+
+def create_notifier(config):
+    """Create the notifier configured in the daemon section."""
+    name = config.get('daemon', 'notifier', fallback='print')
+    if name in NOTIFIERS:
+        return NOTIFIERS[name](config)
+    module, _, cls = name.rpartition('.')
+    if not module:
+        raise ValueError("Unknown notifier: {}".format(name))
+    return getattr(importlib.import_module(module), cls)(config)
@@ -0,0 +1,25 @@
+import re
+
+# Functions in which a thread waits for the network, another thread or a
+# timer instead of using CPU, as cProfile names built-in functions.
+WAITING = re.compile(r"[ .'](recv|recv_into|read|readinto|send|sendall|connect|do_handshake|getaddrinfo|"
+                     r"select|poll|sleep|acquire|wait)['>]")
+
+def category(key):
+    """Category of a function in pstats: wait, json or client."""
+    filename, _, name = key
+    if filename == '~' and WAITING.search(name):
+        return 'wait'
+    if '/json/' in filename or '_json' in name:
+        return 'json'
+    return 'client'
+
+def breakdown(stats):
+    """Time spent in the functions of a pstats.Stats itself (not in the
+    functions they call), split in waiting for the network, locks and
+    timers (wait), JSON encoding and decoding (json) and everything else
+    the client does, like building dicts and parsing HTTP (client)."""
+    result = {'wait': 0.0, 'json': 0.0, 'client': 0.0}
+    for key, (_, _, own_time, _, _) in stats.stats.items():
+        result[category(key)] += own_time
+    return result
@@ -0,0 +1,160 @@
+import concurrent.futures
+import re
+import statistics
+import threading
+import time
+import requests
+import EventCollector
+
+# Messages of the Pulled event of the kubelet, like
+#   Successfully pulled image "..." in 1.234s (1.234s including waiting). Image size: 123 bytes.
+#   Container image "..." already present on machine
+PULLED = re.compile(r'pulled image "[^"]*" in (\S+)')
+IMAGE_SIZE = re.compile(r'Image size: (\d+) bytes')
+PRESENT = 'already present on machine'
+GO_DURATION = re.compile(r'([\d.]+)(h|ms|µs|us|ns|m|s)')
+UNITS = {'h': 3600, 'm': 60, 's': 1, 'ms': 1e-3, 'µs': 1e-6, 'us': 1e-6, 'ns': 1e-9}
+
+def go_duration(text):
+    """Seconds of a duration as Go formats it (1m2.5s, 350ms), or None."""
+    text = text.rstrip('.,')
+    parts = GO_DURATION.findall(text)
+    if not parts or ''.join(number + unit for number, unit in parts) != text:
+        return None
+    return sum(float(number) * UNITS[unit] for number, unit in parts)
+
+def parse_pulled(message):
+    """Returns (seconds, size in bytes, cached) from the message of a
+    Pulled event. seconds and size are None when the message doesn't
+    have them, cached is True when the node already had the image."""
+    if message is None:
+        return None, None, False
+    if PRESENT in message:
+        return 0.0, None, True
+    pulled = PULLED.search(message)
+    size = IMAGE_SIZE.search(message)
+    return (go_duration(pulled.group(1)) if pulled else None,
+            int(size.group(1)) if size else None, False)
+
+class PullSpread:
+    """Starts a pod running image on every node in nodes, concurrency
+    nodes at a time, each from a DeploymentConfig pinned to the node.
+    Records per node when the pod was scheduled and Running, counted from
+    the creation of its DeploymentConfig, and how long the kubelet took
+    to pull the image according to its Pulled event. Every
+    DeploymentConfig is deleted as soon as its pod is Running."""
+
+    def __init__(self, connector, image, nodes, image_namespace=None, concurrency=5, timeout=300):
+        self.c = connector
+        self.image = image
+        self.nodes = nodes
+        self.image_namespace = image_namespace
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.collector = EventCollector.EventCollector(connector)
+        # Node -> dict with pod, status, scheduled, running and error.
+        self.results = {}
+
+    def __start_pod(self, index, node):
+        name = 'check-pull-{}'.format(index)
+        result = {'pod': None, 'status': 'timeout', 'scheduled': None, 'running': None, 'error': None}
+        with self.lock:
+            self.results[node] = result
+        start = time.monotonic()
+
+        def started(pods):
+            now = time.monotonic() - start
+            for pod in pods.values():
+                with self.lock:
+                    if result['pod'] is None:
+                        result['pod'] = pod.name
+                        result['scheduled'] = now
+                if pod.status in ['Running', 'Failed']:
+                    return pod.status
+            return None
+        try:
+            self.c.create_deploymentconfig(app_name='check-pull', name=name, image=self.image,
+                                           tcp_port=8080, node=node, image_namespace=self.image_namespace)
+            self.c.start_deployment(name)
+            status = self.c.wait_for_pods(started, self.timeout, label_selector='deploymentconfig=' + name)
+            with self.lock:
+                if status is not None:
+                    result['status'] = status
+                    result['running'] = time.monotonic() - start if status == 'Running' else None
+        except requests.exceptions.RequestException as ex:
+            with self.lock:
+                result['status'] = 'error'
+                result['error'] = str(ex)
+        finally:
+            try:
+                self.c.delete_deploymentconfig(name)
+            except requests.exceptions.RequestException:
+                pass
+
+    def run(self):
+        """Start the pods on all nodes and wait until all of them are
+        Running, failed or timed out. Returns a dict of node to result,
+        see node_result()."""
+        self.collector.begin()
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max(self.concurrency, 1),
+                                                       thread_name_prefix='pull') as executor:
+                for future in [executor.submit(self.__start_pod, index, node)
+                               for index, node in enumerate(self.nodes)]:
+                    future.result()
+        finally:
+            self.collector.stop()
+        return {node: self.node_result(node) for node in self.nodes}
+
+    def node_result(self, node):
+        """Result of node: the pod, its status (Running, Failed, timeout or
+        error), seconds until it was scheduled and Running, seconds the
+        pull took and the image size in bytes (None when unknown), whether
+        the node already had the image, the times the pull started and
+        ended in seconds since run() and the problems reported in events."""
+        with self.lock:
+            result = dict(self.results[node])
+        pod = result['pod']
+        timeline = self.collector.timeline(pod) if pod is not None else {}
+        pull, size, cached = parse_pulled(self.collector.message(pod, 'Pulled') if pod is not None else None)
+        if pull is None and 'pulling' in timeline and 'pulled' in timeline:
+            pull = timeline['pulled'] - timeline['pulling']
+        result.update(pull=pull, size=size, cached=cached,
+                      pull_start=timeline.get('pulling'), pull_end=timeline.get('pulled'),
+                      problems=['{} {}'.format(reason, message)
+                                for _, _, reason, message in self.collector.problems_of(pod)] if pod else [])
+        return result
+
+def summarize(results, slow_factor=2):
+    """Summary of the results of PullSpread.run(): the number of nodes and
+    failed nodes, p50 and max of the pull and start (Running) times, the
+    registry throughput in bytes per second over all pulls together and
+    the p50 per node, and the slow nodes: nodes whose pull took more than
+    slow_factor times the median, slowest first, as (node, seconds)."""
+    pulls = {node: r['pull'] for node, r in results.items() if r['pull'] is not None and not r['cached']}
+    running = [r['running'] for r in results.values() if r['running'] is not None]
+    sized = [r for r in results.values() if r['size'] and r['pull'] and not r['cached']]
+    summary = {
+        'nodes': len(results),
+        'failed': sum(1 for r in results.values() if r['status'] != 'Running'),
+        'cached': sum(1 for r in results.values() if r['cached']),
+        'pull_p50': statistics.median(pulls.values()) if pulls else None,
+        'pull_max': max(pulls.values()) if pulls else None,
+        'running_p50': statistics.median(running) if running else None,
+        'running_max': max(running) if running else None,
+        'throughput': None,
+        'node_throughput_p50': None,
+        'slow': []}
+    timed = [r for r in sized if r['pull_start'] is not None and r['pull_end'] is not None]
+    if timed:
+        span = max(r['pull_end'] for r in timed) - min(r['pull_start'] for r in timed)
+        if span > 0:
+            summary['throughput'] = sum(r['size'] for r in timed) / span
+    if sized:
+        summary['node_throughput_p50'] = statistics.median(r['size'] / r['pull'] for r in sized)
+    if len(pulls) >= 3:
+        limit = summary['pull_p50'] * slow_factor
+        summary['slow'] = sorted(((node, seconds) for node, seconds in pulls.items() if seconds > limit),
+                                 key=lambda item: item[1], reverse=True)
+    return summary
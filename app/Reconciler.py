@@ -0,0 +1,156 @@
+import copy
+import hashlib
+import json
+import threading
+import requests
+import TaskGraph
+
+# Annotation with the hash of the manifest an object was last created or
+# patched from.
+SPEC_HASH = 'health-check-script/spec-hash'
+# Annotation with that manifest itself, so a patch can remove the fields the
+# new manifest doesn't have anymore. Not on Secrets, it would show their data.
+LAST_APPLIED = 'health-check-script/last-applied'
+
+def manifest_hash(manifest):
+    """Hash of a manifest, the same for the same content in any key order."""
+    return hashlib.sha256(json.dumps(manifest, sort_keys=True).encode()).hexdigest()[:16]
+
+def with_hash(manifest):
+    """Copy of manifest with its hash annotation and, except for Secrets,
+    the manifest as last applied annotation."""
+    result = copy.deepcopy(manifest)
+    annotations = dict(result['metadata'].get('annotations') or {})
+    annotations[SPEC_HASH] = manifest_hash(manifest)
+    if manifest['kind'] != 'Secret':
+        annotations[LAST_APPLIED] = json.dumps(manifest, sort_keys=True, separators=(',', ':'))
+    result['metadata']['annotations'] = annotations
+    return result
+
+def merge_patch(old, new):
+    """JSON merge patch from old to new: the changed fields of new and None
+    for the fields only old has. Lists are replaced as a whole."""
+    patch = {key: None for key in old if key not in new}
+    for key, value in new.items():
+        if isinstance(value, dict) and isinstance(old.get(key), dict):
+            nested = merge_patch(old[key], value)
+            if nested:
+                patch[key] = nested
+        elif key not in old or old[key] != value:
+            patch[key] = value
+    return patch
+
+def patch_of(last_applied, manifest, resource_version):
+    """Merge patch that changes an object created from last_applied into
+    manifest (with its annotations), only when it still has
+    resource_version. Fields the API server sets itself aren't touched, as
+    they aren't in either manifest. Status is left out."""
+    old = {key: value for key, value in with_hash(last_applied).items() if key != 'status'}
+    new = {key: value for key, value in with_hash(manifest).items() if key != 'status'}
+    patch = merge_patch(old, new)
+    patch.setdefault('metadata', {})['resourceVersion'] = resource_version
+    # Always, in case the object was changed after last_applied.
+    annotations = patch['metadata'].setdefault('annotations', {})
+    for key in [SPEC_HASH, LAST_APPLIED]:
+        annotations[key] = new['metadata']['annotations'].get(key)
+    return patch
+
+class Reconciler:
+    """Brings the objects a round needs to their desired manifests instead
+    of deleting and creating all of them. Every object is compared with
+    the live object by the hash annotation of the manifest it was made
+    from: an object that is missing is created, one with another hash is
+    patched (recreated when the patch is refused or it has no last applied
+    manifest) and one that isn't desired is deleted. Deletes are waited
+    for before an object with the same name is created again. Objects are
+    named by a step name, like the steps of cleanup_graph()."""
+
+    def __init__(self, connector, delete_timeout=120):
+        self.c = connector
+        self.delete_timeout = delete_timeout
+        # Step name -> (kind, name) of every object that is managed.
+        self.managed = {}
+        # Step name -> manifest of the desired objects.
+        self.desired = {}
+        self.recreate = set()
+        self.lock = threading.Lock()
+        # Step name -> what was done: create, patch, recreate, delete, keep or absent.
+        self.actions = {}
+
+    def manage(self, step, kind, name):
+        """Object name of kind belongs to this reconciler: when it isn't
+        desired it is deleted."""
+        self.managed[step] = (kind, name)
+
+    def add(self, step, manifest, recreate=False):
+        """Desire manifest as object step. With recreate the object is
+        deleted and created again even when nothing changed."""
+        self.managed[step] = (manifest['kind'], manifest['metadata']['name'])
+        self.desired[step] = manifest
+        if recreate:
+            self.recreate.add(step)
+
+    def __delete(self, kind, name, deleting=False):
+        """Delete the object, unless it is being deleted already, and wait
+        until it is gone."""
+        if not deleting:
+            # Foreground: the pods of a DeploymentConfig are gone when it is.
+            r = self.c.delete_object(kind, name, propagation='Foreground')
+            if r.status_code != 404:
+                r.raise_for_status()
+        if not self.c.wait_for_deleted(kind, name, self.delete_timeout):
+            raise RuntimeError("{} {} wasn't deleted within {}s.".format(kind, name, self.delete_timeout))
+
+    def __reconcile(self, step):
+        kind, name = self.managed[step]
+        manifest = self.desired.get(step)
+        live = self.c.get_object(kind, name)
+        deleting = live is not None and live['metadata'].get('deletionTimestamp') is not None
+        if manifest is None:
+            action = 'absent' if live is None else 'delete'
+            if live is not None:
+                self.__delete(kind, name, deleting)
+        elif live is None:
+            action = 'create'
+        elif deleting or step in self.recreate:
+            action = 'recreate'
+        else:
+            annotations = live['metadata'].get('annotations') or {}
+            if annotations.get(SPEC_HASH) == manifest_hash(manifest):
+                action = 'keep'
+            elif LAST_APPLIED not in annotations:
+                # Without it the fields to remove aren't known.
+                action = 'recreate'
+            else:
+                action = 'patch'
+                try:
+                    self.c.patch_object(kind, name, patch_of(json.loads(annotations[LAST_APPLIED]), manifest,
+                                                             live['metadata']['resourceVersion']))
+                except requests.exceptions.HTTPError as ex:
+                    # 422: a field can't be changed. 409: changed meanwhile.
+                    if ex.response.status_code not in [409, 422]:
+                        raise
+                    action = 'recreate'
+        if action == 'recreate':
+            self.__delete(kind, name, deleting)
+        if action in ['create', 'recreate']:
+            self.c.create_object(with_hash(manifest))
+        with self.lock:
+            self.actions[step] = action
+        return action
+
+    def graph(self, workers=6):
+        """TaskGraph that reconciles every managed object in parallel, a
+        step per object."""
+        graph = TaskGraph.TaskGraph(max_workers=workers)
+        for step in self.managed:
+            graph.add(step, self.__reconcile, step)
+        return graph
+
+    def counts(self):
+        """Number of objects per action."""
+        with self.lock:
+            result = {}
+            for action in self.actions.values():
+                result[action] = result.get(action, 0) + 1
+            return result
@@ -0,0 +1,156 @@
+import copy
+import threading
+import time
+import RequestStats
+
+def scope(path):
+    """(namespace, kind) a request path is about. A path about a whole
+    namespace (the namespace or project itself) has kind None, a path that
+    isn't about one namespace has namespace None. Both are None for paths
+    that aren't API paths."""
+    parsed = RequestStats.parse_path(path)
+    if parsed is None:
+        return None, None
+    if parsed.resource in ('namespaces', 'projects'):
+        return parsed.name, None
+    return parsed.namespace, parsed.resource
+
+def overlaps(a, b):
+    """Whether two scopes can be about the same objects."""
+    return all(x is None or y is None or x == y for x, y in zip(a, b))
+
+class TokenBucket:
+    """Limits requests to qps per second on average with bursts of up to
+    burst requests. Writes go before reads: while a write waits for a
+    token, reads wait too. qps 0 or less doesn't limit anything."""
+
+    def __init__(self, qps, burst):
+        self.qps = qps
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.condition = threading.Condition()
+        self.writers = 0
+        self.throttled = 0
+        self.waited = 0.0
+
+    def __refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.tokens + (now - self.updated) * self.qps, self.burst)
+        self.updated = now
+
+    def acquire(self, write=False):
+        """Take a token, waiting until there is one. Returns the seconds waited."""
+        if self.qps <= 0:
+            return 0.0
+        start = time.monotonic()
+        with self.condition:
+            if write:
+                self.writers += 1
+            try:
+                while True:
+                    self.__refill()
+                    if self.tokens >= 1 and (write or self.writers == 0):
+                        self.tokens -= 1
+                        break
+                    # A read that only waits for writers is woken when they got their token.
+                    self.condition.wait(max((1 - self.tokens) / self.qps, 0.001))
+            finally:
+                if write:
+                    self.writers -= 1
+                    self.condition.notify_all()
+            waited = time.monotonic() - start
+            if waited > 0.001:
+                self.throttled += 1
+                self.waited += waited
+        return waited
+
+    def take(self):
+        """Returns (requests throttled, seconds they waited) since the last
+        call and starts over."""
+        with self.condition:
+            result = (self.throttled, self.waited)
+            self.throttled, self.waited = 0, 0.0
+        return result
+
+class _Call:
+    """A GET that is in flight, the callers that ask for the same wait for it."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+class ReadCache:
+    """Answers GETs of the same URL (and Accept header) that are in flight
+    at the same time with one request when coalesce is set, and keeps
+    successful answers for ttl seconds. A write drops the answers of the
+    objects it could change (see scope()), answers still in flight during
+    a write aren't kept. Changes the cluster makes itself, like a pod
+    that starts, don't drop anything: ttl has to stay below the interval
+    of anything that polls. ttl 0 or less keeps nothing. Every caller gets
+    its own copy of the answer."""
+
+    def __init__(self, ttl, coalesce=False):
+        self.ttl = ttl
+        self.coalesce = coalesce
+        self.lock = threading.Lock()
+        # key -> (scope, expires, response)
+        self.entries = {}
+        # key -> (scope, _Call)
+        self.calls = {}
+        self.hits = 0
+        self.coalesced = 0
+
+    def get(self, key, path, fetch, cache=True):
+        """Response of fetch() for key, the GET of path. With cache False a
+        kept answer isn't used, a request in flight still is."""
+        if self.ttl <= 0 and not self.coalesce:
+            return fetch()
+        with self.lock:
+            entry = self.entries.get(key)
+            if cache and entry is not None and entry[1] > time.monotonic():
+                self.hits += 1
+                return copy.copy(entry[2])
+            pending = self.calls.get(key) if self.coalesce else None
+            if pending is not None:
+                self.coalesced += 1
+                call = pending[1]
+            else:
+                call = _Call()
+                self.calls[key] = (scope(path), call)
+        if pending is not None:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.copy(call.response)
+        try:
+            call.response = fetch()
+        except Exception as ex:
+            call.error = ex
+            raise
+        finally:
+            with self.lock:
+                # Gone when a write invalidated it meanwhile.
+                if self.calls.get(key, (None, None))[1] is call:
+                    del self.calls[key]
+                    if self.ttl > 0 and call.response is not None and call.response.ok:
+                        self.entries[key] = (scope(path), time.monotonic() + self.ttl, copy.copy(call.response))
+            call.done.set()
+        return call.response
+
+    def invalidate(self, path):
+        """Forget what was read about the objects a write to path can change."""
+        written = scope(path)
+        with self.lock:
+            for table in (self.entries, self.calls):
+                for key in [key for key, value in table.items() if overlaps(value[0], written)]:
+                    del table[key]
+
+    def take(self):
+        """Returns (cache hits, coalesced requests) since the last call and
+        starts over."""
+        with self.lock:
+            result = (self.hits, self.coalesced)
+            self.hits, self.coalesced = 0, 0
+        return result
@@ -0,0 +1,138 @@
+import bisect
+import collections
+import functools
+import re
+import threading
+
+# Upper bounds in seconds of the latency buckets, like a Prometheus histogram.
+BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+
+# Namespace, resource, name and subresource of an API path, the parts it
+# doesn't have are None. The name after namespaces or projects is the
+# namespace itself.
+ApiPath = collections.namedtuple('ApiPath', ['namespace', 'resource', 'name', 'subresource'])
+
+API_PATH = re.compile(r'^/(?:api/v1|apis/[^/?]+/[^/?]+)(?:/namespaces/([^/?]+))?'
+                      r'/([^/?]+)(?:/([^/?]+)(?:/([^/?]+))?)?(?:\?.*)?$')
+
+@functools.lru_cache(maxsize=1024)
+def parse_path(path):
+    """ApiPath of a request path, which may have a query string, or None
+    when it isn't an API path."""
+    match = API_PATH.match(path)
+    return ApiPath(*match.groups()) if match else None
+
+@functools.lru_cache(maxsize=1024)
+def kind_of(path):
+    """Resource kind of an API path, with the subresource if there is one:
+    /api/v1/namespaces/x/pods/y gives pods, .../builds/y/log builds/log."""
+    parsed = parse_path(path)
+    if parsed is not None:
+        return parsed.resource + ('/' + parsed.subresource if parsed.subresource else '')
+    return path.split('?', 1)[0].strip('/').split('/')[0] or '/'
+
+class Histogram:
+    """Number of requests per latency bucket, with their total latency,
+    CPU time, response bytes and the slowest one."""
+
+    __slots__ = ['counts', 'n', 'seconds', 'cpu', 'bytes', 'max']
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.n = 0
+        self.seconds = 0.0
+        self.cpu = 0.0
+        self.bytes = 0
+        self.max = 0.0
+
+    def add(self, seconds, cpu, size):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.n += 1
+        self.seconds += seconds
+        self.cpu += cpu
+        self.bytes += size
+        self.max = max(self.max, seconds)
+
+    def merge(self, other):
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.n += other.n
+        self.seconds += other.seconds
+        self.cpu += other.cpu
+        self.bytes += other.bytes
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q):
+        """Estimate of quantile q (0.95 for p95), interpolated within the
+        bucket like histogram_quantile() of Prometheus. None without
+        requests."""
+        if self.n == 0:
+            return None
+        rank = q * self.n
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                low = BUCKETS[i - 1] if i > 0 else 0.0
+                high = BUCKETS[i] if i < len(BUCKETS) else self.max
+                return min(low + (high - low) * (rank - seen) / count, self.max)
+            seen += count
+        return self.max
+
+    def as_dict(self):
+        return {
+            'n': self.n,
+            'seconds': self.seconds,
+            'cpu': self.cpu,
+            'bytes': self.bytes,
+            'max': self.max,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'buckets': {str(le): count for le, count in zip(BUCKETS + ['+Inf'], self.counts) if count}}
+
+class RequestStats:
+    """Histograms of the requests to the API per verb, resource kind and
+    status. Watch requests have verb WATCH and are timed until the response
+    headers arrived. Requests that failed without a response have status
+    'error'. Recording a request only takes a dict lookup and a few
+    additions under a lock."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+
+    def record(self, method, path, status, size, seconds, cpu):
+        """Record a request. cpu is the CPU time the thread spent on it,
+        the rest of seconds was spent waiting for the network and the API."""
+        key = (method, kind_of(path), status)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.add(seconds, cpu, size)
+
+    def take(self):
+        """Returns the requests recorded so far as a RequestStats of their
+        own and starts over, so every round gets its own requests."""
+        taken = RequestStats()
+        with self.lock:
+            taken.histograms, self.histograms = self.histograms, {}
+        return taken
+
+    def by(self, *fields):
+        """Histograms merged per combination of fields (verb, kind, status)."""
+        positions = [['verb', 'kind', 'status'].index(field) for field in fields]
+        result = {}
+        with self.lock:
+            for key, histogram in self.histograms.items():
+                merged = result.setdefault(tuple(key[i] for i in positions), Histogram())
+                merged.merge(histogram)
+        return result
+
+    def total(self):
+        return self.by().get((), Histogram())
+
+    def as_list(self):
+        """Every histogram as a dict with verb, kind and status."""
+        with self.lock:
+            return [dict(histogram.as_dict(), verb=verb, kind=kind, status=status)
+                    for (verb, kind, status), histogram in sorted(self.histograms.items(), key=str)]
@@ -0,0 +1,104 @@
+import socket
+import time
+
+def probe_once(host, port=80, path='/', timeout=2.0):
+    """Do one HTTP GET over a new connection. Returns a dict with the time
+    of DNS lookup, TCP connect and time to first byte (seconds), the status
+    code and, when the request failed, the kind of error."""
+    result = {'dns': None, 'connect': None, 'ttfb': None, 'status': None, 'error': None}
+    start = time.monotonic()
+    try:
+        family, socktype, proto, _, address = socket.getaddrinfo(
+            host, port, type=socket.SOCK_STREAM)[0]
+        result['dns'] = time.monotonic() - start
+        with socket.socket(family, socktype, proto) as sock:
+            sock.settimeout(timeout)
+            step = time.monotonic()
+            sock.connect(address)
+            result['connect'] = time.monotonic() - step
+            step = time.monotonic()
+            sock.sendall("GET {} HTTP/1.1\r\nHost: {}\r\nUser-Agent: health-check-script/v0.1\r\n"
+                         "Connection: close\r\n\r\n".format(path, host).encode())
+            response = sock.recv(4096)
+            result['ttfb'] = time.monotonic() - step
+            chunk = response
+            while b'\r\n' not in response:
+                if not chunk:
+                    # Closed before the end of the status line.
+                    raise ConnectionResetError("Connection closed without response.")
+                chunk = sock.recv(4096)
+                response += chunk
+            result['status'] = int(response.split(b'\r\n', 1)[0].split()[1])
+    except socket.gaierror:
+        result['error'] = 'dns'
+    except ConnectionRefusedError:
+        result['error'] = 'refused'
+    except ConnectionResetError:
+        result['error'] = 'reset'
+    except socket.timeout:
+        result['error'] = 'timeout'
+    except (OSError, ValueError, IndexError) as ex:
+        result['error'] = type(ex).__name__
+    result['total'] = time.monotonic() - start
+    return result
+
+class RouteProber:
+    """Hits a route at a fixed, sub-second interval and keeps every attempt.
+    url is host[:port][/path] without protocol, like app_url."""
+
+    def __init__(self, url, interval=0.2, timeout=2.0):
+        host, _, path = url.partition('/')
+        self.host, _, port = host.partition(':')
+        self.port = int(port) if port else 80
+        self.path = '/' + path
+        self.interval = interval
+        self.timeout = timeout
+        self.attempts = []
+        self.first_200 = None
+
+    def __probe(self, start):
+        attempt = probe_once(self.host, self.port, self.path, self.timeout)
+        attempt['at'] = time.monotonic() - start
+        self.attempts.append(attempt)
+        return attempt
+
+    def wait_for_200(self, max_wait=120):
+        """Probe until the first status 200. Returns the seconds until it
+        arrived, or None after max_wait seconds."""
+        start = time.monotonic()
+        while time.monotonic() - start < max_wait:
+            attempt_start = time.monotonic()
+            if self.__probe(start)['status'] == 200:
+                self.first_200 = len(self.attempts) - 1
+                return time.monotonic() - start
+            time.sleep(max(self.interval - (time.monotonic() - attempt_start), 0))
+        return None
+
+    def check_stability(self, window=10):
+        """Keep probing for window seconds after the first 200. Returns the
+        share of attempts in the window that got status 200."""
+        start = time.monotonic()
+        first = len(self.attempts)
+        while time.monotonic() - start < window:
+            attempt_start = time.monotonic()
+            self.__probe(start)
+            time.sleep(max(self.interval - (time.monotonic() - attempt_start), 0))
+        window_attempts = self.attempts[first:]
+        if not window_attempts:
+            return None
+        return sum(1 for a in window_attempts if a['status'] == 200) / len(window_attempts)
+
+    def summary(self):
+        """Counts of the failures before the first 200 and the connection
+        timings of the first 200."""
+        before = self.attempts[:self.first_200] if self.first_200 is not None else self.attempts
+        result = {
+            'attempts_before_200': len(before),
+            '503_before_200': sum(1 for a in before if a['status'] == 503),
+            'refused_before_200': sum(1 for a in before if a['error'] == 'refused'),
+            'errors_before_200': sum(1 for a in before if a['error'] is not None)}
+        if self.first_200 is not None:
+            first = self.attempts[self.first_200]
+            for key in ['dns', 'connect', 'ttfb']:
+                result['first_200_' + key] = first[key]
+        return result
@@ -0,0 +1,114 @@
+import json
+import sqlite3
+import threading
+
+# Every round is stored as one row in rounds and one row per phase in phases.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rounds (
+    id INTEGER PRIMARY KEY,
+    timestamp REAL NOT NULL,
+    round INTEGER,
+    success INTEGER NOT NULL,
+    error TEXT,
+    namespace TEXT,
+    build_node TEXT,
+    app_node TEXT,
+    attempts INTEGER,
+    labels TEXT,
+    round_values TEXT,
+    details TEXT);
+CREATE INDEX IF NOT EXISTS rounds_timestamp ON rounds (timestamp);
+CREATE TABLE IF NOT EXISTS phases (
+    round_id INTEGER NOT NULL REFERENCES rounds (id),
+    phase TEXT NOT NULL,
+    seconds REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS phases_round ON phases (round_id);
+"""
+
+class RunStore:
+    """History of rounds in an SQLite database."""
+
+    def __init__(self, path):
+        self.path = path
+        # Rounds of the daemon run in their own thread, so every call uses
+        # a connection of its own.
+        self.lock = threading.Lock()
+        with self.__connect() as db:
+            db.executescript(SCHEMA)
+            # Databases of older versions miss columns that were added later.
+            columns = [row['name'] for row in db.execute("PRAGMA table_info(rounds)")]
+            if 'details' not in columns:
+                db.execute("ALTER TABLE rounds ADD COLUMN details TEXT")
+        db.close()
+
+    def __connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        db.row_factory = sqlite3.Row
+        return db
+
+    def add(self, timer):
+        """Store the round recorded by a finished RoundTimer."""
+        labels = dict(timer.labels)
+        values = dict(timer.values)
+        attempts = values.pop('attempts', None)
+        with self.lock, self.__connect() as db:
+            cursor = db.execute(
+                "INSERT INTO rounds (timestamp, round, success, error, namespace, build_node,"
+                " app_node, attempts, labels, round_values, details) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (timer.timestamp, timer.round_number, int(bool(timer.success)), timer.error,
+                 labels.pop('namespace', None), labels.pop('build_node', None),
+                 labels.pop('app_node', None), attempts,
+                 json.dumps(labels, sort_keys=True), json.dumps(values, sort_keys=True),
+                 json.dumps(timer.details, sort_keys=True)))
+            db.executemany("INSERT INTO phases (round_id, phase, seconds) VALUES (?, ?, ?)",
+                           [(cursor.lastrowid, phase, seconds) for phase, seconds in timer.spans.items()])
+        db.close()
+
+    def rounds(self, since, until, cluster=None):
+        """Rounds that started between since and until (Unix time), oldest
+        first. Only the rounds of cluster when given."""
+        query, parameters = _cluster_filter("SELECT * FROM rounds WHERE timestamp >= ? AND timestamp < ?",
+                                            [since, until], cluster)
+        with self.__connect() as db:
+            rows = db.execute(query + " ORDER BY timestamp", parameters).fetchall()
+        db.close()
+        return [dict(row) for row in rows]
+
+    def last_rounds(self, count, cluster=None):
+        """The last count rounds, oldest first, with their phase durations
+        as a dict in 'spans'. Only the rounds of cluster when given."""
+        query, parameters = _cluster_filter("SELECT * FROM rounds WHERE 1", [], cluster)
+        with self.__connect() as db:
+            rows = db.execute("SELECT * FROM (" + query + " ORDER BY timestamp DESC LIMIT ?)"
+                              " ORDER BY timestamp", parameters + [count]).fetchall()
+            rounds = {row['id']: dict(row, spans={}) for row in rows}
+            if rounds:
+                for row in db.execute("SELECT round_id, phase, seconds FROM phases WHERE round_id >= ?",
+                                      (min(rounds),)):
+                    if row['round_id'] in rounds:
+                        rounds[row['round_id']]['spans'][row['phase']] = row['seconds']
+        db.close()
+        return list(rounds.values())
+
+    def phase_samples(self, since, until, successful_only=True, cluster=None):
+        """Durations of all phases of the rounds between since and until,
+        of cluster when given. Returns a dict of phase name to a list of
+        seconds."""
+        query = ("SELECT phases.phase, phases.seconds FROM phases JOIN rounds ON rounds.id = phases.round_id"
+                 " WHERE rounds.timestamp >= ? AND rounds.timestamp < ?")
+        if successful_only:
+            query += " AND rounds.success = 1"
+        query, parameters = _cluster_filter(query, [since, until], cluster)
+        with self.__connect() as db:
+            rows = db.execute(query + " ORDER BY rounds.timestamp", parameters).fetchall()
+        db.close()
+        samples = {}
+        for row in rows:
+            samples.setdefault(row['phase'], []).append(row['seconds'])
+        return samples
+
+def _cluster_filter(query, parameters, cluster):
+    """Add a condition on the cluster label to query when cluster is given."""
+    if cluster is None:
+        return query, parameters
+    return query + " AND json_extract(rounds.labels, '$.cluster') = ?", parameters + [cluster]
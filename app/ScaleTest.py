@@ -0,0 +1,149 @@
+import concurrent.futures
+import http.client
+import statistics
+import threading
+import time
+
+class ScaleTest:
+    """Scales a DeploymentConfig up and records per pod when it was
+    scheduled, Running, added to the endpoints of the service and first
+    answered through the route. Times are seconds since the scale request
+    of the step that created the pod."""
+
+    def __init__(self, connector, dc_name, service_name, app_url, timeout=180, probe_interval=0.05):
+        self.c = connector
+        self.dc_name = dc_name
+        self.service_name = service_name
+        host, _, path = app_url.partition('/')
+        self.host, _, port = host.partition(':')
+        self.port = int(port) if port else 80
+        self.path = '/' + path
+        self.timeout = timeout
+        self.probe_interval = probe_interval
+        self.lock = threading.Lock()
+        # Pod name -> dict with step, node, scheduled, running, endpoint and route.
+        self.pods = {}
+
+    def __pod(self, name, step):
+        if name not in self.pods:
+            self.pods[name] = {'step': step, 'node': None, 'scheduled': None,
+                               'running': None, 'endpoint': None, 'route': None}
+        return self.pods[name]
+
+    def __watch_pods(self, step, start):
+        def all_running(pods):
+            now = time.monotonic() - start
+            with self.lock:
+                for name, pod in pods.items():
+                    entry = self.__pod(name, step)
+                    if entry['scheduled'] is None:
+                        entry['scheduled'] = now
+                        entry['node'] = pod.node
+                    if pod.status == 'Running' and entry['running'] is None:
+                        entry['running'] = now
+            return len(pods) == step and all(pod.status == 'Running' for pod in pods.values())
+        return self.c.wait_for_pods(all_running, self.timeout,
+                                    label_selector='deploymentconfig=' + self.dc_name)
+
+    def __watch_endpoints(self, step, start):
+        def all_added(endpoints):
+            now = time.monotonic() - start
+            pods = endpoints.get(self.service_name, {})
+            with self.lock:
+                for name in pods:
+                    entry = self.__pod(name, step)
+                    if entry['endpoint'] is None:
+                        entry['endpoint'] = now
+            return len(pods) >= step
+        return self.c.wait_for_endpoints(self.service_name, all_added, self.timeout)
+
+    def __fetch(self):
+        """GET the route over a new connection, so the router can pick
+        another replica. Returns the body or None."""
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=5)
+        try:
+            connection.request('GET', self.path, headers={'User-Agent': 'health-check-script/v0.1',
+                                                          'Connection': 'close'})
+            response = connection.getresponse()
+            body = response.read().decode(errors='replace')
+            return body if response.status == 200 else None
+        except (OSError, http.client.HTTPException):
+            return None
+        finally:
+            connection.close()
+
+    def __watch_route(self, step, start, stop):
+        """Request the route until every replica has answered. Replicas are
+        recognized by their pod name in the response, like phpinfo() shows
+        it as HOSTNAME."""
+        while not stop.is_set() and time.monotonic() - start < self.timeout:
+            body = self.__fetch()
+            now = time.monotonic() - start
+            with self.lock:
+                if body is not None:
+                    for name, entry in self.pods.items():
+                        if entry['route'] is None and name in body:
+                            entry['route'] = now
+                current = [entry for entry in self.pods.values() if entry['endpoint'] is not None]
+                if len(current) >= step and all(entry['route'] is not None for entry in current):
+                    return True
+            time.sleep(self.probe_interval)
+        return False
+
+    def scale(self, step):
+        """Scale to step replicas and wait until all of them are running,
+        in the endpoints and answered through the route. Returns a dict with
+        the time until the last pod reached each of those, None when that
+        didn't happen within timeout seconds."""
+        start = time.monotonic()
+        self.c.scale_deploymentconfig(self.dc_name, step)
+        stop = threading.Event()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
+            pods = executor.submit(self.__watch_pods, step, start)
+            endpoints = executor.submit(self.__watch_endpoints, step, start)
+            route = executor.submit(self.__watch_route, step, start, stop)
+            running, added = pods.result(), endpoints.result()
+            if not (running and added):
+                stop.set()
+            balanced = route.result()
+        with self.lock:
+            new = [entry for entry in self.pods.values() if entry['step'] == step]
+        def last(key, done):
+            return max((entry[key] for entry in new if entry[key] is not None), default=None) if done else None
+        return {'replicas': step,
+                'new_pods': len(new),
+                'scheduled': last('scheduled', running),
+                'running': last('running', running),
+                'endpoints': last('endpoint', added),
+                'route_balanced': last('route', balanced)}
+
+    def run(self, replicas, step=0):
+        """Scale from the current replicas to replicas, all at once or step
+        replicas at a time. Returns the results of every step."""
+        current = self.c.get_pods(label_selector='deploymentconfig=' + self.dc_name)
+        with self.lock:
+            # The pods that are already running count as done.
+            for name, pod in current.items():
+                self.pods[name] = {'step': len(current), 'node': pod.node, 'scheduled': 0.0,
+                                   'running': 0.0, 'endpoint': 0.0, 'route': 0.0}
+        if step <= 0:
+            targets = [replicas]
+        else:
+            targets = list(range(len(current) + step, replicas, step)) + [replicas]
+        return [self.scale(target) for target in targets]
+
+    def per_node(self):
+        """Dict of node to the number of pods and the median time to
+        Running and to being in the endpoints."""
+        nodes = {}
+        with self.lock:
+            for entry in self.pods.values():
+                nodes.setdefault(entry['node'], []).append(entry)
+        result = {}
+        for node, entries in nodes.items():
+            running = [e['running'] for e in entries if e['running'] is not None]
+            endpoint = [e['endpoint'] for e in entries if e['endpoint'] is not None]
+            result[node] = {'pods': len(entries),
+                            'running': statistics.median(running) if running else None,
+                            'endpoint': statistics.median(endpoint) if endpoint else None}
+        return result
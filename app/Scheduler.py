@@ -0,0 +1,157 @@
+import signal
+import threading
+import traceback
+from datetime import datetime, timedelta
+
+class IntervalSchedule:
+    """Start a round every interval seconds. Start times are fixed, so a
+    round that takes long doesn't shift the rounds after it. Start times
+    that were missed are skipped."""
+
+    def __init__(self, interval):
+        if interval <= 0:
+            raise ValueError("Interval must be larger than 0.")
+        self.interval = interval
+        self.previous = None
+
+    def next_after(self, now):
+        if self.previous is None:
+            self.previous = now
+            return now
+        next_start = self.previous + timedelta(seconds=self.interval)
+        while next_start < now:
+            next_start += timedelta(seconds=self.interval)
+        self.previous = next_start
+        return next_start
+
+class PauseSchedule:
+    """Start a round pause seconds after the previous one ended, like
+    run.sh used to do. Daemon asks for the next start once a round ended."""
+
+    def __init__(self, pause):
+        if pause < 0:
+            raise ValueError("Pause can't be negative.")
+        self.pause = pause
+        self.started = False
+
+    def next_after(self, now):
+        if not self.started:
+            self.started = True
+            return now
+        return now + timedelta(seconds=self.pause)
+
+class CronSchedule:
+    """Start a round at the times matching a cron expression with five
+    fields: minute, hour, day of month, month and day of week. Supports
+    '*', lists (1,2), ranges (1-5) and steps (*/5, 0-30/10)."""
+
+    ranges = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError("Cron expression needs 5 fields: {}".format(expression))
+        self.minutes, self.hours, self.days, self.months, self.weekdays = [
+            self.__parse(field, low, high) for field, (low, high) in zip(fields, self.ranges)]
+        # Both 0 and 7 are sunday.
+        if 7 in self.weekdays:
+            self.weekdays.add(0)
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+
+    @staticmethod
+    def __parse(field, low, high):
+        values = set()
+        for part in field.split(','):
+            step = 1
+            if '/' in part:
+                part, step = part.split('/')
+                step = int(step)
+            if part == '*':
+                start, end = low, high
+            elif '-' in part:
+                start, end = [int(x) for x in part.split('-')]
+            else:
+                start = end = int(part)
+            if start < low or end > high or start > end or step < 1:
+                raise ValueError("Invalid cron field: {}".format(field))
+            values.update(range(start, end + 1, step))
+        return values
+
+    def __day_matches(self, moment):
+        day = moment.day in self.days
+        # datetime uses 0 for monday, cron 0 for sunday.
+        weekday = (moment.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day and weekday
+        # Like cron: when both are restricted, either one has to match.
+        return day or weekday
+
+    def next_after(self, now):
+        moment = now.replace(second=0, microsecond=0)
+        if moment < now:
+            moment += timedelta(minutes=1)
+        # Nothing matches more than a few years ahead (e.g. 30 february).
+        limit = moment + timedelta(days=366 * 5)
+        while moment < limit:
+            if moment.month not in self.months or not self.__day_matches(moment):
+                moment = (moment + timedelta(days=1)).replace(hour=0, minute=0)
+            elif moment.hour not in self.hours:
+                moment = (moment + timedelta(hours=1)).replace(minute=0)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment
+        raise ValueError("Cron expression never matches.")
+
+class Daemon:
+    """Runs function(round_number) according to schedule until stopped with
+    SIGINT or SIGTERM. Every round runs in its own thread, so an exception
+    doesn't take the daemon down. on_failure(round_number, text) is called
+    when a round raises, and as an alert when it runs longer than
+    alert_after seconds. A thread can't be stopped from outside, so a slow
+    round is still finished before the next one starts; function has to end
+    a round that hangs itself. An exception of on_failure is printed."""
+
+    def __init__(self, schedule, function, alert_after, on_failure):
+        self.schedule = schedule
+        self.function = function
+        self.alert_after = alert_after
+        self.on_failure = on_failure
+        self.stopped = threading.Event()
+
+    def stop(self, *args):
+        """Stop after the current round."""
+        self.stopped.set()
+
+    def __report(self, number, text):
+        try:
+            self.on_failure(number, text)
+        except Exception:
+            print("Reporting round {} failed:\n{}".format(number, traceback.format_exc()))
+
+    def __run_round(self, number):
+        try:
+            self.function(number)
+        except Exception:
+            self.__report(number, traceback.format_exc())
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        number = 0
+        while not self.stopped.is_set():
+            next_start = self.schedule.next_after(datetime.now())
+            wait = (next_start - datetime.now()).total_seconds()
+            if wait > 0 and self.stopped.wait(wait):
+                break
+            number += 1
+            thread = threading.Thread(target=self.__run_round, args=(number,),
+                                      name="round-{}".format(number), daemon=True)
+            thread.start()
+            thread.join(self.alert_after)
+            if thread.is_alive():
+                self.__report(number, "Round {} is still running after {} seconds.".format(
+                    number, self.alert_after))
+                while thread.is_alive() and not self.stopped.is_set():
+                    thread.join(1)
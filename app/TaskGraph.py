@@ -0,0 +1,57 @@
+import concurrent.futures
+import time
+
+class TaskGraph:
+    """Runs tasks on a thread pool. A task starts as soon as all tasks it
+    depends on are finished, so independent API calls run in parallel."""
+
+    def __init__(self, max_workers=6):
+        self.max_workers = max_workers
+        self.tasks = {}
+        self.durations = {}
+
+    def add(self, name, function, /, *args, depends_on=(), **kwargs):
+        """Add task name, which calls function(*args, **kwargs) after all
+        tasks in depends_on are done. name and function are positional
+        only, so kwargs can contain a 'name' for function."""
+        for dependency in depends_on:
+            if dependency not in self.tasks:
+                raise ValueError("Task {} depends on unknown task {}.".format(name, dependency))
+        self.tasks[name] = (function, args, kwargs, tuple(depends_on))
+
+    def __timed(self, name):
+        function, args, kwargs, _ = self.tasks[name]
+        start = time.monotonic()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self.durations[name] = time.monotonic() - start
+
+    def run(self):
+        """Run all tasks. Returns a dict with the result of every task.
+        When a task fails no new tasks are started, the running tasks are
+        finished and the first exception is raised."""
+        results = {}
+        running = {}
+        pending = dict(self.tasks)
+        error = None
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                if error is None:
+                    for name in list(pending):
+                        if all(dependency in results for dependency in pending[name][3]):
+                            running[executor.submit(self.__timed, name)] = name
+                            del pending[name]
+                if not running:
+                    break
+                done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except Exception as ex:
+                        if error is None:
+                            error = ex
+        if error is not None:
+            raise error
+        return results
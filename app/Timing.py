@@ -0,0 +1,166 @@
+import contextlib
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class RoundTimer:
+    """Records named spans (durations in seconds) and values (counts,
+    ratios) of one round, together with labels such as the nodes the pods
+    ran on."""
+
+    def __init__(self, round_number):
+        self.round_number = round_number
+        self.timestamp = time.time()
+        self.spans = {}
+        self.values = {}
+        self.labels = {}
+        # Structured information that doesn't fit in a number, like the
+        # startup timeline of every pod. Only in the JSON output.
+        self.details = {}
+        self.success = None
+        self.error = None
+        self.started = {}
+
+    def start(self, name):
+        """Start span name."""
+        self.started[name] = time.monotonic()
+
+    def stop(self, name):
+        """Stop span name. Returns its duration."""
+        self.spans[name] = time.monotonic() - self.started.pop(name)
+        return self.spans[name]
+
+    @contextlib.contextmanager
+    def span(self, name):
+        """Record the duration of the with block as span name, also when
+        the block raises."""
+        self.start(name)
+        try:
+            yield
+        finally:
+            self.stop(name)
+
+    def add(self, name, seconds):
+        """Add a span that was measured elsewhere."""
+        self.spans[name] = seconds
+
+    def set_value(self, name, value):
+        """Record a number that isn't a duration."""
+        self.values[name] = value
+
+    def set_label(self, name, value):
+        self.labels[name] = value
+
+    def set_detail(self, name, value):
+        self.details[name] = value
+
+    def finish(self, error=None):
+        """Mark the round as done. Spans that are still open are closed."""
+        for name in list(self.started):
+            self.stop(name)
+        self.success = error is None
+        self.error = error
+
+    def as_dict(self):
+        return {
+            'round': self.round_number,
+            'timestamp': self.timestamp,
+            'success': self.success,
+            'error': self.error,
+            'labels': self.labels,
+            'spans': self.spans,
+            'values': self.values,
+            'details': self.details}
+
+    def to_json(self):
+        """One JSON line for this round."""
+        return json.dumps(self.as_dict(), sort_keys=True)
+
+    def to_prometheus(self):
+        """Metrics of this round in the Prometheus text format."""
+        return to_prometheus([self])
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def to_prometheus(timers):
+    """Metrics of the last rounds in timers, for example one per cluster,
+    in the Prometheus text format. The round number is a metric of its own
+    instead of a label, so every round doesn't create new time series. For
+    the same reason the metrics only get the cluster label, the labels that
+    change per round (namespace, nodes, image) are only on
+    health_check_round_info."""
+    phases, values, success, info, rounds, timestamps = [], [], [], [], [], []
+    for timer in timers:
+        labels = ',cluster="{}"'.format(_escape(timer.labels['cluster'])) if 'cluster' in timer.labels else ''
+        cluster = '{{{}}}'.format(labels[1:]) if labels else ''
+        for name, seconds in timer.spans.items():
+            phases.append('health_check_phase_seconds{{phase="{}"{}}} {:.6f}'.format(
+                _escape(name), labels, seconds))
+        for name, value in timer.values.items():
+            values.append('health_check_value{{name="{}"{}}} {}'.format(
+                _escape(name), labels, value))
+        success.append('health_check_round_success{} {}'.format(cluster, int(bool(timer.success))))
+        round_labels = ','.join('{}="{}"'.format(key, _escape(value)) for key, value in sorted(timer.labels.items()))
+        info.append('health_check_round_info{} 1'.format('{{{}}}'.format(round_labels) if round_labels else ''))
+        rounds.append('health_check_round{} {}'.format(cluster, timer.round_number))
+        timestamps.append('health_check_round_timestamp_seconds{} {:.3f}'.format(cluster, timer.timestamp))
+    lines = [
+        '# HELP health_check_phase_seconds Duration of a phase of the last health check round.',
+        '# TYPE health_check_phase_seconds gauge'] + phases + [
+        '# HELP health_check_value Other numbers recorded in the last health check round.',
+        '# TYPE health_check_value gauge'] + values + [
+        '# HELP health_check_round_success 1 if the last round succeeded, 0 if it failed.',
+        '# TYPE health_check_round_success gauge'] + success + [
+        '# HELP health_check_round_info Namespace, nodes and image of the last round, always 1.',
+        '# TYPE health_check_round_info gauge'] + info + [
+        '# HELP health_check_round Number of the last round.',
+        '# TYPE health_check_round gauge'] + rounds + [
+        '# HELP health_check_round_timestamp_seconds Start time of the last round.',
+        '# TYPE health_check_round_timestamp_seconds gauge'] + timestamps
+    return '\n'.join(lines) + '\n'
+
+def append_json(path, timer):
+    """Append the round as a JSON line to path."""
+    with open(path, 'at') as f:
+        f.write(timer.to_json() + '\n')
+
+def write_textfile(path, text):
+    """Write a Prometheus textfile. Writes to a temporary file first, so
+    the node exporter never reads a half written file."""
+    with open(path + '.tmp', 'wt') as f:
+        f.write(text)
+    os.replace(path + '.tmp', path)
+
+class MetricsServer:
+    """Serves the metrics of the last round on http://<address>:<port>/metrics."""
+
+    def __init__(self, port, address=''):
+        self.text = ''
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+                body = server.text.encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((address, port), Handler)
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def update(self, text):
+        self.text = text
+
+    def close(self):
+        self.httpd.shutdown()
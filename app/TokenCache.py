@@ -0,0 +1,68 @@
+import json
+import os
+import threading
+import time
+
+def parse_token_location(location):
+    """Parse the Location header OpenShift returns after a successful
+    login. Returns the access token and the seconds until it expires
+    (None when the server didn't say)."""
+    # In de location header wordt de URL genoemd. Nu moeten we deze URL parsen zodat
+    # we het token kunnen vinden. Sorry voor degene die dit ooit moet reverse engineren.
+    urlItems = [ x.split('=') for x in location.split('#')[1].split('&')]
+    urlItemsDict = {}
+    for urlItem in urlItems:
+        urlItemsDict[urlItem[0]] = urlItem[1]
+    expires_in = urlItemsDict.get('expires_in')
+    return urlItemsDict['access_token'], int(expires_in) if expires_in else None
+
+class TokenCache:
+    """Keeps OAuth access tokens in a file that only the owner can read, so
+    a new run doesn't have to log in again. Tokens are stored per API URL
+    and username."""
+
+    def __init__(self, path, refresh_margin=300):
+        self.path = path
+        # Tokens that expire within this many seconds aren't used anymore.
+        self.refresh_margin = refresh_margin
+        self.lock = threading.Lock()
+
+    def __read(self):
+        try:
+            with open(self.path, 'rt') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, host, username):
+        """Returns (token, expires_at) of a cached token that is still valid
+        for at least refresh_margin seconds, or None."""
+        with self.lock:
+            entry = self.__read().get(host + ' ' + username)
+        if entry is None:
+            return None
+        if entry['expires_at'] is not None and entry['expires_at'] - self.refresh_margin < time.time():
+            return None
+        return entry['token'], entry['expires_at']
+
+    def store(self, host, username, token, expires_in):
+        """Store a token that expires in expires_in seconds (None if
+        unknown). Returns the time it expires."""
+        expires_at = time.time() + expires_in if expires_in is not None else None
+        with self.lock:
+            tokens = self.__read()
+            tokens[host + ' ' + username] = {'token': token, 'expires_at': expires_at}
+            # Create with mode 0600 right away, so the token is never readable
+            # by others, and replace the old file in one step.
+            tmp = self.path + '.tmp'
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, 'wt') as f:
+                json.dump(tokens, f)
+            os.replace(tmp, self.path)
+        return expires_at
+
+    def expiring(self, expires_at):
+        """True when a token that expires at expires_at should be refreshed."""
+        return expires_at is not None and expires_at - self.refresh_margin < time.time()
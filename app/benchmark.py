@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+import argparse
+import configparser
+import contextlib
+import io
+import json
+import multiprocessing
+import statistics
+import sys
+import time
+from datetime import datetime
+import ApiConnector
+import FakeApiServer
+import main
+
+# Measures the overhead of the script itself against FakeApiServer, so
+# performance regressions in the client show up without a cluster. The fake
+# server runs in its own process, so CPU time measured here is client time.
+
+def serve(connection, options):
+    """Run a FakeApiServer until something is sent over connection."""
+    server = FakeApiServer.FakeApiServer(**options)
+    connection.send(server.port)
+    connection.recv()
+    server.close()
+
+@contextlib.contextmanager
+def fake_server(**options):
+    """Start a FakeApiServer in another process. Yields its URL."""
+    parent, child = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=serve, args=(child, options), daemon=True)
+    process.start()
+    port = parent.recv()
+    try:
+        yield 'http://127.0.0.1:{}'.format(port), port
+    finally:
+        parent.send('stop')
+        process.join(5)
+
+def benchmark_config(api_url, port):
+    config = configparser.ConfigParser()
+    config.read_dict({
+        'authentication': {'token': 'fake'},
+        'connection': {'api_url': api_url, 'namespace': 'health-check',
+                       'app_url': '127.0.0.1:{}'.format(port)},
+        'behaviour': {'delete_ns': 'False', 'max_attempts_between_deletes': '0'},
+        'route_probe': {'interval': '0.02', 'stability_window': '0'},
+        'metrics': {'json_file': ''}})
+    return config
+
+def summarize(samples):
+    """Mean, median and 95th percentile of samples, in microseconds."""
+    samples = sorted(samples)
+    return {
+        'mean_us': round(statistics.mean(samples) * 1e6, 1),
+        'p50_us': round(samples[len(samples) // 2] * 1e6, 1),
+        'p95_us': round(samples[int(len(samples) * 0.95)] * 1e6, 1)}
+
+def measure(function, iterations):
+    """Call function iterations times. Returns summaries of wall and CPU time."""
+    wall, cpu = [], []
+    for _ in range(iterations):
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        function()
+        wall.append(time.perf_counter() - wall_start)
+        cpu.append(time.process_time() - cpu_start)
+    return {'wall': summarize(wall), 'cpu': summarize(cpu)}
+
+def benchmark_calls(c, iterations):
+    """Time single API calls of the connector."""
+    c.create_namespace()
+    c.create_status_cm()
+    c.create_deploymentconfig(name='check-website-dc', app_name='check-website',
+                              image='check-website-is:latest', tcp_port=8080, replicas=5)
+    c.start_deployment('check-website-dc')
+    c.wait_for_pods(lambda pods: len(pods) >= 6, timeout=10)
+    def create_delete_service():
+        c.create_service(name='bench-svc', app_name='bench', tcp_port=8080, selector_dc='bench')
+        c.delete_service('bench-svc')
+    calls = {
+        'check_if_namespace_exists': c.check_if_namespace_exists,
+        'get_status_attempts': c.get_status_attempts,
+        'get_pods': c.get_pods,
+        'get_pods_table': lambda: c.get_pods(projection='table'),
+        'get_pods_selector': lambda: c.get_pods(label_selector='deploymentconfig=check-website-dc'),
+        'create_delete_service': create_delete_service}
+    return {name: measure(call, iterations) for name, call in calls.items()}
+
+def benchmark_rounds(c, config, rounds):
+    """Time complete rounds. Returns per round wall time, CPU time and the
+    number of API calls."""
+    results = []
+    for number in range(1, rounds + 1):
+        main.current.starttime = datetime.now()
+        before = c.get_connection_stats()['requests']
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        with contextlib.redirect_stdout(io.StringIO()):
+            main.timed_run(c, config, number)
+        results.append({
+            'wall': time.perf_counter() - wall_start,
+            'cpu': time.process_time() - cpu_start,
+            'api_calls': c.get_connection_stats()['requests'] - before})
+    return {
+        'wall': summarize([r['wall'] for r in results]),
+        'cpu': summarize([r['cpu'] for r in results]),
+        'api_calls': statistics.mean(r['api_calls'] for r in results)}
+
+def compare(results, baseline, tolerance):
+    """Returns a list of regressions: CPU time that grew more than
+    tolerance (0.2 is 20%) compared to baseline."""
+    regressions = []
+    pairs = [('round', results['round'], baseline.get('round'))]
+    pairs += [(name, value, baseline.get('calls', {}).get(name))
+              for name, value in results['calls'].items()]
+    for name, current, previous in pairs:
+        if previous is None:
+            continue
+        if current['cpu']['p50_us'] > previous['cpu']['p50_us'] * (1 + tolerance):
+            regressions.append("{}: CPU p50 {} us, was {} us".format(
+                name, current['cpu']['p50_us'], previous['cpu']['p50_us']))
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the health check against a fake API server.")
+    parser.add_argument('--rounds', type=int, default=5, help="Number of complete rounds.")
+    parser.add_argument('--iterations', type=int, default=200, help="Number of calls per API call benchmark.")
+    parser.add_argument('--latency', type=float, default=0.0, help="Latency the fake server adds to every request.")
+    parser.add_argument('--output', help="Write the results as JSON to this file.")
+    parser.add_argument('--baseline', help="Compare with the results in this JSON file.")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="Allowed CPU time increase compared to the baseline.")
+    args = parser.parse_args()
+
+    with fake_server(latency=args.latency) as (api_url, port):
+        c = ApiConnector.ApiConnector(api_url, 'health-check-calls', token='fake')
+        results = {'calls': benchmark_calls(c, args.iterations)}
+        c = ApiConnector.ApiConnector(api_url, 'health-check', token='fake')
+        results['round'] = benchmark_rounds(c, benchmark_config(api_url, port), args.rounds)
+
+    for name, value in list(results['calls'].items()) + [('round', results['round'])]:
+        print("{:28} wall p50 {:>10} us  cpu p50 {:>10} us  cpu p95 {:>10} us".format(
+            name, value['wall']['p50_us'], value['cpu']['p50_us'], value['cpu']['p95_us']))
+    print("API calls per round: {:.0f}".format(results['round']['api_calls']))
+    if args.output:
+        with open(args.output, 'wt') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, 'rt') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print("REGRESSION " + regression)
+        if regressions:
+            sys.exit(1)
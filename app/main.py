@@ -1,32 +1,114 @@
 #!/usr/bin/env python3
 import ApiConnector
+import BuildLog
+import ChurnEngine
+import Clusters
+import EventCollector
+import ImageCache
+import InClusterProbe
+import LoadGenerator
+import Manifests
+import NamespacePool
+import NodeStats
+import Notifier
+import Profiling
+import PullSpread
+import Reconciler
+import RouteProber
+import RunStore
+import ScaleTest
+import Scheduler
+import TaskGraph
+import Timing
+import TokenCache
+import argparse
+import concurrent.futures
+import cProfile
+import functools
 import getpass
 import os
+import pstats
+import sys
 import time
+import threading
 import requests
 import configparser
 from datetime import datetime
 
+class RoundState(threading.local):
+    """The round running in this thread: its output, so the daemon can
+    send it along on failure, its spans and when it started. Rounds of
+    several clusters run at the same time, each in a thread of its own."""
+
+    def __init__(self):
+        self.output = []
+        self.timer = Timing.RoundTimer(0)
+        self.starttime = datetime.now()
+        # Name of the cluster of the round, None with a single cluster.
+        self.cluster = None
+
+current = RoundState()
+# Serves the metrics of the last round when [metrics] port is set.
+metrics_server = None
+# Rolling statistics per node of every cluster, see get_node_stats().
+node_stats = {}
+# Last finished round of every cluster, for the Prometheus metrics.
+last_rounds = {}
+# Rounds of several clusters write to the same metrics files and output.
+metrics_lock = threading.Lock()
+print_lock = threading.Lock()
+# Token caches by path, clusters share the file.
+token_caches = {}
+# Source and base image of the application.
+SOURCE_GIT = 'https://github.com/tomwis97/phpinfo-test'
+BASE_IMAGE = 'php:7.4-ubi8'
+# Objects a round creates: step name, kind and name.
+OBJECTS = [
+    ('deploymentconfig', 'DeploymentConfig', 'check-website-dc'),
+    ('imagestream', 'ImageStream', 'check-website-is'),
+    ('buildconfig', 'BuildConfig', 'check-website-bc'),
+    ('secret', 'Secret', 'deploy-key'),
+    ('service', 'Service', 'check-website-svc'),
+    ('route', 'Route', 'check-website-route'),
+    ('job', 'Job', 'check-probe')]
+
 def print_output(text, level="INFO"):
     """Function for logging information. Adds timestamp."""
-    global starttime
     now = datetime.now()
     timestamp = now.strftime('%H:%M.%S')
-    duration = str((now - starttime).seconds) + "," + str(round((now - starttime).microseconds / 1000)).zfill(3)
+    duration = str((now - current.starttime).seconds) + "," + str(round((now - current.starttime).microseconds / 1000)).zfill(3)
+    if current.cluster is not None:
+        text = "{} - {}".format(current.cluster, text)
     output = "[{duration} - {time}] {level} - {text}".format(duration=duration, time=timestamp, level=level, text=text)
-    print(output)
+    with print_lock:
+        print(output)
+    current.output.append(output)
+
+def in_background(function, *args):
+    """Call function(*args) in a thread that shares the round state of
+    this thread, so it prints to the output of the round. Returns a
+    concurrent.futures.Future of the result."""
+    future = concurrent.futures.Future()
+    state = (current.output, current.timer, current.starttime, current.cluster)
+
+    def run():
+        current.output, current.timer, current.starttime, current.cluster = state
+        try:
+            future.set_result(function(*args))
+        except BaseException as ex:
+            future.set_exception(ex)
+    threading.Thread(target=run, daemon=True).start()
+    return future
 
 def raise_error(text):
     print_output(text, level="ERROR")
     # Print so we get the timestamp. Then actually raise a RuntimeError to stop execution.
     raise RuntimeError(text)
 
-def main():
-    global starttime
-
-    # Read configuration and check parameters.
+def read_config(path='config.ini'):
+    """Read configuration and check parameters. Returns ConfigParser."""
     config = configparser.ConfigParser()
-    with open('config.ini', 'rt') as f:
+    with open(path, 'rt') as f:
         config.read_file(f)
     if not (config.has_option('connection', 'api_url') or config.get('connection', 'api_url') == ''):
         raise ValueError("No API URL given.")
@@ -34,25 +116,332 @@ def main():
         raise ValueError("No app URL given.")
     if not (config.has_option('connection', 'namespace') or config.get('connection', 'namespace') == ''):
         raise ValueError("No namespace given.")
+    if not config.has_option('behaviour', 'delete_ns'):
+        raise ValueError("Option delete_ns missing.")
+    if not config.has_option('behaviour', 'max_attempts_between_deletes'):
+        raise ValueError("Option max_attempts_between_delete smissing.")
+    return config
+
+def create_connector(config):
+    """Create an ApiConnector based on the configuration."""
+    pool_options = {
+        'pool_size': config.getint('connection', 'pool_size', fallback=10),
+        'keepalive': config.getboolean('connection', 'keepalive', fallback=True),
+        'connect_timeout': config.getfloat('connection', 'connect_timeout', fallback=5),
+        'read_timeout': config.getfloat('connection', 'read_timeout', fallback=30),
+        'qps': config.getfloat('connection', 'qps', fallback=0),
+        'burst': config.getint('connection', 'burst', fallback=40),
+        'cache_ttl': config.getfloat('connection', 'cache_ttl', fallback=0),
+        'coalesce': config.getboolean('connection', 'coalesce', fallback=False)}
     if config.has_option('authentication', 'token'):
         print_output("Using token for authentication.");
         token = config.get('authentication', 'token')
-        c = ApiConnector.ApiConnector(config.get('connection', 'api_url'), config.get('connection', 'namespace'), token=token);
+        c = ApiConnector.ApiConnector(config.get('connection', 'api_url'), config.get('connection', 'namespace'), token=token, **pool_options);
     elif (config.has_option('authentication', 'username') and config.has_option('authentication', 'password')):
         print_output("Using username and password for authentication.");
         username = config.get('authentication', 'username')
         password = config.get('authentication', 'password')
-        c = ApiConnector.ApiConnector(config.get('connection', 'api_url'), config.get('connection', 'namespace'), username=username, password=password);
+        c = ApiConnector.ApiConnector(config.get('connection', 'api_url'), config.get('connection', 'namespace'), username=username, password=password, token_cache=create_token_cache(config), **pool_options);
     else:
         raise ValueError('No authentication specified in config.')
-    if not config.has_option('behaviour', 'delete_ns'):
-        raise ValueError("Option delete_ns missing.")
-    else:
-        delete_namespace = config.getboolean('behaviour', 'delete_ns')
-    if not config.has_option('behaviour', 'max_attempts_between_deletes'):
-        raise ValueError("Option max_attempts_between_delete smissing.")
-    else:
-        max_attempts = config.getint('behaviour', 'max_attempts_between_deletes')
+    return c
+
+def create_token_cache(config):
+    """Returns the TokenCache configured in the authentication section,
+    or None when token_cache is empty."""
+    path = config.get('authentication', 'token_cache', fallback='')
+    if not path:
+        return None
+    if path not in token_caches:
+        token_caches[path] = TokenCache.TokenCache(
+            path, config.getint('authentication', 'token_refresh_margin', fallback=300))
+    return token_caches[path]
+
+def print_connection_stats(connector):
+    """Print how many requests were done over how many connections."""
+    stats = connector.get_connection_stats()
+    print_output("API calls: {requests} over {connections} connection(s), {handshakes_saved} handshake(s) saved, average latency {latency} ms".format(
+        latency=round(stats['avg_latency'] * 1000, 1), **stats))
+
+def report_round(config, error=None):
+    """Close the timer of this round and write its metrics to the files
+    configured in the metrics section."""
+    timer = current.timer
+    timer.finish(error)
+    print_output("Phases: " + ", ".join("{} {:.2f}s".format(name, seconds)
+                                        for name, seconds in timer.spans.items()))
+    stats = get_node_stats(config)
+    with metrics_lock:
+        if config.get('metrics', 'json_file', fallback=''):
+            Timing.append_json(config.get('metrics', 'json_file'), timer)
+        if config.get('metrics', 'database', fallback=''):
+            RunStore.RunStore(config.get('metrics', 'database')).add(timer)
+        stats.add_timer(timer)
+        outliers = stats.outliers(config.getfloat('nodes', 'outlier_threshold', fallback=3.5),
+                                  config.getint('nodes', 'min_samples', fallback=5))
+        last_rounds[current.cluster] = timer
+        text = Timing.to_prometheus(list(last_rounds.values()))
+        if config.get('metrics', 'prometheus_file', fallback=''):
+            Timing.write_textfile(config.get('metrics', 'prometheus_file'), text)
+        if metrics_server is not None:
+            metrics_server.update(text)
+    for phase, node, median, center in outliers:
+        print_output("Node {} is slow in phase {}: median {:.2f}s, median of all nodes {:.2f}s".format(
+            node, phase, median, center), level="WARNING")
+
+def get_node_stats(config):
+    """Returns the NodeStats of the cluster of this round kept between
+    rounds. The first time it is filled with the last rounds of the
+    cluster in the database."""
+    with metrics_lock:
+        if current.cluster not in node_stats:
+            stats = NodeStats.NodeStats(config.getint('nodes', 'window', fallback=50))
+            if config.get('metrics', 'database', fallback=''):
+                stats.load(RunStore.RunStore(config.get('metrics', 'database')), cluster=current.cluster)
+            node_stats[current.cluster] = stats
+        return node_stats[current.cluster]
+
+def pinned_node(c, config):
+    """Node to run the application pod on according to pin in the nodes
+    section: nothing, a node name, or 'cycle' for every node in turn."""
+    pin = config.get('nodes', 'pin', fallback='')
+    if pin != 'cycle':
+        return pin or None
+    return NodeStats.choose_node(node_names(c, config), get_node_stats(config))
+
+def node_names(c, config):
+    """The nodes in the nodes section, or all Ready worker nodes."""
+    nodes = [node.strip() for node in config.get('nodes', 'nodes', fallback='').split(',') if node.strip()]
+    return nodes or c.get_nodes()
+
+def timed_run(c, config, round_number, pool=None, timeout=0):
+    """Run one round and report its metrics, also when it fails. Uses a
+    namespace of pool when given. After timeout seconds (0 is no limit)
+    the requests of the round are interrupted, so it ends as a failed round.
+    What it created is removed by the next round, or by the pool."""
+    c = c.interruptible()
+    interrupter = None
+    if timeout > 0:
+        interrupter = threading.Timer(timeout, c.interrupt)
+        interrupter.daemon = True
+        interrupter.start()
+    current.timer = Timing.RoundTimer(round_number)
+    current.timer.start('total')
+    current.timer.set_label('namespace', c.namespace)
+    if current.cluster is not None:
+        current.timer.set_label('cluster', current.cluster)
+    profiler = start_profile(config)
+    error = None
+    try:
+        if pool is not None:
+            pooled_run(c, pool, config)
+        else:
+            run(c, config)
+    except Exception as ex:
+        error = str(ex) or type(ex).__name__
+        if c.interrupted.is_set():
+            error = "Round was interrupted after {:.0f} seconds: {}".format(timeout, error)
+            print_output(error, "ERROR")
+        raise
+    finally:
+        if interrupter is not None:
+            interrupter.cancel()
+        if profiler is not None:
+            record_profile(config, profiler, round_number)
+        record_api_requests(c)
+        report_round(config, error)
+
+def record_api_requests(c):
+    """Store the API requests of this round per verb, kind and status as
+    detail api_requests. Their latency and the time spent on them in the
+    client (cpu) and waiting for the API (wait) are recorded as api.*
+    phases, the p95 per verb and kind as api.<verb>.<kind>.p95. GETs
+    answered from the read cache or by a GET in flight aren't requests."""
+    requests_stats = c.request_stats.take()
+    throttled, throttle_wait = c.rate_limit.take()
+    cache_hits, coalesced = c.read_cache.take()
+    current.timer.set_value('api_cache_hits', cache_hits)
+    current.timer.set_value('api_coalesced', coalesced)
+    current.timer.set_value('api_throttled', throttled)
+    if throttled:
+        current.timer.add('api.throttle_wait', throttle_wait)
+        print_output("{} API requests waited {:.2f}s for the rate limit.".format(throttled, throttle_wait), "WARNING")
+    total = requests_stats.total()
+    if total.n == 0:
+        return
+    current.timer.set_detail('api_requests', requests_stats.as_list())
+    failed = {status: histogram.n for (status,), histogram in requests_stats.by('status').items()
+              if status == 'error' or status >= 400}
+    current.timer.set_value('api_requests', total.n)
+    current.timer.set_value('api_failed', sum(failed.values()))
+    for name, q in [('p50', 0.5), ('p95', 0.95)]:
+        current.timer.add('api.' + name, total.quantile(q))
+    current.timer.add('api.cpu', total.cpu)
+    current.timer.add('api.wait', total.seconds - total.cpu)
+    # Watches take as long as the server keeps them open, their latency
+    # says nothing.
+    per_kind = {key: histogram for key, histogram in requests_stats.by('verb', 'kind').items()
+                if key[0] != 'WATCH'}
+    for (verb, kind), histogram in per_kind.items():
+        current.timer.add('api.{}.{}.p95'.format(verb, kind), histogram.quantile(0.95))
+    print_output("API requests: {} ({} not successful{}), p50 {:.0f} ms, p95 {:.0f} ms, {:.0%} of their time in the client.".format(
+        total.n, sum(failed.values()),
+        ': ' + ', '.join('{}x {}'.format(n, status) for status, n in sorted(failed.items(), key=str)) if failed else '',
+        total.quantile(0.5) * 1000, total.quantile(0.95) * 1000, total.cpu / total.seconds if total.seconds else 0))
+    slowest = sorted(per_kind.items(), key=lambda item: item[1].quantile(0.95), reverse=True)[:3]
+    print_output("Slowest API requests: " + ", ".join("{} {} p95 {:.0f} ms ({}x)".format(
+        verb, kind, histogram.quantile(0.95) * 1000, histogram.n) for (verb, kind), histogram in slowest))
+
+def start_profile(config):
+    """Returns a started cProfile.Profile of this thread when enabled in the
+    profile section, else None."""
+    if not config.getboolean('profile', 'enabled', fallback=False):
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as ex:
+        # Only one profiler can be active in some Python versions.
+        print_output("Can't profile this round: {}".format(ex), "WARNING")
+        return None
+    return profiler
+
+def record_profile(config, profiler, round_number):
+    """Stop profiler, write its statistics to the directory of the profile
+    section and record the time the round thread spent waiting, in JSON
+    and in the rest of the client as profile.* phases."""
+    profiler.disable()
+    directory = config.get('profile', 'directory', fallback='profiles')
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, '{}round-{}.prof'.format(
+        current.cluster + '-' if current.cluster is not None else '', round_number))
+    profiler.dump_stats(path)
+    stats = pstats.Stats(profiler)
+    parts = Profiling.breakdown(stats)
+    for part, seconds in parts.items():
+        current.timer.add('profile.' + part, seconds)
+    print_output("Profile written to {}: {:.2f}s waiting, {:.2f}s JSON, {:.2f}s other client CPU.".format(
+        path, parts['wait'], parts['json'], parts['client']))
+    stats.sort_stats('tottime')
+    for key in stats.fcn_list[:config.getint('profile', 'top', fallback=10)]:
+        _, calls, own_time, cumulative, _ = stats.stats[key]
+        print_output("  {:8.3f}s own {:8.3f}s total {:7}x {} ({})".format(
+            own_time, cumulative, calls, pstats.func_std_string(key), Profiling.category(key)))
+
+def main():
+    config = read_config()
+    if Clusters.cluster_names(config):
+        sys.exit(0 if run_clusters(config) else 1)
+    c = create_connector(config)
+    try:
+        timed_run(c, config, 1)
+    finally:
+        print_connection_stats(c)
+        c.close()
+
+class Cluster:
+    """One cluster of a configuration with cluster sections. The connector
+    and namespace pool are created by its first round, so a cluster that
+    can't be reached doesn't stop the others."""
+
+    def __init__(self, name, config):
+        self.name = name
+        self.config = config
+        self.connector = None
+        self.pool = None
+        # Rounds of the cluster can start at the same time.
+        self.lock = threading.Lock()
+
+    def connect(self):
+        with self.lock:
+            if self.connector is None:
+                connector = create_connector(self.config)
+                if self.config.getint('namespace_pool', 'size', fallback=0) > 0:
+                    self.pool = create_namespace_pool(connector, self.config)
+                self.connector = connector
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+        if self.connector is not None:
+            self.connector.close()
+
+def create_clusters(config):
+    """Returns a ClusterRunner and a Cluster for every cluster section.
+    Rounds of one cluster that run at the same time each need a namespace
+    of the pool, they would remove each other's objects in one namespace."""
+    names = Clusters.cluster_names(config)
+    runner = Clusters.ClusterRunner(config.getint('clusters', 'workers', fallback=len(names)))
+    clusters = []
+    for name in names:
+        concurrency = config.getint(Clusters.PREFIX + name, 'concurrency', fallback=1)
+        cluster_config = Clusters.cluster_config(config, name)
+        pool_size = cluster_config.getint('namespace_pool', 'size', fallback=0)
+        if concurrency > 1 and pool_size < concurrency:
+            raise ValueError("Cluster {} has concurrency {}, that needs a namespace pool of at least "
+                             "that size (namespace_pool.size is {}).".format(name, concurrency, pool_size))
+        runner.add(name, concurrency)
+        clusters.append(Cluster(name, cluster_config))
+    return runner, clusters
+
+def run_cluster_round(cluster, number):
+    """Run round number of cluster in this thread. Failures are reported
+    and not raised, they only concern this cluster. Returns the RoundTimer
+    of the round, its output is in current.output."""
+    current.cluster = cluster.name
+    current.starttime = datetime.now()
+    current.output = []
+    current.timer = Timing.RoundTimer(number)
+    with print_lock:
+        print("===================== Starting run {} on {}".format(number, cluster.name))
+    try:
+        cluster.connect()
+    except Exception as ex:
+        error = str(ex) or type(ex).__name__
+        print_output("Connecting to the cluster failed: {}".format(error), "ERROR")
+        current.timer.set_label('cluster', cluster.name)
+        report_round(cluster.config, error)
+        return current.timer
+    try:
+        timed_run(cluster.connector, cluster.config, number, cluster.pool,
+                  cluster.config.getfloat('daemon', 'round_timeout', fallback=0))
+    except Exception:
+        print_output("Round {} failed: {}".format(number, current.timer.error), "ERROR")
+    finally:
+        print_connection_stats(cluster.connector)
+    return current.timer
+
+def run_clusters(config):
+    """Run one round on every cluster at the same time and print a summary.
+    Returns True when all rounds succeeded."""
+    runner, clusters = create_clusters(config)
+    try:
+        futures = {cluster.name: runner.submit(cluster.name, functools.partial(run_cluster_round, cluster), 1)
+                   for cluster in clusters}
+        timers = {name: future.result() for name, future in futures.items()}
+    finally:
+        runner.close()
+        for cluster in clusters:
+            cluster.close()
+    print_cluster_summary(timers)
+    return all(timer.success for timer in timers.values())
+
+def print_cluster_summary(timers):
+    """Print the result of the last round of every cluster."""
+    succeeded = [name for name, timer in timers.items() if timer.success]
+    print("{} of {} clusters succeeded.".format(len(succeeded), len(timers)))
+    for name, timer in timers.items():
+        phases = ", ".join("{} {:.1f}s".format(phase, timer.spans[phase])
+                           for phase in ['build', 'deploy', 'route'] if phase in timer.spans)
+        print("  {}: {} in {:.1f}s{}{}".format(name, 'OK' if timer.success else 'FAILED',
+            timer.spans.get('total', 0), ' (' + phases + ')' if phases else '',
+            '' if timer.success else ': ' + timer.error))
+
+def run(c, config):
+    """Execute one round of the health check with connector c."""
+    delete_namespace = config.getboolean('behaviour', 'delete_ns')
+    max_attempts = config.getint('behaviour', 'max_attempts_between_deletes')
+    workers = config.getint('behaviour', 'workers', fallback=6)
 
     # Check if namespace has to be deleted.
     if c.check_if_namespace_exists() == True:
@@ -66,16 +455,13 @@ def main():
             attempts_count = 1000
             attempts_error = True
         print_output("Attempts count: " + str(attempts_count))
+        current.timer.set_value('attempts', attempts_count)
         if attempts_count >= max_attempts and max_attempts != 0:
             # Delete namespace
             print_output("Removing namespace and waiting for it to be removed.")
-            c.delete_self_project()
-            checks = 0
-            while c.check_if_namespace_exists():
-                # Wait until namespace is deleted
-                time.sleep(1)
-                checks += 1
-                if checks > 300:
+            with current.timer.span('namespace_delete'):
+                c.delete_self_project()
+                if not c.wait_for_namespace_deleted(timeout=300):
                     raise_error("Deleting namespace failed.")
             time.sleep(5)
 
@@ -83,161 +469,757 @@ def main():
     print_output("Checking if namespace exists")
     if c.check_if_namespace_exists() == False:
         print_output("Creating namespace...")
-        c.create_namespace()
-        c.create_status_cm()
+        with current.timer.span('namespace_create'):
+            c.create_namespace()
+            c.create_status_cm()
     else:
         print_output("Namespace already exists")
-        print_output("Cleaning up!")
-        cleanup(c)
+        if config.getboolean('behaviour', 'reconcile', fallback=False):
+            print_output("Keeping the objects that didn't change.")
+        else:
+            print_output("Cleaning up!")
+            cleanup(c, workers)
         if attempts_error == True:
             c.set_status_attempts(1)
         else:
-            c.add_status_attempts()
+            c.set_status_attempts(attempts_count + 1)
+
+    deploy(c, config, config.get('connection', 'app_url'), delete_namespace)
+
+def deploy(c, config, app_url, delete_namespace):
+    """Create all objects in the clean namespace of connector c, build and
+    deploy the application and check it through the route on app_url.
+    Meanwhile the events of the namespace are collected, to get a startup
+    timeline of every pod."""
+    if not config.getboolean('events', 'collect', fallback=True):
+        deploy_app(c, config, app_url, delete_namespace)
+        return
+    collector = EventCollector.EventCollector(c)
+    collector.begin()
+    failed = True
+    try:
+        deploy_app(c, config, app_url, delete_namespace)
+        failed = False
+    finally:
+        collector.stop()
+        record_events(collector, failed)
+
+def record_events(collector, failed):
+    """Store the startup timeline of every pod with the round. The parts
+    of the start of the build and application pod are recorded as
+    events.<build|app>.<part> phases. Problems are printed when the round
+    failed."""
+    if collector.error is not None:
+        print_output("Collecting events failed: {}".format(collector.error), "WARNING")
+    pods = {}
+    recorded = set()
+    for pod in collector.pod_names():
+        pods[pod] = {'timeline': collector.timeline(pod),
+                     'problems': [{'at': at, 'reason': reason, 'message': message}
+                                  for at, _, reason, message in collector.problems_of(pod)]}
+        role = 'build' if pod.endswith('-build') else 'deployer' if pod.endswith('-deploy') else 'app'
+        # Only the first pod of a role, scale and churn tests start more.
+        if role != 'deployer' and role not in recorded:
+            recorded.add(role)
+            for part, seconds in collector.breakdown(pod).items():
+                current.timer.add('events.{}.{}'.format(role, part), seconds)
+        if failed:
+            for problem in pods[pod]['problems']:
+                print_output("Event for pod {} after {:.2f}s: {} {}".format(
+                    pod, problem['at'], problem['reason'], problem['message']), "WARNING")
+    current.timer.set_detail('pods', pods)
+
+def deploy_app(c, config, app_url, delete_namespace):
+    """The steps of deploy()."""
+    workers = config.getint('behaviour', 'workers', fallback=6)
 
-    # Create deployment secret with SSH key
     with open('health-check-deploy', 'rt') as f:
         ssh_key = f.read()
-    print_output("Creating secret...")
-    c.create_secret(ssh_key, 'deploy-key')
-    # We have to wait for a few seconds because it may not be created already.
-    time.sleep(5)
-    print_output("Linking secret to builder service account...")
-    c.link_secret('builder', 'deploy-key')
-
-    # Creating Imagestream
-    print_output("Creating ImageStream...")
-    c.create_imagestream('check-website-is', 'check-website')
-
-    # Creating BuildConfig
-    print_output("Creating BuildConfig...")
-    c.create_buildconfig(
-        name='check-website-bc',
-        app_name='check-website',
-        imagestreamtag='check-website-is:latest',
-        source_git='https://github.com/tomwis97/phpinfo-test',
-        source_context_dir='',
-        source_secret='deploy-key',
-        source_image='php:7.4-ubi8')
-
-    # Creating DeploymentConfig
-    print_output("Creating DeploymentConfig...")
-    c.create_deploymentconfig(
-        name='check-website-dc',
-        app_name='check-website',
-        image='check-website-is:latest',
-        tcp_port=8080)
+    node = pinned_node(c, config)
+    if node is not None:
+        current.timer.set_label('pinned_node', node)
+        print_output("Application pod will run on node {}".format(node))
 
-    # Creating service
-    print_output("Creating Service...")
-    c.create_service(
-        name='check-website-svc',
-        app_name='check-website',
-        tcp_port=8080,
-        selector_dc='check-website-dc')
+    # Use the image of an earlier round when the image cache has one that
+    # was built from the current sources.
+    image_cache = create_image_cache(c, config)
+    sources = cached_image = None
+    if image_cache is not None:
+        with current.timer.span('image_check'):
+            image_cache.ensure()
+            sources = image_cache.sources()
+            cached_image, reason = image_cache.check(sources)
+            if cached_image is not None:
+                image_cache.allow(c.namespace)
+        current.timer.set_label('image', 'cached' if cached_image is not None else 'built')
+        print_output("{}: {}.".format("Using the cached image" if cached_image is not None else "Building the image", reason))
 
-    # Initiating build and wait for completion
-    print_output("Starting build...")
-    c.start_build('check-website-bc')
-    loops = 0
-    time.sleep(1)
-    notified = False
-    while True:
-        # Wait until build pod is done.
-        # Assumes this is the first build.
-        time.sleep(1)
-        loops += 1
-        if loops > 180:
-            raise_error("Build took too long!")
-        pods = c.get_pods()
-        if 'check-website-bc-1-build' not in pods:
-            continue
-        if 'check-website-bc-1-build' in pods and notified == False:
-            notified = True
-            print_output("Build running on node {}".format(pods['check-website-bc-1-build']['node']))
-        if pods['check-website-bc-1-build']['status'] == "Succeeded":
-            break
-        if 'Error' in pods['check-website-bc-1-build']['status']:
-            raise_error("Error while building image.")
-
-    # Creating route
-    print_output("Creating Route...")
-    c.create_route(
-        app_name='check-website',
-        name='check-website-route',
-        svc_name='check-website-svc',
-        target_port='8080-tcp',
-        host=config.get('connection', 'app_url'))
+    image, image_namespace = 'check-website-is:latest', None
+    if cached_image is not None:
+        image, image_namespace = cached_image, image_cache.c.namespace
+    objects = desired_objects(c, ssh_key, app_url, image, image_namespace, node, cached_image is None)
+    reconcile = config.getboolean('behaviour', 'reconcile', fallback=False)
+    if reconcile:
+        reconcile_objects(c, config, objects)
+    else:
+        # Create all objects. Independent objects are created in parallel,
+        # the secret is linked as soon as the builder service account exists.
+        print_output("Creating {}...".format(', '.join(objects[step]['kind'] for step in objects if step != 'route')))
+        graph = TaskGraph.TaskGraph(max_workers=workers)
+        graph.add('serviceaccount', wait_for_builder, c)
+        for step, manifest in objects.items():
+            if step != 'route':
+                graph.add(step, c.create_object, manifest)
+        if 'secret' in objects:
+            graph.add('link_secret', c.link_secret, 'builder', 'deploy-key',
+                      depends_on=['secret', 'serviceaccount'])
+        run_graph(graph, "Creating objects", 'create_objects')
+
+    if cached_image is None:
+        build(c, config)
+        if image_cache is not None:
+            with current.timer.span('image_publish'):
+                published = image_cache.publish(c.namespace, 'check-website-is:latest', sources)
+            print_output("Stored image {} in namespace {} for the next rounds.".format(
+                published, image_cache.c.namespace))
+
+    if not reconcile:
+        print_output("Creating Route...")
+        c.create_object(objects['route'])
 
     # Deploy image and wait for completion
     print_output("Starting deployment...")
     c.start_deployment('check-website-dc')
+    current.timer.start('deploy')
+    current.timer.start('deploy_pod_found')
 
-    loops = 0
-    app_pod = None
-    while True:
-        # Wait until the application is deployed
-        time.sleep(1)
-        loops += 1
-        for pod in c.get_pods():
+    def find_app_pod(pods):
+        for pod in pods:
             if ("check-website-dc" in pod and not pod.endswith('deploy')):
-                app_pod = pod
-                print_output("Application pod found with name: {}, running on node {}".format(
-                    app_pod, c.get_pods()[app_pod]['node']))
-                break
-        if app_pod != None:
-            break
-        if loops > 40:
-            # We're now waiting for a little more than 40 seconds.
-            raise_error("Can't find application pod!")
-        
+                return pod, pods[pod]
+        return None
+    found = c.wait_for_pods(find_app_pod, timeout=40,
+                            label_selector='deploymentconfig=check-website-dc')
+    if found is None:
+        raise_error("Can't find application pod!")
+    app_pod = found[0]
+    current.timer.stop('deploy_pod_found')
+    current.timer.set_label('app_node', found[1].node)
+    print_output("Application pod found with name: {}, running on node {}".format(
+        app_pod, found[1].node))
+
     # Do a request if application is running.
     print_output("Waiting for deployment to complete.")
-    loops = 0
-    while True:
-        # Wait until pod is running.
+    def app_pod_started(pods):
         # Assumes this is the first deployment.
-        pods = c.get_pods()
-        if pods[app_pod]['status'] == "Running":
-            break
-        if 'Error' in pods['check-website-bc-1-build']['status']:
-            raise_error("Error while building image.")
-        if loops > 180:
-            raise_error("Build took too long!")
-        time.sleep(1)
-    time.sleep(2) # Let the router pod update its config with the new pod.
-
-    # Do a request if application is running.
-    attempts = 0
-    while attempts < 3:
-        attempts += 1
-        r = requests.get('http://' + config.get('connection', 'app_url'))
-        if r.status_code == 200:
-            print_output("Status code 200 received. Everything is working correctly!")
-            if delete_namespace == True:
-                print_output("Delete own project.")
-                c.delete_self_project()
-            break
-        else:
-            print_output("Wrong status code received: {}, attempts: {}".format(r.status_code, attempts), "WARNING")
-            time.sleep(3)
-    else:
-        raise_error("Webpage request failed after 3 tries!")
+        if app_pod in pods and pods[app_pod].status in ["Running", "Failed"]:
+            return pods[app_pod].status
+        return None
+    app_status = c.wait_for_pods(app_pod_started, timeout=180,
+                                 field_selector='metadata.name=' + app_pod)
+    if app_status is None:
+        raise_error("Deployment took too long!")
+    if app_status != "Running":
+        raise_error("Application pod failed to start.")
+    current.timer.stop('deploy')
+    # The in-cluster probe is started next to the route probe, so its API
+    # calls don't delay the first request to the route.
+    starting = in_background(start_in_cluster_probe, c, config, app_pod, app_url, image, image_namespace)
+    try:
+        check_route(config, app_url)
+    finally:
+        probe = starting.result()
+        if probe is not None:
+            record_in_cluster_probe(probe)
+    generate_load(config, app_url)
+    scale_test(c, config, app_url)
+    churn(c, config, app_url, image, image_namespace)
+    pull_spread(c, config, image, image_namespace)
+    print_output("Everything is working correctly!")
+    if delete_namespace == True:
+        print_output("Delete own project.")
+        c.delete_self_project()
 
-    if (datetime.now() - starttime).seconds > 300:
+    if (datetime.now() - current.starttime).seconds > 300:
         # Everything is working, but it takes longer than it should.
         # If this error occures frequently, raise the value above.
         raise_error("This run was succesful, but took way longer than it should!")
 
-def cleanup(connector):
-    connector.delete_deploymentconfig('check-website-dc')
-    connector.delete_imagestream('check-website-is')
-    connector.delete_buildconfig('check-website-bc')
-    connector.delete_secret('deploy-key')
-    connector.delete_service('check-website-svc')
-    connector.delete_route('check-website-route')
-    connector.unlink_secret('builder', 'deploy-key')
+def check_route(config, app_url):
+    """Request the route until it answers with status 200 and check that
+    it keeps answering, as configured in the route_probe section."""
+    current.timer.start('route')
+
+    # Hit the route from the moment the pod is running, so we measure how
+    # long it takes before the router and the SDN send traffic to it.
+    print_output("Probing route...")
+    prober = RouteProber.RouteProber(app_url,
+        interval=config.getfloat('route_probe', 'interval', fallback=0.2),
+        timeout=config.getfloat('route_probe', 'timeout', fallback=2))
+    time_to_200 = prober.wait_for_200(config.getfloat('route_probe', 'max_wait', fallback=60))
+    summary = prober.summary()
+    for name, value in summary.items():
+        if name.startswith('first_200_'):
+            current.timer.add('route.' + name, value)
+        else:
+            current.timer.set_value('route_' + name, value)
+    if time_to_200 is None:
+        raise_error("Webpage request failed! No status code 200 after {} attempts ({} times 503, {} times connection refused).".format(
+            summary['attempts_before_200'], summary['503_before_200'], summary['refused_before_200']))
+    current.timer.stop('route')
+    print_output("Status code 200 received after {:.2f}s and {} failed attempts ({} times 503, {} times connection refused).".format(
+        time_to_200, summary['attempts_before_200'], summary['503_before_200'], summary['refused_before_200']))
+
+    stability_window = config.getfloat('route_probe', 'stability_window', fallback=10)
+    if stability_window > 0:
+        stability = prober.check_stability(stability_window)
+        current.timer.set_value('route_stability', stability)
+        if stability < 1:
+            print_output("Only {:.0%} of the requests in the {}s after the first status 200 succeeded.".format(
+                stability, stability_window), "WARNING")
+
+def start_in_cluster_probe(c, config, app_pod, app_url, image, image_namespace=None):
+    """Start the in-cluster probe of the in_cluster_probe section, which
+    requests app_pod, the Service and the route from inside the cluster.
+    Returns the InClusterProbe, or None when it is disabled or couldn't be
+    started."""
+    if not config.getboolean('in_cluster_probe', 'enabled', fallback=False):
+        return None
+    try:
+        pod_ip = c.get_pods(field_selector='metadata.name=' + app_pod)[app_pod].ip
+        service_ip = c.get_service('check-website-svc')['spec']['clusterIP']
+        targets = {
+            'pod': 'http://{}:8080/'.format('[{}]'.format(pod_ip) if ':' in pod_ip else pod_ip),
+            'service': 'http://{}:8080/'.format('[{}]'.format(service_ip) if ':' in service_ip else service_ip),
+            'route': 'http://{}'.format(app_url)}
+        probe = InClusterProbe.InClusterProbe(c, image, targets, image_namespace,
+            samples=config.getint('in_cluster_probe', 'samples', fallback=30),
+            interval=config.getfloat('in_cluster_probe', 'interval', fallback=1),
+            timeout=config.getfloat('in_cluster_probe', 'timeout', fallback=2),
+            start_timeout=config.getfloat('in_cluster_probe', 'start_timeout', fallback=120))
+        probe.begin()
+    except (requests.exceptions.RequestException, KeyError, TypeError) as ex:
+        print_output("Starting the in-cluster probe failed: {}".format(ex), "WARNING")
+        return None
+    print_output("Started the in-cluster probe of the pod IP, Service and route.")
+    return probe
+
+def record_in_cluster_probe(probe):
+    """Wait for the samples of probe and record them: the times of every
+    sample next to each other as detail in_cluster_probe, per target the
+    p50, p95 and time until its first status 200 as incluster.<target>.*
+    phases and the samples without status 200 as incluster_<target>_failed.
+    Prints which hop failed first."""
+    try:
+        samples = probe.wait()
+    except (requests.exceptions.RequestException, RuntimeError) as ex:
+        print_output("In-cluster probe failed: {}".format(ex), "WARNING")
+        return
+    finally:
+        probe.delete()
+    summary = InClusterProbe.summarize(samples)
+    current.timer.set_detail('in_cluster_probe', InClusterProbe.curves(samples))
+    for target, result in summary.items():
+        for name in ['p50', 'p95', 'first_ok']:
+            if result[name] is not None:
+                current.timer.add('incluster.{}.{}'.format(target, name), result[name])
+        current.timer.set_value('incluster_{}_failed'.format(target), result['n'] - result['ok'])
+    print_output("In-cluster probe: " + ", ".join("{} {}/{} OK, p50 {}".format(
+        target, result['ok'], result['n'],
+        '{:.1f} ms'.format(result['p50'] * 1000) if result['p50'] is not None else '-')
+        for target, result in summary.items()))
+    pod, service, route = (summary[target]['p50'] for target in InClusterProbe.TARGETS)
+    if None not in (pod, service, route):
+        print_output("Latency p50 per hop: pod {:.1f} ms, Service (OVN load balancer) +{:.1f} ms, router +{:.1f} ms.".format(
+            pod * 1000, (service - pod) * 1000, (route - service) * 1000))
+    failing = InClusterProbe.blame(summary)
+    if failing is not None:
+        print_output("From inside the cluster the {} is the first hop that didn't always answer.".format(
+            {'pod': 'pod IP', 'service': 'Service', 'route': 'route'}[failing]), "WARNING")
+
+def desired_objects(c, ssh_key, app_url, image, image_namespace=None, node=None, build=True):
+    """Manifests of the objects of a round by step name (see OBJECTS).
+    Without build only the DeploymentConfig, Service and Route."""
+    objects = {}
+    if build:
+        objects['secret'] = Manifests.secret(ssh_key, 'deploy-key')
+        objects['imagestream'] = Manifests.imagestream('check-website-is', 'check-website')
+        objects['buildconfig'] = Manifests.buildconfig(
+            name='check-website-bc',
+            app_name='check-website',
+            imagestreamtag='check-website-is:latest',
+            source_git=SOURCE_GIT,
+            source_context_dir='',
+            source_secret='deploy-key',
+            source_image=BASE_IMAGE)
+    objects['deploymentconfig'] = Manifests.deploymentconfig(c.namespace,
+        name='check-website-dc',
+        app_name='check-website',
+        image=image,
+        tcp_port=8080,
+        node=node,
+        image_namespace=image_namespace)
+    objects['service'] = Manifests.service(
+        name='check-website-svc',
+        app_name='check-website',
+        tcp_port=8080,
+        selector_dc='check-website-dc')
+    objects['route'] = Manifests.route(
+        app_name='check-website',
+        name='check-website-route',
+        svc_name='check-website-svc',
+        target_port='8080-tcp',
+        host=app_url)
+    return objects
+
+def reconcile_objects(c, config, objects):
+    """Bring the objects of a reused namespace to objects, the desired
+    manifests by step name, creating, patching and deleting only what
+    differs. The secret is unlinked from the builder when it isn't
+    desired. Records the number of objects per action as
+    reconcile_<action> values.
+
+    The DeploymentConfig is always recreated. Every round has to start a
+    new pod anyway, and after a patch the rolling deployment would keep
+    the pod of the previous round answering the route until the new one
+    is ready, so the route check would measure the old pod."""
+    reconciler = Reconciler.Reconciler(c, config.getfloat('behaviour', 'delete_timeout', fallback=120))
+    for step, kind, name in OBJECTS:
+        reconciler.manage(step, kind, name)
+    for step, manifest in objects.items():
+        reconciler.add(step, manifest, recreate=step == 'deploymentconfig')
+    graph = reconciler.graph(config.getint('behaviour', 'workers', fallback=6))
+    graph.add('serviceaccount', wait_for_builder, c)
+    if 'secret' in objects:
+        graph.add('link_secret', c.link_secret, 'builder', 'deploy-key',
+                  depends_on=['secret', 'serviceaccount'])
+    else:
+        graph.add('unlink_secret', c.unlink_secret, 'builder', 'deploy-key',
+                  depends_on=['secret', 'serviceaccount'])
+    print_output("Reconciling objects...")
+    run_graph(graph, "Reconciling objects", 'reconcile')
+    counts = reconciler.counts()
+    for action, count in counts.items():
+        current.timer.set_value('reconcile_' + action, count)
+    print_output("Objects: " + ", ".join("{} {}".format(reconciler.actions[step], step)
+                                         for step, _, _ in OBJECTS if step in reconciler.actions))
+
+def build(c, config):
+    """Build the application image in the namespace of connector c and
+    wait until the build succeeded."""
+    print_output("Starting build...")
+    build_name = c.start_build('check-website-bc')
+    log_reader = None
+    if config.getboolean('build', 'follow_log', fallback=True):
+        log_reader = BuildLog.BuildLogReader(c, build_name)
+        log_reader.begin()
+    current.timer.start('build')
+    current.timer.start('build_scheduled')
+    build_pod = build_name + '-build'
+    notified = False
+    def build_finished(pods):
+        nonlocal notified
+        if build_pod not in pods:
+            return None
+        if notified == False:
+            notified = True
+            current.timer.stop('build_scheduled')
+            current.timer.set_label('build_node', pods[build_pod].node)
+            print_output("Build running on node {}".format(pods[build_pod].node))
+        if pods[build_pod].status in ["Succeeded", "Failed"] or 'Error' in pods[build_pod].status:
+            return pods[build_pod].status
+        return None
+    build_status = c.wait_for_pods(build_finished, timeout=180,
+                                   field_selector='metadata.name=' + build_pod)
+    current.timer.stop('build')
+    record_build(c, build_name, log_reader, build_status == "Succeeded")
+    if build_status is None:
+        raise_error("Build took too long!")
+    if build_status != "Succeeded":
+        raise_error("Error while building image.")
+
+def generate_load(config, app_url):
+    """Put load on the route as configured in the load section. The
+    results are recorded as values load_<mode>_<name>."""
+    duration = config.getfloat('load', 'duration', fallback=0)
+    if duration <= 0:
+        return
+    modes = config.get('load', 'mode', fallback='keepalive')
+    modes = ['keepalive', 'new'] if modes == 'both' else [modes]
+    for mode in modes:
+        print_output("Generating load on the route for {}s with {} connection(s) ({})...".format(
+            duration, config.getint('load', 'concurrency', fallback=10),
+            'keep-alive' if mode == 'keepalive' else 'new connection per request'))
+        generator = LoadGenerator.LoadGenerator(app_url,
+            concurrency=config.getint('load', 'concurrency', fallback=10),
+            duration=duration,
+            keepalive=mode == 'keepalive',
+            timeout=config.getfloat('load', 'timeout', fallback=5))
+        with current.timer.span('load_' + mode):
+            result = generator.run()
+        for name, value in result.items():
+            if value is not None:
+                current.timer.set_value('load_{}_{}'.format(mode, name), value)
+        print_output("{requests} requests over {connections} connection(s), {throughput:.1f} req/s, "
+                     "{errors} errors ({resets} resets, {timeouts} timeouts), {non_200} times not 200, "
+                     "{stale} idle connection(s) reopened.".format(**result))
+        if result['p50'] is not None:
+            print_output("Latency p50 {:.1f} ms, p95 {:.1f} ms, p99 {:.1f} ms, max {:.1f} ms.".format(
+                *[result[key] * 1000 for key in ['p50', 'p95', 'p99', 'max']]))
+        if result['errors'] or result['non_200']:
+            print_output("Not all requests under load succeeded.", "WARNING")
+
+def scale_test(c, config, app_url):
+    """Scale the application to the replicas in the scale section and
+    record how long it took until all pods were scheduled, Running, in
+    the endpoints and reachable through the route."""
+    replicas = config.getint('scale', 'replicas', fallback=0)
+    if replicas <= 1:
+        return
+    print_output("Scaling check-website-dc to {} replicas...".format(replicas))
+    test = ScaleTest.ScaleTest(c, 'check-website-dc', 'check-website-svc', app_url,
+        timeout=config.getfloat('scale', 'timeout', fallback=180),
+        probe_interval=config.getfloat('scale', 'probe_interval', fallback=0.05))
+    with current.timer.span('scale'):
+        steps = test.run(replicas, config.getint('scale', 'step', fallback=0))
+    for result in steps:
+        for key in ['scheduled', 'running', 'endpoints', 'route_balanced']:
+            if result[key] is not None:
+                current.timer.add('scale.{}.{}'.format(result['replicas'], key), result[key])
+        print_output("{replicas} replicas ({new_pods} new): all scheduled after {0}, Running after {1}, "
+                     "in endpoints after {2}, route balanced over all replicas after {3}.".format(
+            *['{:.2f}s'.format(result[key]) if result[key] is not None else 'timeout'
+              for key in ['scheduled', 'running', 'endpoints', 'route_balanced']], **result))
+    for node, stats in sorted(test.per_node().items()):
+        print_output("Node {}: {} pod(s), median Running after {}, in endpoints after {}.".format(node, stats['pods'],
+            *['{:.2f}s'.format(stats[key]) if stats[key] is not None else '-' for key in ['running', 'endpoint']]))
+    current.timer.set_value('scale_max_pods_per_node', max(stats['pods'] for stats in test.per_node().values()))
+    if any(result[key] is None for result in steps for key in ['running', 'endpoints', 'route_balanced']):
+        raise_error("Scaling to {} replicas didn't complete within the timeout.".format(replicas))
+
+def churn(c, config, app_url, image, image_namespace=None):
+    """Create and delete Services, Routes and DeploymentConfigs running
+    image as configured in the churn section. The results are recorded as
+    churn values and phases."""
+    duration = config.getfloat('churn', 'duration', fallback=0)
+    if duration <= 0:
+        return
+    kinds = [kind.strip() for kind in config.get('churn', 'kinds', fallback='service,route').split(',')]
+    engine = ChurnEngine.ChurnEngine(c,
+        lambda name: namespace_app_url(app_url, '{}-{}'.format(c.namespace, name)),
+        'check-website-dc',
+        'check-website',
+        rate=config.getfloat('churn', 'rate', fallback=10),
+        concurrency=config.getint('churn', 'concurrency', fallback=5),
+        names=config.getint('churn', 'names', fallback=20),
+        kinds=kinds,
+        image=image,
+        image_namespace=image_namespace,
+        reach_timeout=config.getfloat('churn', 'reach_timeout', fallback=30))
+    print_output("Churning {} for {}s at {} calls/s...".format(', '.join(kinds), duration,
+                                                            config.getfloat('churn', 'rate', fallback=10)))
+    with current.timer.span('churn'):
+        result = engine.run(duration)
+    if result['errors']:
+        engine.clean()
+    for name in ['cycles', 'calls', 'calls_per_second', 'errors', 'unreachable', 'reach_wait_share']:
+        current.timer.set_value('churn_' + name, result[name])
+    print_output("{cycles} cycles, {calls} API calls ({calls_per_second:.1f}/s of {rate}/s), {errors} failed, "
+                 "{share:.0f}% of the time the cycles waited for their route.".format(
+                     rate=config.getfloat('churn', 'rate', fallback=10), share=result['reach_wait_share'] * 100, **result))
+    for verb, stats in result['verbs'].items():
+        for p in ['p50', 'p95', 'p99']:
+            current.timer.add('churn.{}.{}'.format(verb, p), stats[p])
+        print_output("{}: {} calls, {} failed, p50 {:.0f} ms, p95 {:.0f} ms, p99 {:.0f} ms.".format(
+            verb, stats['n'], stats['errors'], stats['p50'] * 1000, stats['p95'] * 1000, stats['p99'] * 1000))
+    if result['reachable']['n']:
+        for p in ['p50', 'p95', 'p99']:
+            current.timer.add('churn.reachable.' + p, result['reachable'][p])
+        print_output("New services reachable through their route after p50 {p50:.2f}s, p95 {p95:.2f}s, p99 {p99:.2f}s, "
+                     "{0} not within the timeout.".format(result['unreachable'], **result['reachable']))
+    if result['unreachable']:
+        print_output("{} new service(s) weren't reachable within {}s.".format(
+            result['unreachable'], config.getfloat('churn', 'reach_timeout', fallback=30)), "WARNING")
+
+def pull_spread(c, config, image, image_namespace=None):
+    """Start a pod running image on every node as configured in the
+    pull_spread section. The pull and start times are recorded as pull.*
+    phases, the result per node as detail pull_spread."""
+    if not config.getboolean('pull_spread', 'enabled', fallback=False):
+        return
+    nodes = node_names(c, config)
+    concurrency = config.getint('pull_spread', 'concurrency', fallback=5)
+    print_output("Starting a pod on each of {} nodes, {} at a time...".format(len(nodes), concurrency))
+    spread = PullSpread.PullSpread(c, image, nodes, image_namespace,
+        concurrency=concurrency,
+        timeout=config.getfloat('pull_spread', 'timeout', fallback=300))
+    with current.timer.span('pull_spread'):
+        results = spread.run()
+    summary = PullSpread.summarize(results, config.getfloat('pull_spread', 'slow_factor', fallback=2))
+    current.timer.set_detail('pull_spread', results)
+    for name in ['nodes', 'failed', 'cached', 'throughput']:
+        if summary[name] is not None:
+            current.timer.set_value('pull_' + name, summary[name])
+    phases = {'pull.p50': 'pull_p50', 'pull.max': 'pull_max',
+              'pull.running.p50': 'running_p50', 'pull.running.max': 'running_max'}
+    for phase, name in phases.items():
+        if summary[name] is not None:
+            current.timer.add(phase, summary[name])
+    print_output("Pods Running on {} of {} nodes ({} had the image already), pull p50 {}, max {}, Running p50 {}, max {}.".format(
+        summary['nodes'] - summary['failed'], summary['nodes'], summary['cached'],
+        *['{:.2f}s'.format(summary[key]) if summary[key] is not None else '-'
+          for key in ['pull_p50', 'pull_max', 'running_p50', 'running_max']]))
+    if summary['throughput'] is not None:
+        print_output("Registry throughput {:.1f} MB/s over all nodes, p50 {:.1f} MB/s per node.".format(
+            summary['throughput'] / 1e6, summary['node_throughput_p50'] / 1e6))
+    for node, seconds in summary['slow']:
+        print_output("Node {} pulled the image in {:.2f}s, the median is {:.2f}s.".format(
+            node, seconds, summary['pull_p50']), "WARNING")
+    for node, result in sorted(results.items()):
+        if result['status'] != 'Running':
+            print_output("No Running pod on node {} ({}): {}".format(node, result['status'],
+                result['error'] or '; '.join(result['problems']) or 'no events'), "WARNING")
+    if summary['failed']:
+        raise_error("The image couldn't be started on {} of {} nodes.".format(summary['failed'], summary['nodes']))
+
+def record_build(c, build_name, log_reader, succeeded):
+    """Record the stages of the build as build.stage.<stage>[.<step>] phases
+    and the parts seen in the build log as build.log.<part> phases. Prints
+    the end of the log when the build didn't succeed."""
+    try:
+        stages = BuildLog.stage_durations(c.get_build(build_name))
+    except requests.exceptions.RequestException as ex:
+        print_output("Getting the build stages failed: {}".format(ex), "WARNING")
+        stages = {}
+    for name, seconds in stages.items():
+        current.timer.add('build.stage.' + name, seconds)
+    if log_reader is None:
+        return
+    if not log_reader.join(10 if succeeded else 1):
+        print_output("Build log didn't end after the build.", "WARNING")
+    for name, seconds in log_reader.parts().items():
+        current.timer.add('build.log.' + name, seconds)
+    current.timer.set_value('build_log_lines', log_reader.lines)
+    if log_reader.error is not None:
+        print_output("Following the build log failed: {}".format(log_reader.error), "WARNING")
+    if stages or log_reader.parts():
+        print_output("Build stages: {}; from the log: {}".format(
+            ", ".join("{} {:.1f}s".format(name, seconds) for name, seconds in stages.items() if '.' not in name) or '-',
+            ", ".join("{} {:.1f}s".format(name, seconds) for name, seconds in log_reader.parts().items()) or '-'))
+    if not succeeded:
+        for line in log_reader.last_lines:
+            print_output("Build log: " + line, "ERROR")
+
+def create_image_cache(c, config):
+    """Returns the ImageCache configured in the image_cache section, or
+    None when it is disabled."""
+    if not config.getboolean('image_cache', 'enabled', fallback=False):
+        return None
+    namespace = config.get('image_cache', 'namespace',
+                           fallback=config.get('connection', 'namespace') + '-images')
+    return ImageCache.ImageCache(c.for_namespace(namespace), SOURCE_GIT, BASE_IMAGE,
+        rebuild_every=config.getfloat('image_cache', 'rebuild_every', fallback=86400),
+        reuse_when_unknown=config.getboolean('image_cache', 'reuse_when_unknown', fallback=False))
+
+def wait_for_builder(connector):
+    """Wait until the builder service account exists in a new namespace."""
+    if not connector.wait_for_serviceaccount('builder', timeout=60):
+        raise_error("Builder service account was not created.")
+
+def run_graph(graph, phase, span):
+    """Run a TaskGraph and print how long the phase and its steps took.
+    The durations are recorded as span and span.<step>."""
+    with current.timer.span(span):
+        results = graph.run()
+    for name, duration in graph.durations.items():
+        current.timer.add(span + '.' + name, duration)
+    print_output("{} took {:.2f}s ({})".format(phase, current.timer.spans[span],
+        ", ".join("{} {:.2f}s".format(name, duration) for name, duration in graph.durations.items())))
+    return results
+
+# Kind (see ApiConnector.COLLECTIONS) and name of the objects that
+# cleanup_graph deletes, by task name.
+ROUND_OBJECTS = {
+    'deploymentconfig': ('DeploymentConfig', 'check-website-dc'),
+    'imagestream': ('ImageStream', 'check-website-is'),
+    'buildconfig': ('BuildConfig', 'check-website-bc'),
+    'secret': ('Secret', 'deploy-key'),
+    'service': ('Service', 'check-website-svc'),
+    'route': ('Route', 'check-website-route'),
+    'job': ('Job', 'check-probe')}
+
+def cleanup_graph(connector, workers=6, wait=0):
+    """TaskGraph that deletes all objects of a previous run in parallel.
+    With wait it also waits up to wait seconds until every object is gone,
+    the task wait_<object> raises when it isn't."""
+    graph = TaskGraph.TaskGraph(max_workers=workers)
+    graph.add('deploymentconfig', connector.delete_deploymentconfig, 'check-website-dc')
+    graph.add('imagestream', connector.delete_imagestream, 'check-website-is')
+    graph.add('buildconfig', connector.delete_buildconfig, 'check-website-bc')
+    graph.add('secret', connector.delete_secret, 'deploy-key')
+    graph.add('service', connector.delete_service, 'check-website-svc')
+    graph.add('route', connector.delete_route, 'check-website-route')
+    graph.add('job', connector.delete_job, 'check-probe')
+    graph.add('unlink_secret', connector.unlink_secret, 'builder', 'deploy-key')
+    if wait:
+        for task, (kind, name) in ROUND_OBJECTS.items():
+            graph.add('wait_' + task, wait_for_deleted, connector, kind, name, wait, depends_on=[task])
+    return graph
+
+def wait_for_deleted(connector, kind, name, timeout):
+    """Wait until object name of kind is gone, raise when it isn't after
+    timeout seconds."""
+    if not connector.wait_for_deleted(kind, name, timeout):
+        raise RuntimeError("{} {} in namespace {} wasn't deleted within {} seconds.".format(
+            kind, name, connector.namespace, timeout))
+
+def cleanup(connector, workers=6):
+    """Delete all objects of a previous run in parallel."""
+    run_graph(cleanup_graph(connector, workers), "Cleaning up", 'cleanup')
+
+def namespace_app_url(app_url, namespace):
+    """Route host for namespace: the first label of app_url replaced with
+    the namespace. Namespaces can't share a route host."""
+    return namespace + '.' + app_url.split('.', 1)[1]
+
+def create_namespace_pool(c, config):
+    """Create the pool of namespaces configured in the namespace_pool section."""
+    workers = config.getint('behaviour', 'workers', fallback=6)
+    namespaces = ['{}-pool-{}'.format(c.namespace, i)
+                  for i in range(1, config.getint('namespace_pool', 'size') + 1)]
+    if config.getboolean('behaviour', 'reconcile', fallback=False):
+        # The round reconciles the objects it finds.
+        clean = lambda connector: None
+    else:
+        # A namespace only becomes ready once the objects are gone, so the
+        # round that leases it doesn't find the objects of the previous one.
+        clean_timeout = config.getfloat('namespace_pool', 'clean_timeout', fallback=120)
+        clean = lambda connector: cleanup_graph(connector, workers, clean_timeout).run()
+    return NamespacePool.NamespacePool(c, namespaces,
+        config.getint('behaviour', 'max_attempts_between_deletes'),
+        clean,
+        workers=config.getint('namespace_pool', 'workers', fallback=2))
+
+def pooled_run(c, pool, config):
+    """Run one round with connector c in a namespace leased from pool."""
+    with current.timer.span('namespace_lease'):
+        leased = pool.lease(config.getfloat('namespace_pool', 'lease_timeout', fallback=600))
+    if leased is None:
+        ready, errors = pool.status()
+        raise_error("No namespace of the pool became ready. Errors: {}".format(errors))
+    # Through c, so interrupting the round interrupts the requests in the namespace too.
+    leased = c.for_namespace(leased.namespace)
+    current.timer.set_label('namespace', leased.namespace)
+    print_output("Leased namespace {}".format(leased.namespace))
+    try:
+        deploy(leased, config, namespace_app_url(config.get('connection', 'app_url'), leased.namespace), False)
+    finally:
+        pool.release(leased)
+
+def daemon(config, interval=None, schedule=None):
+    """Keep running rounds with one connector (per cluster), so connections
+    (and the login) are reused between rounds."""
+    current.starttime = datetime.now()
+    if schedule is None and interval is None:
+        schedule = config.get('daemon', 'schedule', fallback='')
+        interval = config.getfloat('daemon', 'interval', fallback=0)
+    if schedule:
+        schedule = Scheduler.CronSchedule(schedule)
+    elif interval:
+        schedule = Scheduler.IntervalSchedule(interval)
+    else:
+        schedule = Scheduler.PauseSchedule(config.getfloat('daemon', 'pause', fallback=20))
+    global metrics_server
+    notifier = Notifier.create_notifier(config)
+    if config.getint('metrics', 'port', fallback=0):
+        metrics_server = Timing.MetricsServer(config.getint('metrics', 'port'))
+    slow_round_alert = config.getfloat('daemon', 'slow_round_alert', fallback=900)
+    round_timeout = config.getfloat('daemon', 'round_timeout', fallback=0)
+    if Clusters.cluster_names(config):
+        cluster_daemon(config, schedule, slow_round_alert, notifier)
+        return
+    c = create_connector(config)
+    pool = None
+    if config.getint('namespace_pool', 'size', fallback=0) > 0:
+        pool = create_namespace_pool(c, config)
+    # Output of the running round, on_failure may be called from another thread.
+    outputs = {}
+
+    def run_round(number):
+        current.starttime = datetime.now()
+        current.output = []
+        outputs.clear()
+        outputs[number] = current.output
+        print("===================== Starting run {}".format(number))
+        try:
+            timed_run(c, config, number, pool, round_timeout)
+        finally:
+            print_connection_stats(c)
+
+    def round_failed(number, text):
+        print_output("Round {} failed.".format(number), level="ERROR")
+        notify(notifier, "Health-check-script ERROR.", "\n".join(outputs.get(number, []) + [text]))
+
+    try:
+        Scheduler.Daemon(schedule, run_round, slow_round_alert, round_failed).run()
+    finally:
+        if pool is not None:
+            pool.close()
+        c.close()
+
+def notify(notifier, subject, text):
+    """Report a failure with notifier. A notifier that fails, like the mail
+    command, is printed instead of stopping the daemon."""
+    try:
+        notifier.notify(subject, text)
+    except Exception as ex:
+        print_output("Notifying failed: {}".format(ex), level="ERROR")
+
+def cluster_daemon(config, schedule, slow_round_alert, notifier):
+    """Start a round on every cluster according to schedule. The rounds of
+    the clusters run at the same time and independent of each other: a
+    round is skipped when its cluster still runs its concurrency limit of
+    rounds, and reported when one of them runs longer than slow_round_alert."""
+    runner, clusters = create_clusters(config)
+
+    def cluster_round(cluster, number):
+        timer = run_cluster_round(cluster, number)
+        if not timer.success:
+            # The output of this round, other rounds of the cluster may run meanwhile.
+            notify(notifier, "Health-check-script ERROR on {}.".format(cluster.name), "\n".join(current.output))
+
+    def run_round(number):
+        for cluster in clusters:
+            if runner.submit(cluster.name, functools.partial(cluster_round, cluster), number) is not None:
+                continue
+            running = runner.running_for(cluster.name) or 0
+            with print_lock:
+                print("Skipping run {} on {}, a round is running for {:.0f}s.".format(number, cluster.name, running))
+            if running > slow_round_alert:
+                notify(notifier, "Health-check-script ERROR on {}.".format(cluster.name),
+                       "Round is still running after {:.0f} seconds.".format(running))
+
+    def round_failed(number, text):
+        notify(notifier, "Health-check-script ERROR.", text)
+
+    try:
+        Scheduler.Daemon(schedule, run_round, slow_round_alert, round_failed).run()
+    finally:
+        runner.close()
+        for cluster in clusters:
+            cluster.close()
 
 if __name__ == "__main__":
-    global starttime
-    starttime = datetime.now()
-    main()
+    current.starttime = datetime.now()
+    parser = argparse.ArgumentParser(description="OpenShift health check.")
+    parser.add_argument('--daemon', action='store_true',
+                        help="Keep running rounds instead of running one round.")
+    parser.add_argument('--interval', type=float,
+                        help="Seconds between the start of two rounds in daemon mode, instead of a pause after every round.")
+    parser.add_argument('--schedule',
+                        help="Cron expression for the rounds in daemon mode.")
+    args = parser.parse_args()
+    if args.daemon:
+        daemon(read_config(), args.interval, args.schedule)
+    else:
+        main()
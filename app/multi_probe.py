@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import sys
+import time
+from datetime import datetime
+import aiohttp
+import AsyncApiConnector
+import main
+
+# Runs N independent health checks concurrently in one process. Probe i
+# uses namespace <namespace>-i and route host <namespace>-i.<domain of app_url>.
+
+def print_output(namespace, text, level="INFO"):
+    """Function for logging information. Adds timestamp and namespace."""
+    timestamp = datetime.now().strftime('%H:%M.%S')
+    print("[{time}] {level} - {namespace} - {text}".format(
+        time=timestamp, level=level, namespace=namespace, text=text))
+
+async def run_pipeline(c, app_url, ssh_key):
+    """Full create, build, deploy, route and delete cycle in the namespace
+    of connector c. Returns a dict with the result of the pipeline. The
+    namespace is deleted afterwards, also when the pipeline failed."""
+    result = {'namespace': c.namespace, 'success': False, 'error': None,
+              'build_node': None, 'app_node': None, 'duration': None}
+    start = time.monotonic()
+    created = False
+    try:
+        if await c.check_if_namespace_exists():
+            print_output(c.namespace, "Removing old namespace and waiting for it to be removed.")
+            await c.delete_self_project()
+            if not await c.wait_for_namespace_deleted(timeout=300):
+                raise RuntimeError("Deleting namespace failed.")
+            await asyncio.sleep(5)
+
+        print_output(c.namespace, "Creating namespace...")
+        await c.create_namespace()
+        created = True
+        await c.create_status_cm()
+        await c.create_secret(ssh_key, 'deploy-key')
+        if not await c.wait_for_serviceaccount('builder', timeout=60):
+            raise RuntimeError("Builder service account was not created.")
+        await c.link_secret('builder', 'deploy-key')
+
+        print_output(c.namespace, "Creating ImageStream, BuildConfig, DeploymentConfig and Service...")
+        await asyncio.gather(
+            c.create_imagestream('check-website-is', 'check-website'),
+            c.create_buildconfig(
+                name='check-website-bc',
+                app_name='check-website',
+                imagestreamtag='check-website-is:latest',
+                source_git='https://github.com/tomwis97/phpinfo-test',
+                source_context_dir='',
+                source_secret='deploy-key',
+                source_image='php:7.4-ubi8'),
+            c.create_deploymentconfig(
+                name='check-website-dc',
+                app_name='check-website',
+                image='check-website-is:latest',
+                tcp_port=8080),
+            c.create_service(
+                name='check-website-svc',
+                app_name='check-website',
+                tcp_port=8080,
+                selector_dc='check-website-dc'))
+
+        print_output(c.namespace, "Starting build...")
+        await c.start_build('check-website-bc')
+        build_pod = 'check-website-bc-1-build'
+        def build_finished(pods):
+            if build_pod in pods:
+                result['build_node'] = pods[build_pod].node
+                if pods[build_pod].status in ["Succeeded", "Failed"]:
+                    return pods[build_pod].status
+            return None
+        build_status = await c.wait_for_pods(build_finished, timeout=180,
+                                             field_selector='metadata.name=' + build_pod)
+        if build_status is None:
+            raise RuntimeError("Build took too long!")
+        if build_status != "Succeeded":
+            raise RuntimeError("Error while building image.")
+
+        print_output(c.namespace, "Creating Route and starting deployment...")
+        await c.create_route(
+            app_name='check-website',
+            name='check-website-route',
+            svc_name='check-website-svc',
+            target_port='8080-tcp',
+            host=app_url)
+        await c.start_deployment('check-website-dc')
+
+        def app_pod_started(pods):
+            for pod in pods:
+                if "check-website-dc" in pod and not pod.endswith('deploy'):
+                    result['app_node'] = pods[pod].node
+                    if pods[pod].status in ["Running", "Failed"]:
+                        return pods[pod].status
+            return None
+        app_status = await c.wait_for_pods(app_pod_started, timeout=220,
+                                           label_selector='deploymentconfig=check-website-dc')
+        if app_status is None:
+            raise RuntimeError("Deployment took too long!")
+        if app_status != "Running":
+            raise RuntimeError("Application pod failed to start.")
+        await asyncio.sleep(2) # Let the router pod update its config with the new pod.
+
+        for attempt in range(1, 4):
+            async with c.session.get('http://' + app_url) as r:
+                status = r.status
+            if status == 200:
+                break
+            print_output(c.namespace, "Wrong status code received: {}, attempts: {}".format(status, attempt), "WARNING")
+            await asyncio.sleep(3)
+        else:
+            raise RuntimeError("Webpage request failed after 3 tries!")
+
+        print_output(c.namespace, "Status code 200 received.")
+        result['success'] = True
+    except (RuntimeError, aiohttp.ClientError, asyncio.TimeoutError) as ex:
+        result['error'] = str(ex) or type(ex).__name__
+        print_output(c.namespace, result['error'], "ERROR")
+    except Exception as ex:
+        # Like an unexpected answer of the API, only fails this pipeline.
+        result['error'] = "{}: {}".format(type(ex).__name__, ex)
+        print_output(c.namespace, result['error'], "ERROR")
+    finally:
+        if created:
+            print_output(c.namespace, "Deleting project.")
+            try:
+                await c.delete_self_project()
+            except Exception as ex:
+                print_output(c.namespace, "Deleting project failed: {}".format(ex), "WARNING")
+    result['duration'] = time.monotonic() - start
+    return result
+
+async def run_probes(config, probes, concurrency):
+    """Run probes pipelines with at most concurrency at the same time.
+    Returns a list with the result of every pipeline."""
+    with open('health-check-deploy', 'rt') as f:
+        ssh_key = f.read()
+    api_url = config.get('connection', 'api_url')
+    namespace = config.get('connection', 'namespace')
+    async with AsyncApiConnector.create_session(
+            pool_size=config.getint('connection', 'pool_size', fallback=10),
+            keepalive=config.getboolean('connection', 'keepalive', fallback=True),
+            connect_timeout=config.getfloat('connection', 'connect_timeout', fallback=5),
+            read_timeout=config.getfloat('connection', 'read_timeout', fallback=30)) as session:
+        # One token for all pipelines, renewed by whichever notices it expired.
+        if config.has_option('authentication', 'token'):
+            auth = AsyncApiConnector.Authentication(session, api_url, token=config.get('authentication', 'token'))
+        else:
+            auth = AsyncApiConnector.Authentication(session, api_url,
+                username=config.get('authentication', 'username'),
+                password=config.get('authentication', 'password'),
+                token_cache=main.create_token_cache(config))
+        semaphore = asyncio.Semaphore(concurrency)
+        async def limited(index):
+            probe_namespace = '{}-{}'.format(namespace, index)
+            c = AsyncApiConnector.AsyncApiConnector(api_url, probe_namespace, auth, session)
+            async with semaphore:
+                return await run_pipeline(c, main.namespace_app_url(config.get('connection', 'app_url'), probe_namespace), ssh_key)
+        return await asyncio.gather(*[limited(i) for i in range(1, probes + 1)])
+
+def print_summary(results):
+    """Print the aggregated results of all pipelines."""
+    succeeded = [r for r in results if r['success']]
+    print("{} of {} probes succeeded.".format(len(succeeded), len(results)))
+    for r in results:
+        print("  {namespace}: {state} in {duration:.1f}s (build node {build_node}, app node {app_node}){reason}".format(
+            state='OK' if r['success'] else 'FAILED',
+            reason='' if r['success'] else ': ' + r['error'], **r))
+    if succeeded:
+        durations = sorted(r['duration'] for r in succeeded)
+        print("Duration min/median/max: {:.1f}s / {:.1f}s / {:.1f}s".format(
+            durations[0], durations[len(durations) // 2], durations[-1]))
+
+if __name__ == "__main__":
+    config = main.read_config()
+    parser = argparse.ArgumentParser(description="Run several health checks concurrently.")
+    parser.add_argument('--probes', type=int,
+                        default=config.getint('multi_probe', 'probes', fallback=1),
+                        help="Number of namespaces to check.")
+    parser.add_argument('--concurrency', type=int,
+                        default=config.getint('multi_probe', 'concurrency', fallback=10),
+                        help="Maximum number of probes running at the same time.")
+    args = parser.parse_args()
+    results = asyncio.run(run_probes(config, args.probes, args.concurrency))
+    print_summary(results)
+    if not all(r['success'] for r in results):
+        sys.exit(1)
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+import argparse
+import collections
+import configparser
+import json
+import math
+import re
+import statistics
+import sys
+import time
+from datetime import datetime
+import NodeStats
+import RunStore
+
+# Percentiles of the phase durations in the run store, compared with a
+# baseline window before it. Exits with status 1 when a phase got slower.
+
+DURATION = re.compile(r'^(\d+(?:\.\d+)?)([smhdw]?)$')
+UNITS = {'': 1, 's': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+def parse_duration(text):
+    """Seconds in a duration like 90, 30m, 6h or 7d."""
+    match = DURATION.match(text.strip())
+    if match is None:
+        raise argparse.ArgumentTypeError("Invalid duration: " + text)
+    return float(match.group(1)) * UNITS[match.group(2)]
+
+def percentile(samples, p):
+    """p-th percentile (0-100) of samples, interpolating between the two
+    closest ranks. None for no samples."""
+    if not samples:
+        return None
+    samples = sorted(samples)
+    rank = (len(samples) - 1) * p / 100
+    low = math.floor(rank)
+    high = min(low + 1, len(samples) - 1)
+    return samples[low] + (samples[high] - samples[low]) * (rank - low)
+
+def mann_whitney_greater(samples, baseline):
+    """One sided Mann-Whitney U test with the normal approximation.
+    Returns the p-value of the hypothesis that samples tend to be larger
+    than baseline."""
+    ranked = sorted([(value, 0) for value in samples] + [(value, 1) for value in baseline])
+    ranks = [0.0] * len(ranked)
+    ties = 0.0
+    i = 0
+    while i < len(ranked):
+        j = i
+        while j + 1 < len(ranked) and ranked[j + 1][0] == ranked[i][0]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[k] = (i + j) / 2 + 1
+        ties += (j - i + 1) ** 3 - (j - i + 1)
+        i = j + 1
+    n1, n2 = len(samples), len(baseline)
+    n = n1 + n2
+    u = sum(rank for rank, (_, group) in zip(ranks, ranked) if group == 0) - n1 * (n1 + 1) / 2
+    variance = n1 * n2 / 12 * ((n + 1) - ties / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+    z = (u - n1 * n2 / 2 - 0.5) / math.sqrt(variance)
+    return 1 - statistics.NormalDist().cdf(z)
+
+def compare(samples, baseline, alpha=0.01, min_change=0.1, min_samples=5):
+    """Compare the durations of one phase. Returns a dict with the
+    percentiles of both windows, the p-value and whether it's a
+    regression: significantly slower and p50 or p95 grew more than
+    min_change (0.1 is 10%)."""
+    result = {'n': len(samples), 'baseline_n': len(baseline)}
+    for p in [50, 95, 99]:
+        result['p{}'.format(p)] = percentile(samples, p)
+        result['baseline_p{}'.format(p)] = percentile(baseline, p)
+    result['p_value'] = None
+    result['regression'] = False
+    if len(samples) >= min_samples and len(baseline) >= min_samples:
+        result['p_value'] = mann_whitney_greater(samples, baseline)
+        grew = any(result['p' + p] > result['baseline_p' + p] * (1 + min_change)
+                   for p in ['50', '95'])
+        result['regression'] = result['p_value'] < alpha and grew
+    return result
+
+def report(store, window, baseline, now, phases=None, alpha=0.01, min_change=0.1, cluster=None):
+    """Compare the last window seconds with the baseline seconds before it,
+    of the rounds of cluster when given. Returns a dict of phase name to
+    the result of compare()."""
+    current = store.phase_samples(now - window, now, cluster=cluster)
+    previous = store.phase_samples(now - window - baseline, now - window, cluster=cluster)
+    if phases is None:
+        phases = list(current)
+    return {phase: compare(current.get(phase, []), previous.get(phase, []), alpha, min_change)
+            for phase in phases}
+
+def print_report(store, window, baseline, now, results, cluster=None):
+    rounds = store.rounds(now - window, now, cluster)
+    failed = sum(1 for r in rounds if not r['success'])
+    print("Window {} - {}: {} rounds, {} failed. Baseline: the {:.0f}h before.".format(
+        datetime.fromtimestamp(now - window).strftime('%Y-%m-%d %H:%M'),
+        datetime.fromtimestamp(now).strftime('%Y-%m-%d %H:%M'),
+        len(rounds), failed, baseline / 3600))
+    clusters = collections.Counter()
+    failed_per_cluster = collections.Counter()
+    for r in rounds:
+        name = json.loads(r['labels'] or '{}').get('cluster')
+        if name is not None:
+            clusters[name] += 1
+            failed_per_cluster[name] += not r['success']
+    if clusters:
+        print("Clusters: " + ", ".join("{} {} rounds, {} failed".format(name, count, failed_per_cluster[name])
+                                       for name, count in sorted(clusters.items())))
+    print("{:36} {:>5} {:>8} {:>8} {:>8}   {:>8} {:>8} {:>8}".format(
+        'phase', 'n', 'p50', 'p95', 'p99', 'base p50', 'base p95', 'p-value'))
+    def seconds(value):
+        return '-' if value is None else '{:.2f}'.format(value)
+    for phase, r in results.items():
+        print("{:36} {:>5} {:>8} {:>8} {:>8}   {:>8} {:>8} {:>8}{}".format(
+            phase, r['n'], seconds(r['p50']), seconds(r['p95']), seconds(r['p99']),
+            seconds(r['baseline_p50']), seconds(r['baseline_p95']),
+            '-' if r['p_value'] is None else '{:.4f}'.format(r['p_value']),
+            '  REGRESSION' if r['regression'] else ''))
+
+def print_trend(store, window, count, now, phases, cluster=None):
+    """Percentiles of phases in each of the last count windows."""
+    for phase in phases:
+        print("\n" + phase)
+        for i in range(count, 0, -1):
+            since = now - i * window
+            samples = store.phase_samples(since, since + window, cluster=cluster).get(phase, [])
+            print("  {}  n={:<5} p50={:<8} p95={:<8} p99={}".format(
+                datetime.fromtimestamp(since).strftime('%Y-%m-%d %H:%M'), len(samples),
+                *['-' if v is None else '{:.2f}'.format(v)
+                  for v in [percentile(samples, p) for p in [50, 95, 99]]]))
+
+def print_nodes(store, count, window, cluster=None):
+    """Statistics per node over the last count rounds, with the slow nodes."""
+    stats = NodeStats.NodeStats(window)
+    stats.load(store, count, cluster)
+    outliers = {(phase, node) for phase, node, _, _ in stats.outliers()}
+    for phase, nodes in stats.summary().items():
+        print("\n{} per node".format(phase))
+        for node, s in nodes.items():
+            print("  {:40} n={:<5} median={:<8.2f} max={:<8.2f}{}".format(
+                node, s['n'], s['median'], s['max'], '  SLOW' if (phase, node) in outliers else ''))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report on the rounds in the run store.")
+    parser.add_argument('--database', help="SQLite file, defaults to database in the metrics section of config.ini.")
+    parser.add_argument('--window', type=parse_duration, default=parse_duration('1d'),
+                        help="Window to report on, for example 6h or 1d.")
+    parser.add_argument('--baseline', type=parse_duration, default=parse_duration('7d'),
+                        help="Length of the baseline window just before the window.")
+    parser.add_argument('--phase', action='append', help="Only report this phase. Can be repeated.")
+    parser.add_argument('--alpha', type=float, default=0.01, help="Significance level.")
+    parser.add_argument('--min-change', type=float, default=0.1,
+                        help="Minimal growth of p50 or p95 to count as regression.")
+    parser.add_argument('--trend', type=int, default=0,
+                        help="Also show the percentiles of the last N windows.")
+    parser.add_argument('--nodes', type=int, default=0,
+                        help="Also show statistics per node over the last N rounds.")
+    parser.add_argument('--cluster', help="Only report on the rounds of this cluster.")
+    args = parser.parse_args()
+
+    database = args.database
+    if database is None:
+        config = configparser.ConfigParser()
+        config.read('config.ini')
+        database = config.get('metrics', 'database', fallback='')
+    if not database:
+        sys.exit("No database configured.")
+    store = RunStore.RunStore(database)
+    now = time.time()
+    results = report(store, args.window, args.baseline, now, args.phase, args.alpha, args.min_change,
+                     args.cluster)
+    print_report(store, args.window, args.baseline, now, results, args.cluster)
+    if args.trend:
+        print_trend(store, args.window, args.trend, now, args.phase or list(results), args.cluster)
+    if args.nodes:
+        print_nodes(store, args.nodes, args.nodes, args.cluster)
+    if any(r['regression'] for r in results.values()):
+        sys.exit(1)
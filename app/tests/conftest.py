@@ -0,0 +1,33 @@
+import os
+import shutil
+import sys
+import pytest
+
+# The modules of the script import each other by name, like when main.py
+# is run from the app directory.
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+import ApiConnector
+import FakeApiServer
+
+@pytest.fixture
+def fake():
+    """A FakeApiServer with short timings."""
+    server = FakeApiServer.FakeApiServer()
+    yield server
+    server.close()
+
+@pytest.fixture
+def connector(fake):
+    c = ApiConnector.ApiConnector(fake.url, 'health-check', token='fake')
+    yield c
+    c.close()
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run in an empty directory with the deploy key, so a round doesn't
+    write its metrics or history next to the script."""
+    shutil.copy(os.path.join(APP_DIR, 'health-check-deploy'), tmp_path)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,165 @@
+import threading
+import time
+import pytest
+import requests
+import ApiConnector
+import FakeApiServer
+
+def test_pod_info(fake, connector):
+    connector.create_namespace()
+    connector.create_deploymentconfig(name='check-website-dc', app_name='check-website',
+                                      image='check-website-is:latest', tcp_port=8080, replicas=2)
+    connector.start_deployment('check-website-dc')
+    assert connector.wait_for_pods(
+        lambda pods: sum(pod.status == 'Running' for pod in pods.values()) >= 2, timeout=10)
+    for projection in ['full', 'table']:
+        pods = connector.get_pods(label_selector='deploymentconfig=check-website-dc', projection=projection)
+        assert len(pods) == 2
+        for name, pod in pods.items():
+            assert isinstance(pod, ApiConnector.PodInfo)
+            assert pod.name == name
+            assert pod.status == 'Running'
+            assert pod.node in fake.nodes
+            assert pod.ip is not None
+        # The table shows Completed, which is the Succeeded phase.
+        assert connector.get_pods(projection=projection)['check-website-dc-1-deploy'].status == 'Succeeded'
+    pods = connector.get_pods(label_selector='deploymentconfig=check-website-dc', projection='metadata')
+    assert len(pods) == 2
+    assert all(pod.status is None and pod.node is None and pod.ip is None for pod in pods.values())
+
+def test_wait_for_namespace_deleted_without_watch():
+    # Not allowed to watch or list namespaces: falls back to polling.
+    fake = FakeApiServer.FakeApiServer(forbidden=[r'^/api/v1/namespaces$'])
+    try:
+        c = ApiConnector.ApiConnector(fake.url, 'health-check', token='fake')
+        c.create_namespace()
+        assert c.check_if_namespace_exists()
+        c.delete_self_project()
+        assert c.wait_for_namespace_deleted(timeout=10) is True
+        assert not c.check_if_namespace_exists()
+        assert fake.request_counts[('GET', 'namespaces')] >= 1
+    finally:
+        fake.close()
+
+def test_login_again_on_401(fake):
+    c = ApiConnector.ApiConnector(fake.url, 'health-check', username='user', password='secret')
+    assert fake.logins == 1
+    c.create_namespace()
+    fake.revoke_tokens()
+    # The revoked token is answered with 401, the request is done again
+    # with a new token.
+    assert c.check_if_namespace_exists()
+    assert fake.logins == 2
+    assert c.token == 'sha256~fake-2'
+    assert c.check_if_namespace_exists()
+    assert fake.logins == 2
+
+def test_link_secret_retries_on_conflict(fake, connector):
+    connector.create_namespace()
+    assert connector.wait_for_serviceaccount('builder', timeout=10)
+    conflicts = []
+    def change_builder(response, *args, **kwargs):
+        # The service account controller changes the service account
+        # between our GET and PUT, once.
+        if response.request.method == 'GET' and response.url.endswith('/serviceaccounts/builder') and not conflicts:
+            with fake.lock:
+                builder = fake.get('health-check', 'serviceaccounts', 'builder')
+                builder['secrets'].append({'name': 'builder-token-abcde'})
+                fake.store('health-check', 'serviceaccounts', builder, 'MODIFIED')
+            conflicts.append(response)
+    connector.session.hooks['response'].append(change_builder)
+    connector.link_secret('builder', 'deploy-key')
+    assert conflicts
+    assert fake.request_counts[('PUT', 'serviceaccounts')] == 2
+    with fake.lock:
+        secrets = [secret['name'] for secret in fake.get('health-check', 'serviceaccounts', 'builder')['secrets']]
+    assert 'builder-token-abcde' in secrets
+    assert 'deploy-key' in secrets
+
+def test_unlink_secret(fake, connector):
+    connector.create_namespace()
+    assert connector.wait_for_serviceaccount('builder', timeout=10)
+    connector.link_secret('builder', 'deploy-key')
+    connector.unlink_secret('builder', 'deploy-key')
+    with fake.lock:
+        secrets = [secret['name'] for secret in fake.get('health-check', 'serviceaccounts', 'builder')['secrets']]
+    assert 'deploy-key' not in secrets
+    assert secrets
+    # Nothing to do when it isn't linked.
+    connector.unlink_secret('builder', 'deploy-key')
+    assert fake.request_counts[('PUT', 'serviceaccounts')] == 2
+
+def test_create_namespace_retries_on_conflict(monkeypatch):
+    monkeypatch.setattr(ApiConnector.time, 'sleep', lambda seconds: None)
+    fake = FakeApiServer.FakeApiServer(project_conflicts=2)
+    try:
+        c = ApiConnector.ApiConnector(fake.url, 'health-check', token='fake')
+        assert c.create_namespace().status_code == 201
+        assert c.check_if_namespace_exists()
+        assert fake.request_counts[('POST', 'projectrequests')] == 3
+    finally:
+        fake.close()
+
+def test_create_namespace_gives_up(monkeypatch):
+    monkeypatch.setattr(ApiConnector.time, 'sleep', lambda seconds: None)
+    fake = FakeApiServer.FakeApiServer(project_conflicts=5)
+    try:
+        c = ApiConnector.ApiConnector(fake.url, 'health-check', token='fake')
+        with pytest.raises(RuntimeError):
+            c.create_namespace()
+    finally:
+        fake.close()
+
+def test_create_namespace_other_error():
+    fake = FakeApiServer.FakeApiServer(forbidden=['projectrequests'])
+    try:
+        c = ApiConnector.ApiConnector(fake.url, 'health-check', token='fake')
+        with pytest.raises(requests.exceptions.HTTPError):
+            c.create_namespace()
+        assert fake.request_counts[('POST', 'projectrequests')] == 1
+    finally:
+        fake.close()
+
+def test_status_configmap(fake, connector):
+    connector.create_namespace()
+    connector.create_status_cm()
+    assert connector.get_status_attempts() == 1
+    connector.add_status_attempts()
+    connector.add_status_attempts()
+    assert connector.get_status_attempts() == 3
+    connector.delete_status_cm()
+    with fake.lock:
+        assert 'health-check-status' not in fake.namespaces['health-check']['resources']['configmaps']
+
+def test_wait_for_pods_watch(fake, connector):
+    connector.create_namespace()
+    connector.create_deploymentconfig(name='check-website-dc', app_name='check-website',
+                                      image='check-website-is:latest', tcp_port=8080)
+    connector.start_deployment('check-website-dc')
+    seen = []
+    def running(pods):
+        seen.append(pods)
+        return any(pod.status == 'Running' for pod in pods.values())
+    assert connector.wait_for_pods(running, timeout=10, label_selector='deploymentconfig=check-website-dc')
+    assert [pod.status for pod in seen[-1].values()] == ['Running']
+    # The condition is checked on every change of the pods, not every second.
+    assert len(seen) >= 2
+    # The condition isn't met within the timeout.
+    start = time.monotonic()
+    assert not connector.wait_for_pods(lambda pods: len(pods) > 5, timeout=0.5)
+    assert time.monotonic() - start < 2
+
+def test_interrupt(fake, connector):
+    connector.create_namespace()
+    c = connector.interruptible()
+    other = c.for_namespace('other')
+    started = time.monotonic()
+    threading.Timer(0.3, c.interrupt).start()
+    # The watch that is being read ends at once, not after its timeout.
+    with pytest.raises(requests.exceptions.RequestException):
+        c.wait_for_pods(lambda pods: len(pods) > 5, timeout=10)
+    assert time.monotonic() - started < 3
+    with pytest.raises(ApiConnector.Interrupted):
+        other.check_if_namespace_exists()
+    # The connector it came from still works.
+    assert connector.check_if_namespace_exists()
@@ -0,0 +1,51 @@
+import itertools
+import BuildLog
+import FakeApiServer
+
+def test_markers(monkeypatch):
+    # Line i arrives i seconds after the start.
+    clock = itertools.count()
+    monkeypatch.setattr(BuildLog.time, 'monotonic', lambda: next(clock))
+    reader = BuildLog.BuildLogReader(None, 'check-website-bc-1', keep_lines=3)
+    reader.start = next(clock)
+    for line in FakeApiServer.BUILD_LOG:
+        reader.feed(line.format(namespace='health-check'))
+    # Only the first line of every marker counts: Trying to pull, not
+    # Getting image source signatures.
+    assert reader.marks == {'clone': 1, 'cloned': 2, 'pull': 4, 'build': 6, 'assemble': 7,
+                            'commit': 10, 'push': 11, 'pushed': 12}
+    assert reader.parts() == {'clone': 1, 'pull': 2, 'assemble': 3, 'commit': 1, 'push': 1}
+    assert reader.lines == len(FakeApiServer.BUILD_LOG)
+    assert list(reader.last_lines)[-1] == 'Push successful'
+    assert len(reader.last_lines) == 3
+
+def test_missing_markers():
+    reader = BuildLog.BuildLogReader(None, 'check-website-bc-1')
+    reader.start = 0
+    reader.feed('Cloning "https://github.com/tomwis97/phpinfo-test" ...')
+    reader.feed('error: build error: failed to pull image')
+    assert reader.parts() == {}
+
+def test_follow(fake, connector):
+    connector.create_namespace()
+    connector.create_imagestream(name='check-website-is', app_name='check-website')
+    connector.create_buildconfig(name='check-website-bc', app_name='check-website',
+                                 imagestreamtag='check-website-is:latest',
+                                 source_git='https://github.com/tomwis97/phpinfo-test',
+                                 source_context_dir='', source_secret='deploy-key',
+                                 source_image='php:7.4-ubi8')
+    build = connector.start_build('check-website-bc')
+    reader = BuildLog.BuildLogReader(connector, build, timeout=10)
+    reader.begin()
+    assert reader.join(10)
+    assert reader.error is None
+    assert set(reader.parts()) == {'clone', 'pull', 'assemble', 'commit', 'push'}
+
+def test_stage_durations():
+    build = {'status': {'stages': [
+        {'name': 'FetchInputs', 'durationMilliseconds': 1500,
+         'steps': [{'name': 'FetchGitSource', 'durationMilliseconds': 1400}]},
+        {'name': 'PushImage'}]}}
+    assert BuildLog.stage_durations(build) == {
+        'FetchInputs': 1.5, 'FetchInputs.FetchGitSource': 1.4, 'PushImage': 0}
+    assert BuildLog.stage_durations({'status': {}}) == {}
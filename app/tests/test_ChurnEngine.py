@@ -0,0 +1,39 @@
+import time
+import ChurnEngine
+
+def test_churn(fake, connector):
+    connector.create_namespace()
+    # The pods the Services select.
+    connector.create_deploymentconfig(name='check-website-dc', app_name='check-website',
+                                      image='check-website-is:latest', tcp_port=8080)
+    connector.start_deployment('check-website-dc')
+    assert connector.wait_for_pods(lambda pods: any(pod.status == 'Running' for pod in pods.values()),
+                                   timeout=10, label_selector='deploymentconfig=check-website-dc')
+    engine = ChurnEngine.ChurnEngine(connector, lambda name: '127.0.0.1:{}'.format(fake.port),
+                                     'check-website-dc', 'check-website', rate=50, concurrency=2, names=4,
+                                     probe_interval=0.02)
+    result = engine.run(1)
+    assert result['cycles'] > 0
+    assert result['errors'] == 0
+    assert result['reachable']['n'] > 0
+    assert result['calls_per_second'] > 0
+    assert 0 <= result['reach_wait_share'] <= 1
+    assert set(result['verbs']) >= {'create_service', 'create_route', 'delete_route', 'delete_service'}
+    # Every cycle deleted its objects.
+    with fake.lock:
+        assert not fake.namespaces['health-check']['resources']['routes']
+
+def test_churn_ends_after_duration(fake, connector):
+    connector.create_namespace()
+    # The route hosts never answer: the waits are cut off at the end.
+    engine = ChurnEngine.ChurnEngine(connector, lambda name: '{}.invalid:{}'.format(name, fake.port),
+                                     'check-website-dc', 'check-website', rate=50, concurrency=2, names=4,
+                                     reach_timeout=30, probe_interval=0.02)
+    start = time.monotonic()
+    result = engine.run(1)
+    assert time.monotonic() - start < 2
+    assert result['reach_cut'] == 2
+    assert result['reachable']['n'] == 0
+    assert result['reach_wait_share'] > 0.5
+    with fake.lock:
+        assert not fake.namespaces['health-check']['resources']['routes']
@@ -0,0 +1,82 @@
+import contextlib
+import io
+import socket
+import threading
+import pytest
+import benchmark
+import Clusters
+import main
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def clusters_config(fake, clusters):
+    config = benchmark.benchmark_config(fake.url, fake.port)
+    config.read_dict({Clusters.PREFIX + name: options for name, options in clusters.items()})
+    return config
+
+def test_cluster_config(fake):
+    config = clusters_config(fake, {
+        'prod': {'api_url': 'https://api.prod:6443', 'nodes.pin': 'cycle', 'token_cache': '/tmp/prod',
+                 'concurrency': '2'},
+        'test': {'api_url': 'https://api.test:6443', 'username': 'admin', 'password': 'secret'}})
+    assert Clusters.cluster_names(config) == ['prod', 'test']
+    prod = Clusters.cluster_config(config, 'prod')
+    assert prod.get('connection', 'api_url') == 'https://api.prod:6443'
+    assert prod.get('connection', 'namespace') == 'health-check'
+    assert prod.get('nodes', 'pin') == 'cycle'
+    assert prod.get('authentication', 'token_cache') == '/tmp/prod'
+    # Without credentials of its own the cluster uses those of [authentication].
+    assert prod.get('authentication', 'token') == 'fake'
+    assert not prod.has_option('connection', 'concurrency')
+    assert not any(section.startswith(Clusters.PREFIX) for section in prod.sections())
+    test = Clusters.cluster_config(config, 'test')
+    assert test.get('authentication', 'username') == 'admin'
+    assert not test.has_option('authentication', 'token')
+    # The base configuration isn't changed.
+    assert config.get('connection', 'api_url') == fake.url
+
+def test_concurrency_needs_pool(fake):
+    config = clusters_config(fake, {'prod': {'concurrency': '2', 'namespace_pool.size': '1'}})
+    with pytest.raises(ValueError):
+        main.create_clusters(config)
+    config = clusters_config(fake, {'prod': {'concurrency': '2', 'namespace_pool.size': '2'}})
+    runner, clusters = main.create_clusters(config)
+    runner.close()
+    assert [cluster.name for cluster in clusters] == ['prod']
+    assert runner.limits['prod'] == 2
+
+def test_runner_limit():
+    runner = Clusters.ClusterRunner(4)
+    runner.add('a', limit=1)
+    runner.add('b', limit=2)
+    release = threading.Event()
+    try:
+        assert runner.running_for('a') is None
+        first = runner.submit('a', lambda number: release.wait(5) and number, 1)
+        assert first is not None
+        # The round of a still runs, so the next one is skipped.
+        assert runner.submit('a', lambda number: number, 2) is None
+        assert runner.running_for('a') >= 0
+        assert runner.submit('b', lambda number: release.wait(5) and number, 1) is not None
+        assert runner.submit('b', lambda number: number, 2).result(5) == 2
+        release.set()
+        assert first.result(5) == 1
+        assert runner.running_for('a') is None
+        assert runner.submit('a', lambda number: number, 3).result(5) == 3
+    finally:
+        release.set()
+        runner.close()
+
+def test_run_clusters_failing_cluster(fake, workdir):
+    config = clusters_config(fake, {
+        'good': {},
+        'bad': {'api_url': 'http://127.0.0.1:{}'.format(free_port())}})
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        assert main.run_clusters(config) is False
+    assert "1 of 2 clusters succeeded." in output.getvalue()
+    assert "  good: OK" in output.getvalue()
+    assert "  bad: FAILED" in output.getvalue()
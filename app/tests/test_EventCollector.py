@@ -0,0 +1,44 @@
+import time
+import ApiConnector
+import EventCollector
+
+def test_timeline(fake, connector):
+    connector.create_namespace()
+    collector = EventCollector.EventCollector(connector, poll=30)
+    collector.begin()
+    connector.create_deploymentconfig(name='check-website-dc', app_name='check-website',
+                                      image='check-website-is:latest', tcp_port=8080)
+    connector.start_deployment('check-website-dc')
+    assert connector.wait_for_pods(lambda pods: any(pod.status == 'Running' for pod in pods.values()),
+                                   timeout=10, label_selector='deploymentconfig=check-website-dc')
+    time.sleep(0.2)
+    start = time.monotonic()
+    collector.stop()
+    # The watch is closed, stop() doesn't wait for the poll of 30 seconds.
+    assert time.monotonic() - start < 1
+    assert not collector.thread.is_alive()
+    assert collector.error is None
+    pod = next(name for name in collector.pod_names() if not name.endswith('-deploy'))
+    timeline = collector.timeline(pod)
+    assert list(timeline) == [step for step, _ in EventCollector.STEPS]
+    assert list(timeline.values()) == sorted(timeline.values())
+    assert set(collector.breakdown(pod)) == {'network', 'pull', 'create', 'start', 'total'}
+
+def test_stop_before_watch(connector):
+    connector.create_namespace()
+    collector = EventCollector.EventCollector(connector, poll=30)
+    collector.begin()
+    collector.stop()
+    assert not collector.thread.is_alive()
+    assert collector.error is None
+
+def test_resource_version_not_cached(fake):
+    # Even with a read cache, an old resourceVersion would replay events.
+    c = ApiConnector.ApiConnector(fake.url, 'health-check', token='fake', cache_ttl=60)
+    c.create_namespace()
+    first = c.get_events_resource_version()
+    c.create_deploymentconfig(name='check-website-dc', app_name='check-website',
+                              image='check-website-is:latest', tcp_port=8080)
+    c.start_deployment('check-website-dc')
+    assert c.wait_for_pods(lambda pods: len(pods) > 0, timeout=10)
+    assert c.get_events_resource_version() != first
@@ -0,0 +1,28 @@
+import pytest
+import ImageCache
+from test_main import run_round
+
+def image_cache(reuse_when_unknown=False):
+    return {'image_cache': {'enabled': 'True', 'reuse_when_unknown': str(reuse_when_unknown)}}
+
+@pytest.mark.parametrize('commit, reuse_when_unknown, second_round', [
+    ('abc123', False, 'cached'),
+    # git ls-remote failed: build, unless told to reuse the image anyway.
+    (None, False, 'built'),
+    (None, True, 'cached')])
+def test_reuse(fake, workdir, monkeypatch, commit, reuse_when_unknown, second_round):
+    monkeypatch.setattr(ImageCache, 'git_head', lambda url, timeout=30: commit)
+    assert run_round(fake, image_cache(reuse_when_unknown)).labels['image'] == 'built'
+    assert run_round(fake, image_cache(reuse_when_unknown), 2).labels['image'] == second_round
+
+def test_rebuild_on_new_commit(fake, workdir, monkeypatch):
+    commits = iter(['abc123', 'abc123', 'def456'])
+    monkeypatch.setattr(ImageCache, 'git_head', lambda url, timeout=30: next(commits))
+    labels = [run_round(fake, image_cache(), number).labels['image'] for number in [1, 2, 3]]
+    assert labels == ['built', 'cached', 'built']
+
+def test_role_binding_created_once(fake, workdir, monkeypatch):
+    monkeypatch.setattr(ImageCache, 'git_head', lambda url, timeout=30: 'abc123')
+    for number in [1, 2, 3]:
+        run_round(fake, image_cache(), number)
+    assert fake.request_counts[('POST', 'rolebindings')] == 1
@@ -0,0 +1,71 @@
+import socket
+import threading
+import pytest
+import LoadGenerator
+
+RESPONSE = b'HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok'
+
+class Server:
+    """A server on a free port that handles every connection with
+    handle(conn) in its own thread."""
+
+    def __init__(self):
+        self.sock = socket.socket()
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(16)
+        self.url = '127.0.0.1:{}/'.format(self.sock.getsockname()[1])
+        self.handle = None
+        threading.Thread(target=self.accept, daemon=True).start()
+
+    def accept(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.handle, args=(conn,), daemon=True).start()
+
+@pytest.fixture
+def server():
+    server = Server()
+    yield server
+    server.sock.close()
+
+def one_response(conn):
+    """Answer one request and close the connection, like a server whose
+    keep-alive timeout is shorter than the time between two requests."""
+    with conn:
+        if conn.recv(4096):
+            conn.sendall(RESPONSE)
+
+def keep_alive(conn):
+    with conn:
+        while conn.recv(4096):
+            conn.sendall(RESPONSE)
+
+def close_at_once(conn):
+    conn.close()
+
+def test_keepalive(server):
+    server.handle = keep_alive
+    result = LoadGenerator.LoadGenerator(server.url, concurrency=2, duration=0.3).run()
+    assert result['ok'] == result['requests'] > 2
+    assert result['connections'] == 2
+    assert result['errors'] == result['stale'] == 0
+    assert result['p50'] is not None
+
+def test_idle_connection_closed(server):
+    server.handle = one_response
+    result = LoadGenerator.LoadGenerator(server.url, concurrency=1, duration=0.3).run()
+    # Every reused connection is found closed and replaced, that's no error.
+    assert result['ok'] == result['requests'] > 2
+    assert result['errors'] == result['resets'] == 0
+    assert result['stale'] > 0
+    assert result['connections'] == result['stale'] + 1
+
+def test_reset_on_new_connection(server):
+    server.handle = close_at_once
+    result = LoadGenerator.LoadGenerator(server.url, concurrency=1, duration=0.2).run()
+    assert result['ok'] == 0
+    assert result['resets'] == result['errors'] == result['requests'] > 0
+    assert result['stale'] == 0
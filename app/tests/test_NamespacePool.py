@@ -0,0 +1,75 @@
+import time
+import pytest
+import main
+import NamespacePool
+
+def wait_until(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+
+@pytest.fixture
+def pool(connector):
+    pool = NamespacePool.NamespacePool(connector, ['pool-1', 'pool-2'], 3,
+                                       lambda c: main.cleanup_graph(c, 6, 2).run(), retry_delay=0.1)
+    wait_until(lambda: pool.status()[0] == 2)
+    # Cleaning up unlinks the deploy key from the builder service account.
+    for namespace in ['pool-1', 'pool-2']:
+        assert connector.for_namespace(namespace).wait_for_serviceaccount('builder', timeout=5)
+    yield pool
+    pool.close()
+
+def test_lease(fake, pool):
+    leased = [pool.lease(1), pool.lease(1)]
+    assert sorted(c.namespace for c in leased) == ['pool-1', 'pool-2']
+    for c in leased:
+        assert c.check_if_namespace_exists()
+        assert c.get_status_attempts() == 1
+    # Both are leased.
+    start = time.monotonic()
+    assert pool.lease(0.2) is None
+    assert time.monotonic() - start < 2
+
+def test_release_cleans_up(fake, pool):
+    leased = pool.lease(1)
+    leased.create_service(name='check-website-svc', app_name='check-website', tcp_port=8080,
+                          selector_dc='check-website-dc')
+    leased.create_route(name='check-website-route', app_name='check-website', svc_name='check-website-svc',
+                        target_port='8080-tcp', host='pool.example.com')
+    pool.release(leased)
+    wait_until(lambda: pool.status()[0] == 2)
+    with fake.lock:
+        assert fake.get(leased.namespace, 'services', 'check-website-svc') is None
+        assert fake.get(leased.namespace, 'routes', 'check-website-route') is None
+    assert leased.get_status_attempts() == 2
+
+def test_recreate_after_max_attempts(fake, pool):
+    leased = pool.lease(1)
+    leased.set_status_attempts(3)
+    with fake.lock:
+        fake.namespaces[leased.namespace]['object']['metadata']['uid'] = 'old'
+    pool.release(leased)
+    wait_until(lambda: pool.status()[0] == 2)
+    with fake.lock:
+        assert fake.namespaces[leased.namespace]['object']['metadata'].get('uid') != 'old'
+    assert leased.get_status_attempts() == 1
+
+def test_clean_waits_for_deletes(fake, connector, monkeypatch):
+    pool = NamespacePool.NamespacePool(connector, ['pool-1'], 0,
+                                       lambda c: main.cleanup_graph(c, 6, 0.3).run(), retry_delay=30)
+    try:
+        wait_until(lambda: pool.status()[0] == 1)
+        leased = pool.lease(1)
+        assert leased.wait_for_serviceaccount('builder', timeout=5)
+        leased.create_service(name='check-website-svc', app_name='check-website', tcp_port=8080,
+                              selector_dc='check-website-dc')
+        # The service isn't deleted, so the namespace doesn't become ready again.
+        monkeypatch.setattr(type(connector), 'delete_service', lambda self, name: None)
+        pool.release(leased)
+        wait_until(lambda: pool.status()[1])
+        ready, errors = pool.status()
+        assert ready == 0
+        assert "Service check-website-svc in namespace pool-1 wasn't deleted" in errors['pool-1']
+    finally:
+        pool.close()
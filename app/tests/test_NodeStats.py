@@ -0,0 +1,59 @@
+import NodeStats
+import Timing
+
+def stats_of(route_seconds, n=5):
+    """NodeStats with n rounds per node, the route taking route_seconds."""
+    stats = NodeStats.NodeStats()
+    for node, seconds in route_seconds.items():
+        for i in range(n):
+            stats.add({'build_node': 'worker-0', 'app_node': node},
+                      {'build': 30.0, 'route': seconds + i / 100})
+    return stats
+
+def test_attribution():
+    stats = stats_of({'worker-1': 1.0, 'worker-2': 2.0})
+    assert stats.nodes('route') == ['worker-1', 'worker-2']
+    assert stats.nodes('build') == ['worker-0']
+    assert stats.count('build', 'worker-0') == 10
+    summary = stats.summary()
+    assert summary['route']['worker-2'] == {'n': 5, 'median': 2.02, 'max': 2.04}
+
+def test_window():
+    stats = NodeStats.NodeStats(window=3)
+    for seconds in [9.0, 1.0, 2.0, 3.0]:
+        stats.add({'app_node': 'worker-1'}, {'route': seconds})
+    assert stats.summary()['route']['worker-1']['max'] == 3.0
+
+def test_failed_rounds_are_skipped():
+    stats = NodeStats.NodeStats()
+    timer = Timing.RoundTimer(1)
+    timer.set_label('app_node', 'worker-1')
+    timer.add('route', 60.0)
+    timer.finish('route not reachable')
+    stats.add_timer(timer)
+    assert stats.count('route', 'worker-1') == 0
+
+def test_outliers():
+    stats = stats_of({'worker-1': 1.0, 'worker-2': 1.1, 'worker-3': 0.9, 'worker-4': 1.05, 'worker-5': 4.0})
+    # Medians 1.02, 1.12, 0.92, 1.07, 4.02: center 1.07, MAD 0.05 / 0.6745.
+    outliers = stats.outliers()
+    assert [(phase, node) for phase, node, _, _ in outliers] == [('route', 'worker-5')]
+    assert outliers[0][3] == 1.07
+
+def test_outliers_with_equal_medians():
+    # More than half of the nodes have the same median, the MAD is 0 and
+    # the mean absolute deviation is used.
+    stats = stats_of({'worker-1': 1.0, 'worker-2': 1.0, 'worker-3': 1.0, 'worker-4': 1.0,
+                      'worker-5': 1.0, 'worker-6': 3.0})
+    assert [node for _, node, _, _ in stats.outliers()] == ['worker-6']
+
+def test_no_outliers():
+    # Too few nodes, too few samples or a small difference.
+    assert stats_of({'worker-1': 1.0, 'worker-2': 9.0}).outliers() == []
+    assert stats_of({'worker-1': 1.0, 'worker-2': 1.0, 'worker-3': 9.0}, n=4).outliers() == []
+    assert stats_of({'worker-1': 1.0, 'worker-2': 1.01, 'worker-3': 1.1}).outliers(min_change=0.2) == []
+
+def test_choose_node():
+    stats = stats_of({'worker-1': 1.0, 'worker-2': 1.0}, n=2)
+    assert NodeStats.choose_node(['worker-1', 'worker-2', 'worker-3'], stats) == 'worker-3'
+    assert NodeStats.choose_node(['worker-1', 'worker-2'], stats) == 'worker-1'
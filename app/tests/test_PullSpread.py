@@ -0,0 +1,63 @@
+import pytest
+import PullSpread
+
+def test_go_duration():
+    assert PullSpread.go_duration('1.234s') == pytest.approx(1.234)
+    assert PullSpread.go_duration('1m2.5s') == pytest.approx(62.5)
+    assert PullSpread.go_duration('1h0m30s') == pytest.approx(3630)
+    assert PullSpread.go_duration('350ms') == pytest.approx(0.35)
+    assert PullSpread.go_duration('12µs') == pytest.approx(12e-6)
+    assert PullSpread.go_duration('800ns') == pytest.approx(800e-9)
+    # Punctuation after the duration in a message.
+    assert PullSpread.go_duration('2s.') == pytest.approx(2)
+    assert PullSpread.go_duration('2 seconds') is None
+    assert PullSpread.go_duration('') is None
+
+def test_parse_pulled():
+    assert PullSpread.parse_pulled(
+        'Successfully pulled image "registry/php:7.4-ubi8" in 1m2.5s (1m3s including waiting).'
+        ' Image size: 123456 bytes.') == (pytest.approx(62.5), 123456, False)
+    # Older kubelets don't report the size.
+    assert PullSpread.parse_pulled('Successfully pulled image "registry/php:7.4-ubi8" in 350ms') == \
+        (pytest.approx(0.35), None, False)
+    assert PullSpread.parse_pulled('Container image "registry/php:7.4-ubi8" already present on machine') == \
+        (0.0, None, True)
+    assert PullSpread.parse_pulled(None) == (None, None, False)
+
+def result(pull, running=None, status='Running', size=None, cached=False, start=None):
+    return {'pull': pull, 'running': running, 'status': status, 'size': size, 'cached': cached,
+            'pull_start': start, 'pull_end': None if start is None else start + pull}
+
+def test_summarize():
+    results = {
+        'worker-0': result(1.0, 2.0, size=100, start=0.0),
+        'worker-1': result(1.2, 2.5, size=100, start=0.5),
+        'worker-2': result(5.0, 6.0, size=100, start=0.0),
+        'worker-3': result(0.0, 1.0, cached=True),
+        'worker-4': result(None, status='timeout')}
+    summary = PullSpread.summarize(results)
+    assert summary['nodes'] == 5
+    assert summary['failed'] == 1
+    assert summary['cached'] == 1
+    assert summary['pull_p50'] == 1.2
+    assert summary['pull_max'] == 5.0
+    assert summary['running_p50'] == 2.25
+    # 300 bytes from the first start until the last end, 5 seconds.
+    assert summary['throughput'] == 60
+    assert summary['node_throughput_p50'] == pytest.approx(100 / 1.2)
+    assert summary['slow'] == [('worker-2', 5.0)]
+
+def test_run(fake, connector):
+    connector.create_namespace()
+    assert connector.wait_for_serviceaccount('default', timeout=10)
+    results = PullSpread.PullSpread(connector, 'php:7.4-ubi8', fake.nodes, 'openshift', timeout=10).run()
+    assert set(results) == set(fake.nodes)
+    for r in results.values():
+        assert r['status'] == 'Running'
+        assert r['cached'] is False
+        assert r['pull'] == pytest.approx(fake.pull_time, abs=0.01)
+        assert r['size'] == fake.image_size
+        assert r['pull_start'] < r['pull_end']
+    # Now every node has the image.
+    results = PullSpread.PullSpread(connector, 'php:7.4-ubi8', fake.nodes, 'openshift', timeout=10).run()
+    assert PullSpread.summarize(results)['cached'] == len(fake.nodes)
@@ -0,0 +1,98 @@
+import copy
+import json
+import Manifests
+import Reconciler
+
+def service(**labels):
+    manifest = Manifests.service('check-website', 'check-website-svc', 8080, 'check-website-dc')
+    manifest['metadata']['labels'].update(labels)
+    return manifest
+
+def reconcile(connector, manifests, managed=()):
+    """Reconcile manifests by step name. Returns the actions."""
+    reconciler = Reconciler.Reconciler(connector, delete_timeout=10)
+    for step, kind, name in managed:
+        reconciler.manage(step, kind, name)
+    for step, manifest in manifests.items():
+        reconciler.add(step, manifest)
+    reconciler.graph().run()
+    return reconciler.actions
+
+def test_merge_patch():
+    old = {'metadata': {'labels': {'app': 'a', 'old': 'x'}}, 'spec': {'ports': [1, 2], 'type': 'ClusterIP'}}
+    new = {'metadata': {'labels': {'app': 'b'}}, 'spec': {'ports': [1]}, 'data': {'key': 'value'}}
+    assert Reconciler.merge_patch(old, new) == {
+        'metadata': {'labels': {'app': 'b', 'old': None}},
+        'spec': {'ports': [1], 'type': None},
+        'data': {'key': 'value'}}
+    assert Reconciler.merge_patch(old, copy.deepcopy(old)) == {}
+
+def test_patch_of():
+    patch = Reconciler.patch_of(service(tier='web'), service(), '42')
+    annotations = patch['metadata']['annotations']
+    assert patch['metadata']['labels'] == {'tier': None}
+    assert patch['metadata']['resourceVersion'] == '42'
+    assert annotations[Reconciler.SPEC_HASH] == Reconciler.manifest_hash(service())
+    assert json.loads(annotations[Reconciler.LAST_APPLIED]) == service()
+    assert 'spec' not in patch
+    # The annotations are in the patch also when the manifest didn't change.
+    patch = Reconciler.patch_of(service(), service(), '43')
+    assert set(patch['metadata']['annotations']) == {Reconciler.SPEC_HASH, Reconciler.LAST_APPLIED}
+
+def test_no_last_applied_on_secrets():
+    annotations = Reconciler.with_hash(Manifests.secret('key', 'deploy-key'))['metadata']['annotations']
+    assert Reconciler.SPEC_HASH in annotations
+    assert Reconciler.LAST_APPLIED not in annotations
+
+def test_create_keep_patch(connector):
+    connector.create_namespace()
+    assert reconcile(connector, {'service': service(tier='web')}) == {'service': 'create'}
+    uid = connector.get_object('Service', 'check-website-svc')['metadata']['uid']
+    assert reconcile(connector, {'service': service(tier='web')}) == {'service': 'keep'}
+    # The removed label is removed from the live object by the patch.
+    assert reconcile(connector, {'service': service()}) == {'service': 'patch'}
+    live = connector.get_object('Service', 'check-website-svc')
+    assert live['metadata']['uid'] == uid
+    assert live['metadata']['labels'] == {'app': 'check-website'}
+    assert live['metadata']['annotations'][Reconciler.SPEC_HASH] == Reconciler.manifest_hash(service())
+    assert reconcile(connector, {'service': service()}) == {'service': 'keep'}
+
+def test_patch_restores_changed_hash(connector):
+    connector.create_namespace()
+    reconcile(connector, {'service': service()})
+    connector.patch_object('Service', 'check-website-svc',
+                           {'metadata': {'annotations': {Reconciler.SPEC_HASH: 'changed'}}})
+    assert reconcile(connector, {'service': service()}) == {'service': 'patch'}
+    assert reconcile(connector, {'service': service()}) == {'service': 'keep'}
+
+def test_recreate_without_last_applied(connector):
+    connector.create_namespace()
+    connector.create_object(service())
+    uid = connector.get_object('Service', 'check-website-svc')['metadata']['uid']
+    assert reconcile(connector, {'service': service()}) == {'service': 'recreate'}
+    assert connector.get_object('Service', 'check-website-svc')['metadata']['uid'] != uid
+    # A changed Secret has no last applied manifest either.
+    reconcile(connector, {'secret': Manifests.secret('old key', 'deploy-key')})
+    assert reconcile(connector, {'secret': Manifests.secret('new key', 'deploy-key')}) == {'secret': 'recreate'}
+
+def test_recreate_on_conflict(fake, connector):
+    connector.create_namespace()
+    reconcile(connector, {'service': service(tier='web')})
+    def change_service(response, *args, **kwargs):
+        # Someone changes the service between our GET and PATCH.
+        if response.request.method == 'GET' and response.url.endswith('/services/check-website-svc'):
+            with fake.lock:
+                live = fake.get('health-check', 'services', 'check-website-svc')
+                fake.store('health-check', 'services', live, 'MODIFIED')
+    connector.session.hooks['response'].append(change_service)
+    assert reconcile(connector, {'service': service()}) == {'service': 'recreate'}
+    connector.session.hooks['response'].remove(change_service)
+    assert connector.get_object('Service', 'check-website-svc')['metadata']['labels'] == {'app': 'check-website'}
+
+def test_delete_not_desired(connector):
+    connector.create_namespace()
+    reconcile(connector, {'service': service()})
+    managed = [('service', 'Service', 'check-website-svc')]
+    assert reconcile(connector, {}, managed) == {'service': 'delete'}
+    assert connector.get_object('Service', 'check-website-svc') is None
+    assert reconcile(connector, {}, managed) == {'service': 'absent'}
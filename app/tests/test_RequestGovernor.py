@@ -0,0 +1,162 @@
+import threading
+import time
+import RequestGovernor
+
+PODS = '/api/v1/namespaces/health-check/pods'
+
+class Response:
+    def __init__(self, number, ok=True):
+        self.number = number
+        self.ok = ok
+
+class Fetch:
+    """Counts the calls and answers Response(call number). Blocks until
+    release is set when given."""
+
+    def __init__(self, release=None, error=None, ok=True):
+        self.calls = 0
+        self.ok = ok
+        self.started = threading.Event()
+        self.release = release
+        self.error = error
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        if self.release is not None:
+            self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return Response(self.calls, self.ok)
+
+def test_scope():
+    assert RequestGovernor.scope(PODS + '?labelSelector=app') == ('health-check', 'pods')
+    assert RequestGovernor.scope('/apis/apps.openshift.io/v1/namespaces/health-check/deploymentconfigs/dc') == \
+        ('health-check', 'deploymentconfigs')
+    assert RequestGovernor.scope('/api/v1/namespaces/health-check') == ('health-check', None)
+    assert RequestGovernor.scope('/apis/project.openshift.io/v1/projects/health-check') == ('health-check', None)
+    assert RequestGovernor.scope('/api/v1/nodes') == (None, 'nodes')
+    assert RequestGovernor.scope('/oauth/authorize') == (None, None)
+    assert RequestGovernor.overlaps(('health-check', 'pods'), ('health-check', None))
+    assert not RequestGovernor.overlaps(('health-check', 'pods'), ('health-check', 'services'))
+    assert not RequestGovernor.overlaps(('health-check', 'pods'), ('other', 'pods'))
+
+def test_off_by_default():
+    cache = RequestGovernor.ReadCache(0)
+    fetch = Fetch()
+    cache.get(PODS, PODS, fetch)
+    cache.get(PODS, PODS, fetch)
+    assert fetch.calls == 2
+
+def test_keeps_answers_for_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(RequestGovernor.time, 'monotonic', lambda: now[0])
+    cache = RequestGovernor.ReadCache(2)
+    fetch = Fetch()
+    first = cache.get(PODS, PODS, fetch)
+    second = cache.get(PODS, PODS, fetch)
+    assert fetch.calls == 1
+    assert second.number == 1
+    # Every caller gets its own copy.
+    assert second is not first
+    assert cache.get(PODS, PODS, fetch, cache=False).number == 2
+    now[0] += 3
+    assert cache.get(PODS, PODS, fetch).number == 3
+    assert cache.take() == (1, 0)
+    assert cache.take() == (0, 0)
+
+def test_failed_answers_are_not_kept():
+    cache = RequestGovernor.ReadCache(60)
+    fetch = Fetch(ok=False)
+    cache.get(PODS, PODS, fetch)
+    cache.get(PODS, PODS, fetch)
+    assert fetch.calls == 2
+
+def test_write_invalidates():
+    cache = RequestGovernor.ReadCache(60)
+    services = '/api/v1/namespaces/health-check/services'
+    fetch = Fetch()
+    cache.get(PODS, PODS, fetch)
+    cache.get(services, services, fetch)
+    # A write to another kind keeps the pods.
+    cache.invalidate('/api/v1/namespaces/health-check/services/check-website-svc')
+    cache.get(PODS, PODS, fetch)
+    assert fetch.calls == 2
+    cache.get(services, services, fetch)
+    assert fetch.calls == 3
+    # Deleting the namespace drops everything in it.
+    cache.invalidate('/apis/project.openshift.io/v1/projects/health-check')
+    cache.get(PODS, PODS, fetch)
+    cache.get(services, services, fetch)
+    assert fetch.calls == 5
+
+def test_coalesces_calls_in_flight():
+    cache = RequestGovernor.ReadCache(0, coalesce=True)
+    release = threading.Event()
+    fetch = Fetch(release)
+    answers = []
+    first = threading.Thread(target=lambda: answers.append(cache.get(PODS, PODS, fetch)))
+    first.start()
+    assert fetch.started.wait(5)
+    second = threading.Thread(target=lambda: answers.append(cache.get(PODS, PODS, fetch)))
+    second.start()
+    while cache.coalesced == 0:
+        time.sleep(0.001)
+    release.set()
+    first.join(5)
+    second.join(5)
+    assert fetch.calls == 1
+    assert [answer.number for answer in answers] == [1, 1]
+    assert answers[0] is not answers[1]
+    assert cache.take() == (0, 1)
+    # With ttl 0 nothing is kept after the call.
+    cache.get(PODS, PODS, fetch)
+    assert fetch.calls == 2
+
+def test_coalesced_callers_get_the_error():
+    cache = RequestGovernor.ReadCache(0, coalesce=True)
+    release = threading.Event()
+    fetch = Fetch(release, error=ConnectionError('reset'))
+    errors = []
+    def get():
+        try:
+            cache.get(PODS, PODS, fetch)
+        except ConnectionError as ex:
+            errors.append(ex)
+    threads = [threading.Thread(target=get)]
+    threads[0].start()
+    assert fetch.started.wait(5)
+    threads.append(threading.Thread(target=get))
+    threads[1].start()
+    while cache.coalesced == 0:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert fetch.calls == 1
+    assert len(errors) == 2
+
+def test_answer_in_flight_during_write_is_not_kept():
+    cache = RequestGovernor.ReadCache(60, coalesce=True)
+    release = threading.Event()
+    fetch = Fetch(release)
+    thread = threading.Thread(target=cache.get, args=(PODS, PODS, fetch))
+    thread.start()
+    assert fetch.started.wait(5)
+    cache.invalidate(PODS + '/check-website-dc-1-abcde')
+    release.set()
+    thread.join(5)
+    cache.get(PODS, PODS, fetch)
+    assert fetch.calls == 2
+
+def test_token_bucket():
+    assert RequestGovernor.TokenBucket(0, 1).acquire() == 0.0
+    bucket = RequestGovernor.TokenBucket(50, 2)
+    start = time.monotonic()
+    for _ in range(4):
+        bucket.acquire()
+    # Two from the burst, two more at 50 per second.
+    assert time.monotonic() - start >= 0.035
+    throttled, waited = bucket.take()
+    assert throttled == 2
+    assert waited > 0
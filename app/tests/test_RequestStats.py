@@ -0,0 +1,59 @@
+import pytest
+import RequestStats
+
+def test_kind_of():
+    assert RequestStats.kind_of('/api/v1/namespaces/health-check/pods?labelSelector=app') == 'pods'
+    assert RequestStats.kind_of('/api/v1/namespaces/health-check/pods/check-website-dc-1-abcde') == 'pods'
+    assert RequestStats.kind_of('/apis/build.openshift.io/v1/namespaces/health-check/builds/bc-1/log') == \
+        'builds/log'
+    assert RequestStats.kind_of('/apis/project.openshift.io/v1/projectrequests') == 'projectrequests'
+    assert RequestStats.kind_of('/api/v1/namespaces/health-check') == 'namespaces'
+    assert RequestStats.kind_of('/oauth/authorize?client_id=x') == 'oauth'
+
+def test_parse_path():
+    assert RequestStats.parse_path('/api/v1/namespaces/health-check/pods?watch=1&resourceVersion=') == \
+        ('health-check', 'pods', None, None)
+    log = '/apis/build.openshift.io/v1/namespaces/health-check/builds/bc-1/log?follow=true'
+    assert RequestStats.parse_path(log) == ('health-check', 'builds', 'bc-1', 'log')
+    assert RequestStats.parse_path('/api/v1/namespaces/health-check') == (None, 'namespaces', 'health-check', None)
+    assert RequestStats.parse_path('/api/v1/nodes?labelSelector=a%3Db') == (None, 'nodes', None, None)
+    assert RequestStats.parse_path('/oauth/authorize?client_id=x') is None
+    assert RequestStats.kind_of('/api/v1/namespaces/health-check/pods?watch=1&resourceVersion=') == 'pods'
+
+def test_histogram():
+    histogram = RequestStats.Histogram()
+    assert histogram.quantile(0.5) is None
+    for seconds in [0.001, 0.002, 0.003, 0.02, 0.3]:
+        histogram.add(seconds, seconds / 2, 100)
+    assert histogram.n == 5
+    assert histogram.bytes == 500
+    assert histogram.max == 0.3
+    # Rank 2.5 of 3 in the first bucket (0 - 5 ms).
+    assert histogram.quantile(0.5) == pytest.approx(0.005 * 2.5 / 3)
+    # Never more than the slowest request.
+    assert histogram.quantile(0.99) == pytest.approx(0.3)
+    assert histogram.as_dict()['buckets'] == {'0.005': 3, '0.025': 1, '0.5': 1}
+
+def test_record_and_take():
+    stats = RequestStats.RequestStats()
+    stats.record('GET', '/api/v1/namespaces/x/pods', 200, 1000, 0.01, 0.001)
+    stats.record('GET', '/api/v1/namespaces/x/pods/y', 404, 10, 0.02, 0.001)
+    stats.record('POST', '/api/v1/namespaces/x/services', 201, 100, 0.03, 0.002)
+    assert stats.total().n == 3
+    assert {key: h.n for key, h in stats.by('verb').items()} == {('GET',): 2, ('POST',): 1}
+    assert {key: h.n for key, h in stats.by('verb', 'kind').items()} == \
+        {('GET', 'pods'): 2, ('POST', 'services'): 1}
+    taken = stats.take()
+    assert taken.total().n == 3
+    assert stats.total().n == 0
+    assert [(r['verb'], r['kind'], r['status']) for r in taken.as_list()] == \
+        [('GET', 'pods', 200), ('GET', 'pods', 404), ('POST', 'services', 201)]
+
+def test_connector_records_requests(fake, connector):
+    connector.create_namespace()
+    connector.check_if_namespace_exists()
+    connector.get_pods()
+    requests = {(r['verb'], r['kind'], r['status']): r['n'] for r in connector.request_stats.as_list()}
+    assert requests[('POST', 'projectrequests', 201)] == 1
+    assert requests[('GET', 'pods', 200)] == 1
+    assert connector.get_connection_stats()['requests'] == sum(requests.values())
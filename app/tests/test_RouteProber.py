@@ -0,0 +1,57 @@
+import socket
+import threading
+import RouteProber
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def test_probe_once(fake):
+    # No route for this host: the router answers 503.
+    result = RouteProber.probe_once('127.0.0.1', fake.port, timeout=2)
+    assert result['status'] == 503
+    assert result['error'] is None
+    assert result['dns'] is not None and result['connect'] is not None and result['ttfb'] is not None
+    result = RouteProber.probe_once('127.0.0.1', free_port(), timeout=2)
+    assert result['status'] is None
+    assert result['error'] == 'refused'
+
+def test_probe_once_closed_in_status_line():
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen(1)
+    def answer():
+        conn, _ = server.accept()
+        conn.recv(4096)
+        conn.sendall(b'HTTP/1.1 20')
+        conn.close()
+    thread = threading.Thread(target=answer)
+    thread.start()
+    try:
+        result = RouteProber.probe_once('127.0.0.1', server.getsockname()[1], timeout=2)
+    finally:
+        thread.join()
+        server.close()
+    assert result['status'] is None
+    assert result['error'] == 'reset'
+    assert result['total'] < 2
+
+def test_wait_for_200(fake, connector):
+    connector.create_namespace()
+    connector.create_deploymentconfig(name='check-website-dc', app_name='check-website',
+                                      image='check-website-is:latest', tcp_port=8080)
+    connector.create_service(name='check-website-svc', app_name='check-website', tcp_port=8080,
+                             selector_dc='check-website-dc')
+    connector.create_route(name='check-website-route', app_name='check-website', svc_name='check-website-svc',
+                           target_port='8080-tcp', host='127.0.0.1')
+    prober = RouteProber.RouteProber('127.0.0.1:{}/'.format(fake.port), interval=0.02)
+    # Nothing runs yet.
+    assert prober.wait_for_200(max_wait=0.1) is None
+    connector.start_deployment('check-website-dc')
+    assert prober.wait_for_200(max_wait=10) is not None
+    summary = prober.summary()
+    assert summary['attempts_before_200'] == prober.first_200 > 0
+    assert summary['503_before_200'] == summary['attempts_before_200']
+    assert summary['first_200_ttfb'] is not None
+    assert prober.check_stability(window=0.1) == 1.0
@@ -0,0 +1,81 @@
+import time
+import ApiConnector
+import FakeApiServer
+import ScaleTest
+
+def deploy(fake, wait=True):
+    """The application with one replica behind a route for 127.0.0.1."""
+    c = ApiConnector.ApiConnector(fake.url, 'health-check', token='fake')
+    c.create_namespace()
+    c.create_deploymentconfig(name='check-website-dc', app_name='check-website',
+                              image='check-website-is:latest', tcp_port=8080)
+    c.create_service(name='check-website-svc', app_name='check-website', tcp_port=8080,
+                     selector_dc='check-website-dc')
+    c.create_route(name='check-website-route', app_name='check-website', svc_name='check-website-svc',
+                   target_port='8080-tcp', host='127.0.0.1')
+    c.start_deployment('check-website-dc')
+    def started(pods):
+        return pods and (not wait or all(pod.status == 'Running' for pod in pods.values()))
+    assert c.wait_for_pods(started, timeout=10, label_selector='deploymentconfig=check-website-dc')
+    return c
+
+def scale_test(fake, c, timeout=10):
+    return ScaleTest.ScaleTest(c, 'check-website-dc', 'check-website-svc', '127.0.0.1:{}/'.format(fake.port),
+                               timeout=timeout, probe_interval=0.01)
+
+def test_steps(fake):
+    c = deploy(fake)
+    test = scale_test(fake, c)
+    steps = test.run(4, step=2)
+    # From 1 replica in steps of 2, the last step goes to the requested replicas.
+    assert [result['replicas'] for result in steps] == [3, 4]
+    assert [result['new_pods'] for result in steps] == [2, 1]
+    for result in steps:
+        for key in ['scheduled', 'running', 'endpoints', 'route_balanced']:
+            assert result[key] is not None
+        assert result['scheduled'] <= result['running'] <= result['endpoints']
+    assert len(c.get_pods(label_selector='deploymentconfig=check-website-dc')) == 4
+    nodes = test.per_node()
+    assert set(nodes) <= set(fake.nodes)
+    assert sum(stats['pods'] for stats in nodes.values()) == 4
+    for stats in nodes.values():
+        assert stats['running'] is not None and stats['endpoint'] is not None
+    c.close()
+
+def test_all_at_once(fake):
+    c = deploy(fake)
+    steps = scale_test(fake, c).run(3)
+    assert [(result['replicas'], result['new_pods']) for result in steps] == [(3, 2)]
+    c.close()
+
+def test_pods_not_running():
+    fake = FakeApiServer.FakeApiServer(pod_start=60)
+    try:
+        c = deploy(fake, wait=False)
+        test = scale_test(fake, c, timeout=0.5)
+        start = time.monotonic()
+        [result] = test.run(2)
+        # The route probe is stopped as soon as the pods time out.
+        assert time.monotonic() - start < 3
+        assert result['new_pods'] == 1
+        for key in ['scheduled', 'running', 'endpoints', 'route_balanced']:
+            assert result[key] is None
+        # The new pod is on a node, but never Running.
+        assert sum(stats['pods'] for stats in test.per_node().values()) == 2
+        c.close()
+    finally:
+        fake.close()
+
+def test_endpoints_timeout():
+    fake = FakeApiServer.FakeApiServer(endpoints_delay=60)
+    try:
+        c = deploy(fake)
+        start = time.monotonic()
+        [result] = scale_test(fake, c, timeout=0.5).run(2)
+        assert time.monotonic() - start < 3
+        assert result['running'] is not None
+        assert result['endpoints'] is None
+        assert result['route_balanced'] is None
+        c.close()
+    finally:
+        fake.close()
@@ -0,0 +1,63 @@
+import threading
+import time
+from datetime import datetime, timedelta
+import pytest
+import Scheduler
+
+START = datetime(2026, 3, 2, 10, 0, 30)
+
+def test_interval_schedule():
+    schedule = Scheduler.IntervalSchedule(60)
+    assert schedule.next_after(START) == START
+    assert schedule.next_after(START + timedelta(seconds=10)) == START + timedelta(seconds=60)
+    # A round that took long: the missed start is skipped.
+    assert schedule.next_after(START + timedelta(seconds=150)) == START + timedelta(seconds=180)
+    with pytest.raises(ValueError):
+        Scheduler.IntervalSchedule(0)
+
+def test_pause_schedule():
+    schedule = Scheduler.PauseSchedule(20)
+    assert schedule.next_after(START) == START
+    # Counted from the end of the round, like run.sh.
+    assert schedule.next_after(START + timedelta(seconds=95)) == START + timedelta(seconds=115)
+    assert Scheduler.PauseSchedule(0).next_after(START) == START
+    with pytest.raises(ValueError):
+        Scheduler.PauseSchedule(-1)
+
+def test_cron_schedule():
+    assert Scheduler.CronSchedule('*/5 * * * *').next_after(START) == datetime(2026, 3, 2, 10, 5)
+    assert Scheduler.CronSchedule('0 9-17 * * 1-5').next_after(START) == datetime(2026, 3, 2, 11, 0)
+    # Saturday 7 march, sunday can be 0 or 7.
+    assert Scheduler.CronSchedule('30 6 * * 6').next_after(START) == datetime(2026, 3, 7, 6, 30)
+    assert Scheduler.CronSchedule('0 0 * * 7').next_after(START) == datetime(2026, 3, 8, 0, 0)
+    # Both day fields restricted: either one matches.
+    assert Scheduler.CronSchedule('0 0 15 * 3').next_after(START) == datetime(2026, 3, 4, 0, 0)
+    with pytest.raises(ValueError):
+        Scheduler.CronSchedule('* * * *')
+    with pytest.raises(ValueError):
+        Scheduler.CronSchedule('61 * * * *')
+    with pytest.raises(ValueError):
+        Scheduler.CronSchedule('0 0 30 2 *').next_after(START)
+
+def test_daemon(monkeypatch, capsys):
+    # Signal handlers can only be set in the main thread and would stay
+    # for the other tests.
+    monkeypatch.setattr(Scheduler.signal, 'signal', lambda *args: None)
+    rounds = []
+    failures = []
+    def function(number):
+        rounds.append(number)
+        if number == 1:
+            time.sleep(0.3)
+        if number == 2:
+            raise KeyError('metadata')
+    def on_failure(number, text):
+        failures.append((number, text.splitlines()[-1]))
+        raise RuntimeError('mail server unreachable')
+    daemon = Scheduler.Daemon(Scheduler.PauseSchedule(0.05), function, 0.1, on_failure)
+    threading.Timer(1, daemon.stop).start()
+    daemon.run()
+    # The daemon survived both the failed round and the failing notifier.
+    assert rounds[:3] == [1, 2, 3]
+    assert failures[:2] == [(1, 'Round 1 is still running after 0.1 seconds.'), (2, "KeyError: 'metadata'")]
+    assert 'Reporting round 2 failed' in capsys.readouterr().out
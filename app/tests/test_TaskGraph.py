@@ -0,0 +1,51 @@
+import threading
+import pytest
+import TaskGraph
+
+def test_dependencies_run_first():
+    order = []
+    lock = threading.Lock()
+    def task(name):
+        with lock:
+            order.append(name)
+        return name.upper()
+    graph = TaskGraph.TaskGraph()
+    graph.add('namespace', task, 'namespace')
+    graph.add('secret', task, 'secret', depends_on=['namespace'])
+    graph.add('serviceaccount', task, 'serviceaccount', depends_on=['namespace'])
+    graph.add('link_secret', task, 'link_secret', depends_on=['secret', 'serviceaccount'])
+    results = graph.run()
+    assert results == {'namespace': 'NAMESPACE', 'secret': 'SECRET',
+                       'serviceaccount': 'SERVICEACCOUNT', 'link_secret': 'LINK_SECRET'}
+    assert order[0] == 'namespace'
+    assert order[-1] == 'link_secret'
+    assert set(graph.durations) == set(results)
+
+def test_independent_tasks_run_in_parallel():
+    barrier = threading.Barrier(3, timeout=5)
+    graph = TaskGraph.TaskGraph(max_workers=3)
+    for name in ['a', 'b', 'c']:
+        graph.add(name, barrier.wait)
+    # Would raise BrokenBarrierError when they ran one after another.
+    graph.run()
+
+def test_error_is_raised_and_stops_dependents():
+    called = []
+    def fail():
+        raise KeyError('missing')
+    graph = TaskGraph.TaskGraph()
+    graph.add('fail', fail)
+    graph.add('after', called.append, 'after', depends_on=['fail'])
+    with pytest.raises(KeyError, match='missing'):
+        graph.run()
+    assert called == []
+
+def test_name_keyword_for_function():
+    graph = TaskGraph.TaskGraph()
+    graph.add('service', dict, name='check-website-svc')
+    assert graph.run() == {'service': {'name': 'check-website-svc'}}
+
+def test_unknown_dependency():
+    graph = TaskGraph.TaskGraph()
+    with pytest.raises(ValueError):
+        graph.add('link_secret', print, depends_on=['secret'])
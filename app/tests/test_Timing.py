@@ -0,0 +1,31 @@
+import Timing
+
+def test_to_prometheus():
+    timer = Timing.RoundTimer(7)
+    timer.timestamp = 1700000000.0
+    timer.add('build', 1.5)
+    timer.set_value('route_attempts_before_200', 3)
+    timer.set_label('cluster', 'prod')
+    timer.set_label('namespace', 'health-check')
+    timer.set_label('app_node', 'worker-"1"')
+    timer.finish()
+    lines = timer.to_prometheus().splitlines()
+    # Only the cluster label on the metrics, the rest on the info metric.
+    assert 'health_check_phase_seconds{phase="build",cluster="prod"} 1.500000' in lines
+    assert 'health_check_value{name="route_attempts_before_200",cluster="prod"} 3' in lines
+    assert 'health_check_round_success{cluster="prod"} 1' in lines
+    assert ('health_check_round_info{app_node="worker-\\"1\\"",cluster="prod",'
+            'namespace="health-check"} 1') in lines
+    assert 'health_check_round{cluster="prod"} 7' in lines
+    assert 'health_check_round_timestamp_seconds{cluster="prod"} 1700000000.000' in lines
+    assert '# TYPE health_check_round_info gauge' in lines
+
+def test_to_prometheus_without_labels():
+    timer = Timing.RoundTimer(1)
+    timer.add('total', 2)
+    timer.finish('failed')
+    lines = timer.to_prometheus().splitlines()
+    assert 'health_check_phase_seconds{phase="total"} 2.000000' in lines
+    assert 'health_check_round_success 0' in lines
+    assert 'health_check_round_info 1' in lines
+    assert 'health_check_round 1' in lines
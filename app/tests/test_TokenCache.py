@@ -0,0 +1,48 @@
+import os
+import stat
+import time
+import ApiConnector
+import FakeApiServer
+import TokenCache
+
+def test_parse_token_location():
+    assert TokenCache.parse_token_location(
+        'https://oauth/token/implicit#access_token=sha256~abc&expires_in=86400&token_type=Bearer') == \
+        ('sha256~abc', 86400)
+    assert TokenCache.parse_token_location('https://oauth/token/implicit#access_token=abc') == ('abc', None)
+
+def test_store_and_get(tmp_path):
+    path = str(tmp_path / '.token_cache')
+    cache = TokenCache.TokenCache(path, refresh_margin=300)
+    assert cache.get('https://api:6443', 'user') is None
+    expires_at = cache.store('https://api:6443', 'user', 'sha256~abc', 3600)
+    assert cache.get('https://api:6443', 'user') == ('sha256~abc', expires_at)
+    assert cache.get('https://api:6443', 'other') is None
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    # Within the refresh margin of its expiry a token isn't used anymore.
+    cache.store('https://api:6443', 'user', 'sha256~old', 200)
+    assert cache.get('https://api:6443', 'user') is None
+    assert cache.expiring(time.time() + 200)
+    assert not cache.expiring(time.time() + 3600)
+    assert not cache.expiring(None)
+
+def test_connector_uses_cache(fake, tmp_path):
+    cache = TokenCache.TokenCache(str(tmp_path / '.token_cache'))
+    c = ApiConnector.ApiConnector(fake.url, 'health-check', username='user', password='secret', token_cache=cache)
+    c.create_namespace()
+    # A new run takes the token from the cache instead of logging in.
+    c = ApiConnector.ApiConnector(fake.url, 'health-check', username='user', password='secret', token_cache=cache)
+    assert c.check_if_namespace_exists()
+    assert fake.logins == 1
+
+def test_connector_renews_expiring_token(tmp_path):
+    fake = FakeApiServer.FakeApiServer(token_lifetime=100)
+    try:
+        cache = TokenCache.TokenCache(str(tmp_path / '.token_cache'), refresh_margin=300)
+        c = ApiConnector.ApiConnector(fake.url, 'health-check', username='user', password='secret',
+                                      token_cache=cache)
+        c.create_namespace()
+        # Every request finds the token about to expire and logs in first.
+        assert fake.logins == 2
+    finally:
+        fake.close()
@@ -0,0 +1,99 @@
+import contextlib
+import io
+import time
+from datetime import datetime
+import pytest
+import benchmark
+import FakeApiServer
+import main
+import Timing
+
+def run_round(fake, options=None, number=1):
+    """Run one round against fake. Returns its timer."""
+    config = benchmark.benchmark_config(fake.url, fake.port)
+    config.read_dict(options or {})
+    c = main.create_connector(config)
+    main.current.starttime = datetime.now()
+    with contextlib.redirect_stdout(io.StringIO()):
+        main.timed_run(c, config, number)
+    c.close()
+    return main.current.timer
+
+def test_round(fake, workdir):
+    timer = run_round(fake)
+    assert timer.success is True
+    assert timer.error is None
+    for phase in ['namespace_create', 'create_objects', 'build', 'deploy', 'route', 'total']:
+        assert phase in timer.spans
+    assert timer.labels['namespace'] == 'health-check'
+    assert timer.labels['build_node'] in fake.nodes
+    assert timer.labels['app_node'] in fake.nodes
+    assert timer.values['api_requests'] > 0
+    assert timer.values['build_log_lines'] > 0
+    assert timer.details['api_requests']
+
+def test_round_links_secret(fake, workdir, connector):
+    run_round(fake)
+    with fake.lock:
+        builder = fake.get('health-check', 'serviceaccounts', 'builder')
+        assert 'deploy-key' in [secret['name'] for secret in builder['secrets']]
+
+def test_reconcile_rounds(fake, workdir):
+    options = {'behaviour': {'reconcile': 'True'}}
+    timer = run_round(fake, options)
+    assert timer.success is True
+    assert timer.values['reconcile_create'] == 6
+    timer = run_round(fake, options, 2)
+    assert timer.success is True
+    # Only the DeploymentConfig is recreated, to start a new pod.
+    assert timer.values['reconcile_recreate'] == 1
+    assert timer.values['reconcile_keep'] == 5
+    assert 'reconcile_patch' not in timer.values
+
+def test_in_cluster_probe(fake, workdir):
+    main.current.output = []
+    timer = run_round(fake, {'in_cluster_probe': {'enabled': 'True', 'samples': '3',
+                                                  'interval': '0.05', 'timeout': '1'}})
+    assert timer.success is True
+    for hop in ['pod', 'service', 'route']:
+        assert timer.values['incluster_{}_failed'.format(hop)] == 0
+        assert 'incluster.{}.p50'.format(hop) in timer.spans
+    # The route is probed while the probe job starts, not after it.
+    texts = [line.split('] ', 1)[1] for line in main.current.output]
+    assert texts.index('INFO - Probing route...') < \
+        texts.index('INFO - Started the in-cluster probe of the pod IP, Service and route.')
+
+def test_in_background():
+    main.current.output = []
+    main.current.timer = Timing.RoundTimer(3)
+    def work(number):
+        main.print_output("In the background.")
+        main.current.timer.set_value('background', number)
+        return number * 2
+    assert main.in_background(work, 21).result(5) == 42
+    assert main.current.output[-1].endswith('INFO - In the background.')
+    assert main.current.timer.values['background'] == 21
+    def fail():
+        raise RuntimeError('probe failed')
+    with pytest.raises(RuntimeError, match='probe failed'):
+        main.in_background(fail).result(5)
+
+def test_round_timeout(workdir):
+    fake = FakeApiServer.FakeApiServer(build_time=30)
+    try:
+        config = benchmark.benchmark_config(fake.url, fake.port)
+        c = main.create_connector(config)
+        main.current.starttime = datetime.now()
+        main.current.output = []
+        start = time.monotonic()
+        with contextlib.redirect_stdout(io.StringIO()):
+            with pytest.raises(Exception):
+                main.timed_run(c, config, 1, timeout=1)
+        assert time.monotonic() - start < 10
+        assert main.current.timer.success is False
+        assert main.current.timer.error.startswith("Round was interrupted after 1 seconds")
+        # The connector of the daemon isn't interrupted with the round.
+        assert c.check_if_namespace_exists()
+        c.close()
+    finally:
+        fake.close()
@@ -0,0 +1,33 @@
+import asyncio
+import configparser
+import AsyncApiConnector
+import multi_probe
+
+def test_run_probes(fake, workdir, monkeypatch):
+    config = configparser.ConfigParser()
+    config.read_dict({
+        'authentication': {'username': 'user', 'password': 'secret'},
+        'connection': {'api_url': fake.url, 'namespace': 'health-check',
+                       'app_url': 'health-check.apps.example.com'}})
+    # The route hosts of the probes don't resolve here, the fake server
+    # answers for all of them.
+    monkeypatch.setattr(multi_probe.main, 'namespace_app_url',
+                        lambda app_url, namespace: '127.0.0.1:{}'.format(fake.port))
+    start_deployment = AsyncApiConnector.AsyncApiConnector.start_deployment
+    async def failing_start_deployment(self, name):
+        if self.namespace == 'health-check-2':
+            raise KeyError('metadata')
+        # The token expires while the pipelines run.
+        fake.revoke_tokens()
+        return await start_deployment(self, name)
+    monkeypatch.setattr(AsyncApiConnector.AsyncApiConnector, 'start_deployment', failing_start_deployment)
+    results = asyncio.run(multi_probe.run_probes(config, 3, 3))
+    assert [r['namespace'] for r in results] == ['health-check-1', 'health-check-2', 'health-check-3']
+    assert [r['success'] for r in results] == [True, False, True]
+    # An unexpected error only fails its own pipeline.
+    assert results[1]['error'] == "KeyError: 'metadata'"
+    # Logged in again after the revoke, once per revoke at most.
+    assert 2 <= fake.logins <= 3
+    with fake.lock:
+        for namespace in ['health-check-1', 'health-check-2', 'health-check-3']:
+            assert namespace not in fake.namespaces or fake.namespaces[namespace]['terminating']
@@ -0,0 +1,57 @@
+import argparse
+import pytest
+import report
+import RunStore
+import Timing
+
+def test_parse_duration():
+    assert report.parse_duration('90') == 90
+    assert report.parse_duration('30m') == 1800
+    assert report.parse_duration('1.5h') == 5400
+    assert report.parse_duration('7d') == 604800
+    with pytest.raises(argparse.ArgumentTypeError):
+        report.parse_duration('soon')
+
+def test_percentile():
+    assert report.percentile([], 50) is None
+    assert report.percentile([3, 1, 2], 50) == 2
+    assert report.percentile([1, 2, 3, 4], 50) == 2.5
+    assert report.percentile([1, 2, 3, 4, 5], 95) == pytest.approx(4.8)
+
+def test_mann_whitney_greater():
+    # U = 4 of at most 4, z = 1.5 / sqrt(5 / 3) with the continuity correction.
+    assert report.mann_whitney_greater([3, 4], [1, 2]) == pytest.approx(0.12264, abs=1e-5)
+    assert report.mann_whitney_greater([1, 2], [3, 4]) == pytest.approx(0.97360, abs=1e-5)
+    # All values tied: no evidence either way.
+    assert report.mann_whitney_greater([5] * 6, [5] * 6) == 1.0
+    assert report.mann_whitney_greater(range(10, 20), range(10)) < 0.001
+
+def test_compare():
+    slower = report.compare([2.0, 2.0, 2.0, 2.1, 2.2, 2.3], [1.0, 1.1, 1.0, 1.2, 1.1, 1.0])
+    assert slower['regression'] is True
+    assert slower['p50'] == pytest.approx(2.05)
+    assert slower['baseline_p50'] == pytest.approx(1.05)
+    # Significant, but less than min_change slower.
+    slightly = report.compare([1.06, 1.07, 1.06, 1.07, 1.06, 1.07], [1.0, 1.01, 1.0, 1.01, 1.0, 1.01])
+    assert slightly['p_value'] < 0.01
+    assert slightly['regression'] is False
+    # Too few samples for a p-value.
+    few = report.compare([5.0, 5.0], [1.0, 1.0])
+    assert few['p_value'] is None
+    assert few['regression'] is False
+
+def test_report(tmp_path):
+    store = RunStore.RunStore(str(tmp_path / 'history.sqlite'))
+    now = 1700000000.0
+    for i in range(10):
+        for offset, seconds in [(7200, 1.0 + i / 100), (600, 3.0 + i / 100)]:
+            timer = Timing.RoundTimer(i)
+            timer.timestamp = now - offset + i
+            timer.add('route', seconds)
+            timer.add('build', 10.0 + i / 100)
+            timer.finish()
+            store.add(timer)
+    results = report.report(store, 3600, 6 * 3600, now)
+    assert results['route']['regression'] is True
+    assert results['route']['n'] == 10
+    assert results['build']['regression'] is False
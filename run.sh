@@ -2,12 +2,6 @@
 set -e
 cd app
 
-rounds=0
-while true
-do
-    rounds=$((rounds+1))
-    echo "===================== Starting run $rounds"
-    ./main.py
-    sleep 20
-done
-
+# Runs rounds from one long-running process. See the [daemon] section
+# in config.ini for the interval or schedule.
+exec ./main.py --daemon "$@"